@@ -0,0 +1,85 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import os
+import tempfile
+import uuid
+
+from typing import Any, IO, Optional, Tuple
+
+# Writes a file through a temporary file in the same folder, which replaces the file only once it has
+# been written completely. A crash, an error or a cancelled export never leaves a truncated file behind,
+# and other programs (or other Cura instances on a network share) see either the old or the new file.
+#   atomic_file = AtomicFile(path, "w", newline = "")
+#   with atomic_file as output_file:
+#       ...
+#       atomic_file.discard()  # to keep the original file after all
+class AtomicFile:
+    BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, path: str, mode: str = "w", **kwargs: Any) -> None:
+        self._path = path
+        self._mode = mode
+        self._kwargs = kwargs
+        self._kwargs.setdefault("buffering", self.BUFFER_SIZE)
+
+        self._temp_path = None  # type: Optional[str]
+        self._file = None  # type: Optional[IO[Any]]
+        self._discarded = False
+
+    def getPath(self) -> str:
+        return self._path
+
+    def discard(self) -> None:
+        self._discarded = True
+
+    def __enter__(self) -> IO[Any]:
+        (handle, self._temp_path) = self._createTempFile()
+        try:
+            self._copyMode(self._temp_path)
+            self._file = os.fdopen(handle, self._mode, **self._kwargs)
+        except:
+            os.close(handle)
+            os.remove(self._temp_path)
+            raise
+        return self._file
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        temp_path = self._temp_path
+        try:
+            if self._file is not None:
+                if exc_type is None and not self._discarded:
+                    self._file.flush()
+                    # the data must be on disk before the rename is
+                    os.fsync(self._file.fileno())
+                self._file.close()
+            if exc_type is None and not self._discarded:
+                os.replace(temp_path, self._path)
+                temp_path = None
+        finally:
+            self._file = None
+            self._temp_path = None
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    # Unlike mkstemp, which creates files that only the current user can read, this creates the file
+    # with the permissions of a new file, as limited by the umask. The umask is not read, since that
+    # can only be done by changing it for all threads of the process.
+    def _createTempFile(self) -> Tuple[int, str]:
+        directory = os.path.dirname(os.path.abspath(self._path))
+        flags = os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0)
+        for _ in range(tempfile.TMP_MAX):
+            temp_path = os.path.join(directory, ".%s.%s.tmp" % (os.path.basename(self._path), uuid.uuid4().hex[:8]))
+            try:
+                return (os.open(temp_path, flags, 0o666), temp_path)
+            except FileExistsError:
+                continue
+        raise FileExistsError("No usable temporary file name found in %s" % directory)
+
+    def _copyMode(self, temp_path: str) -> None:
+        # a file that is replaced keeps its permissions
+        try:
+            mode = os.stat(self._path).st_mode & 0o777
+        except EnvironmentError:
+            return
+        os.chmod(temp_path, mode)
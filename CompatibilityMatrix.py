@@ -0,0 +1,58 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+try:
+    import csv
+except ImportError:
+    # older versions of Cura somehow ship with a python version that does not include
+    # this file, so a local copy is supplied as a fallback
+    from . import csv  # type: ignore
+
+from .ExportWriter import ExportWriter
+
+from typing import Any, Dict, IO, Iterable, List, Set
+
+# A table of which materials can be used with which printer and nozzle, with the weights and prices
+# of the materials. Every printer and nozzle is a column; only the GUIDs of the materials are kept per
+# column, and the metadata of a material is kept once, however many columns it is listed in.
+# The first four columns are the same as in a normal export, so the file can be imported as is.
+class CompatibilityMatrix:
+    COMPATIBLE = "x"
+
+    def __init__(self, currency: str) -> None:
+        self._currency = currency
+        self._columns = []  # type: List[str]
+        self._materials = {}  # type: Dict[str, Dict[str, Any]]
+        self._compatible = {}  # type: Dict[str, Set[int]]
+
+    def getColumns(self) -> List[str]:
+        return self._columns
+
+    def getMaterialCount(self) -> int:
+        return len(self._materials)
+
+    def addColumn(self, name: str, materials_metadata: Iterable[Dict[str, Any]]) -> None:
+        column = len(self._columns)
+        self._columns.append(name)
+        for metadata in materials_metadata:
+            guid = metadata["GUID"]
+            if guid not in self._materials:
+                self._materials[guid] = metadata
+            self._compatible.setdefault(guid, set()).add(column)
+
+    # Returns the number of materials written
+    def write(self, csv_file: IO[str], material_settings: Dict[str, Dict[str, Any]]) -> int:
+        csv_writer = csv.writer(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        csv_writer.writerow(["guid", "name", "weight (g)", "cost (%s)" % self._currency] + self._columns)
+
+        column_range = range(len(self._columns))
+        rows = ExportWriter.prepareRows(self._materials.values(), material_settings)
+        for row in rows:
+            compatible = self._compatible[row["guid"]]
+            csv_writer.writerow([
+                row["guid"],
+                "%s %s" % (row["brand"], row["name"]),
+                row["spool_weight"],
+                row["spool_cost"]
+            ] + [self.COMPATIBLE if column in compatible else "" for column in column_range])
+        return len(rows)
@@ -0,0 +1,98 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import json
+
+from UM.Job import Job
+from UM.Logger import Logger
+
+from .AtomicFile import AtomicFile
+from .CompatibilityMatrix import CompatibilityMatrix
+from .StageTimer import StageTimer
+
+from typing import Any, List, Optional, Tuple
+
+# Writes a compatibility matrix of the materials for every variant of a list of printers.
+# machine_nodes is the machines map of the container tree, which creates the node of a machine when it
+# is first used. The nodes are looked up one machine at a time in the job thread, as the container tree
+# does itself when it loads the nodes of the added printers after startup, so the nodes that are not
+# loaded yet are only created when they are needed and without blocking the interface.
+class CompatibilityMatrixJob(Job):
+    # machines lists the definition id, name and approximate material diameter of every printer
+    def __init__(self, file_name: str, machine_nodes: Any, machines: List[Tuple[str, str, Optional[float]]], material_settings: str, currency: str,
+                 stage_timer: Optional[StageTimer] = None) -> None:
+        super().__init__()
+
+        self._file_name = file_name
+        self._machine_nodes = machine_nodes
+        self._machines = machines
+        self._material_settings = material_settings
+        self._currency = currency
+        self._stage_timer = stage_timer if stage_timer is not None else StageTimer("Export compatibility matrix")
+
+        self._cancelled = False
+        self._column_count = 0
+        self._exported_count = 0
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        super().cancel()
+
+    def isCancelled(self) -> bool:
+        return self._cancelled
+
+    def getColumnCount(self) -> int:
+        return self._column_count
+
+    def getExportedCount(self) -> int:
+        return self._exported_count
+
+    def getStageTimer(self) -> StageTimer:
+        return self._stage_timer
+
+    def run(self) -> None:
+        stage_timer = self._stage_timer
+        try:
+            with stage_timer.span("json decode"):
+                material_settings = json.loads(self._material_settings)
+        except Exception as e:
+            Logger.logException("e", "Could not load material settings from preferences")
+            self.setError(e)
+            return
+        stage_timer.setCount("json decode", len(material_settings))
+
+        matrix = CompatibilityMatrix(self._currency)
+        with stage_timer.span("container tree traversal"):
+            for (index, (definition_id, machine_name, approximate_material_diameter)) in enumerate(self._machines):
+                if self._cancelled:
+                    return
+                try:
+                    machine_node = self._machine_nodes[definition_id]
+                except Exception:
+                    Logger.logException("w", "Unable to load %s from the container tree", definition_id)
+                    continue
+
+                # printers without nozzle variants have a single empty variant
+                variant_names = sorted(machine_node.variants.keys())
+                for variant_name in variant_names:
+                    column_name = machine_name if len(variant_names) == 1 and variant_name == "empty" else "%s %s" % (machine_name, variant_name)
+                    matrix.addColumn(column_name, (
+                        material_node.getMetadata() for material_node in machine_node.variants[variant_name].materials.values()
+                        if approximate_material_diameter is None or float(material_node.getMetaDataEntry("approximate_diameter", -1)) == approximate_material_diameter
+                    ))
+
+                self.progress.emit(min(100 * (index + 1) / len(self._machines), 99))
+                Job.yieldThread()
+        self._column_count = len(matrix.getColumns())
+        stage_timer.setCount("container tree traversal", matrix.getMaterialCount())
+
+        try:
+            with stage_timer.span("file write"):
+                with AtomicFile(self._file_name, "w", newline = "") as csv_file:
+                    self._exported_count = matrix.write(csv_file, material_settings)
+        except EnvironmentError as e:
+            Logger.logException("e", "Could not export the compatibility matrix to the selected file")
+            self.setError(e)
+            return
+        stage_timer.setCount("file write", self._exported_count)
+        self.progress.emit(100)
@@ -0,0 +1,101 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import codecs
+import io
+try:
+    import csv
+except ImportError:
+    # older versions of Cura somehow ship with a python version that does not include
+    # this file, so a local copy is supplied as a fallback
+    from . import csv  # type: ignore
+
+from typing import IO, Tuple, Type, Union
+
+# Detects the encoding and dialect of a CSV file, such as the semicolon separated cp1252 or UTF-8
+# (with BOM) files that a European version of Excel saves. Only a sample at the start of the file
+# is inspected, so detection takes the same time regardless of the size of the file; the rest of
+# the file is read as a stream with the detected settings.
+class CsvSniffer:
+    SAMPLE_SIZE = 32 * 1024
+    DELIMITERS = ",;\t|"
+    FALLBACK_ENCODING = "cp1252"
+    # error handler for files that are read as UTF-8, registered below
+    FALLBACK_ERRORS = "materialcosttools_cp1252"
+
+    BOMS = [
+        (codecs.BOM_UTF8, "utf-8-sig"),
+        (codecs.BOM_UTF16_LE, "utf-16"),
+        (codecs.BOM_UTF16_BE, "utf-16")
+    ]
+
+    # Returns the file opened as text with the detected encoding, and the detected dialect
+    @classmethod
+    def open(cls, file_name: str) -> Tuple[IO[str], Union[csv.Dialect, Type[csv.Dialect]]]:
+        binary_file = open(file_name, "rb")
+        try:
+            sample = binary_file.read(cls.SAMPLE_SIZE)
+            at_end = len(sample) < cls.SAMPLE_SIZE
+            encoding = cls.detectEncoding(sample, at_end)
+            dialect = cls.detectDialect(cls._decodeSample(sample, encoding, at_end))
+
+            binary_file.seek(0)
+            # undecodable bytes can only be in names, which are used to find materials without a GUID
+            errors = cls.FALLBACK_ERRORS if encoding == "utf-8" else "replace"
+            return (io.TextIOWrapper(binary_file, encoding = encoding, errors = errors, newline = ""), dialect)
+        except:
+            binary_file.close()
+            raise
+
+    @classmethod
+    def detectEncoding(cls, sample: bytes, at_end: bool = True) -> str:
+        for (bom, encoding) in cls.BOMS:
+            if sample.startswith(bom):
+                return encoding
+
+        try:
+            # the sample may end halfway through a multi-byte character
+            codecs.getincrementaldecoder("utf-8")().decode(sample, final = at_end)
+        except UnicodeDecodeError:
+            return cls.FALLBACK_ENCODING
+        return "utf-8"
+
+    @classmethod
+    def detectDialect(cls, sample: str) -> Union[csv.Dialect, Type[csv.Dialect]]:
+        if not sample.strip():
+            return csv.excel
+        try:
+            return csv.Sniffer().sniff(sample, delimiters = cls.DELIMITERS)
+        except csv.Error:
+            pass
+
+        # the sniffer gives up on files with inconsistent rows; use the most common delimiter in the header instead
+        header = sample.splitlines()[0]
+        delimiter = max(cls.DELIMITERS, key = header.count)
+        if header.count(delimiter) == 0 or delimiter == ",":
+            return csv.excel
+
+        class SniffedDialect(csv.excel):
+            pass
+        SniffedDialect.delimiter = delimiter
+        return SniffedDialect
+
+    @staticmethod
+    def _decodeSample(sample: bytes, encoding: str, at_end: bool) -> str:
+        text = codecs.getincrementaldecoder(encoding)(errors = "replace").decode(sample, final = at_end)
+        if not at_end:
+            # do not let the sniffer see the partial row at the end of the sample
+            last_line_end = max(text.rfind("\n"), text.rfind("\r"))
+            if last_line_end > 0:
+                text = text[:last_line_end]
+        return text
+
+    # Decodes the bytes that are not valid UTF-8 with the fallback encoding, for files that were detected as
+    # UTF-8 from a sample with only ASCII characters, but have a cp1252 character further on
+    @classmethod
+    def _decodeAsFallback(cls, error: UnicodeError) -> Tuple[str, int]:
+        if not isinstance(error, UnicodeDecodeError):
+            raise error
+        return (error.object[error.start:error.end].decode(cls.FALLBACK_ENCODING, errors = "replace"), error.end)
+
+codecs.register_error(CsvSniffer.FALLBACK_ERRORS, CsvSniffer._decodeAsFallback)
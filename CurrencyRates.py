@@ -0,0 +1,88 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import json
+import os
+import time
+from threading import Lock
+
+from typing import Any, Dict, List, Optional, Tuple
+
+# Currency symbols that are commonly used as the Cura currency, by ISO 4217 code. Only symbols that
+# belong to a single currency are listed; "$", "kr" or "¥" are used by several currencies, so prices
+# in those are only converted if the ISO code is given.
+CURRENCY_SYMBOLS = {
+    "€": "EUR",
+    "£": "GBP"
+}
+
+# A table of exchange rates, read from a local JSON file in the format that most exchange rate
+# services use: {"base": "EUR", "date": "2022-05-01", "rates": {"USD": 1.05, "GBP": 0.84}}.
+# Tables are cached by path and only read again when the file is modified, so every import can ask
+# for the table without reading the file again.
+class CurrencyRates:
+    _cache = {}  # type: Dict[str, Tuple[float, CurrencyRates]]
+    _cache_lock = Lock()
+
+    def __init__(self, base: str, rates: Dict[str, float], date: float) -> None:
+        self._base = self.normalizeCurrency(base)
+        self._rates = {self.normalizeCurrency(currency): float(rate) for (currency, rate) in rates.items()}
+        self._rates[self._base] = 1.0
+        self._date = date
+
+    @classmethod
+    def load(cls, path: str) -> "CurrencyRates":
+        modified = os.path.getmtime(path)
+        with cls._cache_lock:
+            cached = cls._cache.get(path)
+            if cached is not None and cached[0] == modified:
+                return cached[1]
+
+        with open(path, "r", encoding = "utf-8") as rates_file:
+            data = json.load(rates_file)  # type: Dict[str, Any]
+        if not isinstance(data.get("rates"), dict) or not data.get("base"):
+            raise ValueError("%s does not contain a table of exchange rates" % path)
+
+        # the date of the rates, or else the date the file was saved
+        date = modified
+        if data.get("date"):
+            date = time.mktime(time.strptime(str(data["date"])[:10], "%Y-%m-%d"))
+
+        rates = cls(data["base"], data["rates"], date)
+        with cls._cache_lock:
+            cls._cache[path] = (modified, rates)
+        return rates
+
+    @staticmethod
+    def normalizeCurrency(currency: str) -> str:
+        currency = currency.strip()
+        return CURRENCY_SYMBOLS.get(currency, currency.upper())
+
+    def getBase(self) -> str:
+        return self._base
+
+    def getDate(self) -> float:
+        return self._date
+
+    # Returns the currencies that amounts can be converted from and to
+    def getCurrencies(self) -> List[str]:
+        return sorted(currency for (currency, rate) in self._rates.items() if rate)
+
+    def getAge(self) -> float:
+        return max(time.time() - self._date, 0) / (24 * 60 * 60)
+
+    def isStale(self, max_age_days: float) -> bool:
+        return self.getAge() > max_age_days
+
+    # Returns the factor to multiply an amount in one currency with to get the amount in another
+    # currency, or None if either currency is not in the table
+    def getRate(self, from_currency: str, to_currency: str) -> Optional[float]:
+        from_currency = self.normalizeCurrency(from_currency)
+        to_currency = self.normalizeCurrency(to_currency)
+        if from_currency == to_currency:
+            return 1.0
+        from_rate = self._rates.get(from_currency)
+        to_rate = self._rates.get(to_currency)
+        if not from_rate or not to_rate:
+            return None
+        return to_rate / from_rate
@@ -0,0 +1,40 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import threading
+
+from typing import Any, Dict, Hashable, Tuple
+
+# Keeps the prepared export (the selected and sorted materials and the parsed material settings) of
+# the last export of every scope.
+# The key of an entry is made from everything the rows depend on: the scope, the revision of the
+# material catalog and a hash of the material settings, plus eg the favorites for that scope.
+# When any of these changes the key no longer matches, and the entry of the scope is replaced by the
+# next export, so at most one prepared export per scope is kept.
+class ExportCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries = {}  # type: Dict[Hashable, Tuple[Tuple[Hashable, ...], Any]]
+
+    @staticmethod
+    def makeKey(scope: Hashable, catalog_revision: int, material_settings: str, *key_parts: Hashable) -> Tuple[Hashable, ...]:
+        # the hash of a string is computed once and then stored in the string object
+        return (scope, catalog_revision, hash(material_settings)) + key_parts
+
+    def get(self, key: Tuple[Hashable, ...]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key[0])
+        if entry is None or entry[0] != key:
+            return None
+        return entry[1]
+
+    def put(self, key: Tuple[Hashable, ...], prepared: Any) -> None:
+        with self._lock:
+            self._entries[key[0]] = (key, prepared)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,126 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import json
+
+from UM.Job import Job
+from UM.Logger import Logger
+
+from .AtomicFile import AtomicFile
+from .ExportWriter import ExportWriter
+from .PriceSnapshot import PriceSnapshot
+from .StageTimer import StageTimer
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# The sorted metadata of the materials to export and the material settings
+PreparedExport = Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]]]
+
+class ExportJob(Job):
+    # materials_selector is called from the job thread with the parsed material settings, and returns the metadata of the materials to export
+    # if the materials and settings prepared by an earlier export of the same materials and settings are passed, they are exported as is
+    # extruders optionally lists the extruders each material can be used in, by GUID, for an extruders column
+    # with unit_costs, the file gets the cost per gram, per kilogram and per meter of every material
+    def __init__(self, file_name: str, materials_selector: Callable[[Dict[str, Any]], List[Dict[str, Any]]], material_settings: str, currency: str,
+                 stage_timer: Optional[StageTimer] = None, prepared: Optional[PreparedExport] = None, extruders: Optional[Dict[str, List[str]]] = None,
+                 unit_costs: bool = False) -> None:
+        super().__init__()
+
+        self._file_name = file_name
+        self._materials_selector = materials_selector
+        self._material_settings = material_settings
+        self._currency = currency
+        self._stage_timer = stage_timer if stage_timer is not None else StageTimer("Export")
+        self._prepared = prepared
+        self._extruders = extruders
+        self._unit_costs = unit_costs
+
+        self._cancelled = False
+        self._exported_count = 0
+        self._skipped_rows = []  # type: List[Tuple[str, str]]
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        super().cancel()
+
+    def isCancelled(self) -> bool:
+        return self._cancelled
+
+    def getExportedCount(self) -> int:
+        return self._exported_count
+
+    # The materials that could not be exported, with the reason why
+    def getSkippedRows(self) -> List[Tuple[str, str]]:
+        return self._skipped_rows
+
+    # The sorted materials and the parsed material settings
+    def getPrepared(self) -> Optional[PreparedExport]:
+        return self._prepared
+
+    def getStageTimer(self) -> StageTimer:
+        return self._stage_timer
+
+    def run(self) -> None:
+        stage_timer = self._stage_timer
+        if self._prepared is None:
+            try:
+                with stage_timer.span("json decode"):
+                    material_settings = json.loads(self._material_settings)
+            except Exception as e:
+                Logger.logException("e", "Could not load material settings from preferences")
+                self.setError(e)
+                return
+            stage_timer.setCount("json decode", len(material_settings))
+
+            with stage_timer.span("select materials"):
+                materials_metadata = self._materials_selector(material_settings)
+            stage_timer.setCount("select materials", len(materials_metadata))
+            with stage_timer.span("sort materials"):
+                self._prepared = (ExportWriter.sortMaterials(materials_metadata), material_settings)
+            stage_timer.setCount("sort materials", len(self._prepared[0]))
+        (materials, material_settings) = self._prepared
+
+        # the rows are created while they are written, into a temporary file that replaces the file when it is complete
+        writer = ExportWriter(self._currency)
+        writer.chunk_callback = self._onChunkExported
+        writer.unit_costs = self._unit_costs
+        rows = writer.iterRows(materials, material_settings, self._extruders)
+        try:
+            with stage_timer.span("file write"):
+                if self._file_name.lower().endswith("." + PriceSnapshot.FILE_EXTENSION):
+                    atomic_file = AtomicFile(self._file_name, "wb")
+                    with atomic_file as snapshot_file:
+                        exported_count = PriceSnapshot.write(
+                            snapshot_file, ExportWriter.getRowSettings(rows), self._currency, self._onChunkExported, writer.getSkippedRows()
+                        )
+                        if exported_count is None:
+                            atomic_file.discard()
+                        else:
+                            self._exported_count = exported_count
+                else:
+                    atomic_file = AtomicFile(self._file_name, "w", newline = "")
+                    with atomic_file as csv_file:
+                        if not writer.write(csv_file, rows, len(materials)):
+                            # keep the file as it was
+                            atomic_file.discard()
+                    self._exported_count = writer.getExportedCount()
+        except Exception as e:
+            Logger.logException("e", "Could not export settings to the selected file")
+            self.setError(e)
+            return
+        stage_timer.setCount("file write", self._exported_count)
+
+        self._skipped_rows = writer.getSkippedRows()
+        for (guid, reason) in self._skipped_rows:
+            Logger.log("w", "Skipped material %s: %s", guid, reason)
+        if self._cancelled:
+            return
+
+        self.progress.emit(100)
+
+    def _onChunkExported(self, index: int, total_count: int) -> bool:
+        if self._cancelled:
+            return False
+        self.progress.emit(100 * index / max(total_count, 1))
+        Job.yieldThread()
+        return True
@@ -0,0 +1,166 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import math
+from itertools import chain
+try:
+    import csv
+except ImportError:
+    # older versions of Cura somehow ship with a python version that does not include
+    # this file, so a local copy is supplied as a fallback
+    from . import csv  # type: ignore
+
+from typing import Any, Callable, Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+# Serializes material metadata and material settings to the CSV format that ImportPipeline reads.
+# Does not depend on Uranium, so it can be used both from Cura and from the command line.
+class ExportWriter:
+    CHUNK_SIZE = 500
+
+    def __init__(self, currency: str) -> None:
+        self._currency = currency
+        self._exported_count = 0
+        self._skipped_rows = []  # type: List[Tuple[str, str]]
+        # the weight of a meter of filament, by density and diameter
+        self._grams_per_meter = {}  # type: Dict[Tuple[Any, Any], Optional[float]]
+
+        # when set, the rows get the cost per gram, per kilogram and per meter of filament
+        self.unit_costs = False
+
+        # called after every chunk of rows; returning False stops the export
+        self.chunk_callback = None  # type: Optional[Callable[[int, int], bool]]
+
+    def getExportedCount(self) -> int:
+        return self._exported_count
+
+    # Materials that could not be exported, with the reason why
+    def getSkippedRows(self) -> List[Tuple[str, str]]:
+        return self._skipped_rows
+
+    # Sorts the materials that have a brand by brand, material type and name. Only references to the
+    # metadata are sorted; the rows are created one at a time while they are written.
+    @staticmethod
+    def sortMaterials(materials_metadata: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        materials = [m for m in materials_metadata if "brand" in m]
+        materials.sort(key = lambda m: (m["brand"], m.get("material", ""), m.get("name", "")))
+        return materials
+
+    # Yields the rows of sorted materials. Materials without a GUID, material type or name are skipped.
+    # If extruders is specified, the rows get an extruders column with the extruders each material can be used in, by GUID
+    def iterRows(self, sorted_metadata: Iterable[Dict[str, Any]], material_settings: Dict[str, Dict[str, Any]], extruders: Optional[Dict[str, List[str]]] = None) -> Iterator[Dict[str, Any]]:
+        no_settings = {}  # type: Dict[str, Any]
+        for m in sorted_metadata:
+            try:
+                settings = material_settings.get(m["GUID"], no_settings)
+                row = {
+                    "guid": m["GUID"],
+                    "material": m["material"],
+                    "brand": m["brand"],
+                    "name": m["name"],
+                    "spool_weight": settings.get("spool_weight", ""),
+                    "spool_cost": settings.get("spool_cost", "")
+                }
+            except KeyError as e:
+                self._skipped_rows.append((m.get("GUID", m.get("id", "")), "Material has no %s" % e.args[0]))
+                continue
+            if self.unit_costs:
+                self._addUnitCosts(row, m)
+            if extruders is not None:
+                row["extruders"] = " ".join(extruders.get(row["guid"], []))
+            yield row
+
+    # Returns the weight in grams of a meter of filament of the material, or None if the material has no
+    # density or diameter. The actual diameter is used if the material has one, as the approximate
+    # diameter of 2.85 mm filament is 3 mm.
+    def getGramsPerMeter(self, metadata: Dict[str, Any]) -> Optional[float]:
+        properties = metadata.get("properties", {})
+        key = (properties.get("density"), properties.get("diameter") or metadata.get("approximate_diameter"))
+        try:
+            return self._grams_per_meter[key]
+        except KeyError:
+            pass
+
+        try:
+            # g/cm3 * mm2 * 1000 mm / 1000 mm3/cm3
+            grams_per_meter = float(key[0]) * math.pi * (float(key[1]) / 2) ** 2  # type: Optional[float]
+        except (TypeError, ValueError):
+            grams_per_meter = None
+        if grams_per_meter is not None and (not math.isfinite(grams_per_meter) or grams_per_meter <= 0):
+            grams_per_meter = None
+        self._grams_per_meter[key] = grams_per_meter
+        return grams_per_meter
+
+    # Costs that can not be computed, because the weight, the cost, the density or the diameter is not
+    # known, are left empty
+    def _addUnitCosts(self, row: Dict[str, Any], metadata: Dict[str, Any]) -> None:
+        row["cost_per_gram"] = row["cost_per_kg"] = row["cost_per_meter"] = ""
+        try:
+            cost_per_gram = float(row["spool_cost"]) / float(row["spool_weight"])
+        except (TypeError, ValueError, ZeroDivisionError):
+            return
+        if not math.isfinite(cost_per_gram) or cost_per_gram < 0:
+            return
+        row["cost_per_gram"] = round(cost_per_gram, 5)
+        row["cost_per_kg"] = round(cost_per_gram * 1000, 2)
+        grams_per_meter = self.getGramsPerMeter(metadata)
+        if grams_per_meter is not None:
+            row["cost_per_meter"] = round(cost_per_gram * grams_per_meter, 4)
+
+    @classmethod
+    def prepareRows(cls, materials_metadata: Iterable[Dict[str, Any]], material_settings: Dict[str, Dict[str, Any]], extruders: Optional[Dict[str, List[str]]] = None) -> List[Dict[str, Any]]:
+        return list(cls("").iterRows(cls.sortMaterials(materials_metadata), material_settings, extruders))
+
+    # Returns the weights and prices of the rows, in the format of the cura/material_settings preference
+    @staticmethod
+    def getRowSettings(rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        return {
+            row["guid"]: {key: row[key] for key in ("spool_weight", "spool_cost") if row[key] != ""}
+            for row in rows
+        }
+
+    # Rows can be a list or a generator; total_count is passed to the chunk callback
+    # Returns False if the export was stopped by the chunk callback
+    def write(self, csv_file: IO[str], rows: Iterable[Dict[str, Any]], total_count: Optional[int] = None) -> bool:
+        csv_writer = csv.writer(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        rows = iter(rows)
+        first_row = next(rows, None)
+        # the extra columns come after the cost, so the file can be imported as is
+        unit_cost_columns = first_row is not None and "cost_per_gram" in first_row
+        extruder_column = first_row is not None and "extruders" in first_row
+        header = [
+            "guid",
+            "name",
+            "weight (g)",
+            "cost (%s)" % self._currency
+        ]
+        if unit_cost_columns:
+            header += ["cost per g (%s)" % self._currency, "cost per kg (%s)" % self._currency, "cost per m (%s)" % self._currency]
+        if extruder_column:
+            header.append("extruders")
+        csv_writer.writerow(header)
+
+        if first_row is None:
+            return True
+        for index, material in enumerate(chain([first_row], rows)):
+            if index % self.CHUNK_SIZE == 0 and self.chunk_callback is not None:
+                if not self.chunk_callback(index, total_count or 0):
+                    return False
+
+            try:
+                row = [
+                    material["guid"],
+                    "%s %s" % (material["brand"], material["name"]),
+                    material["spool_weight"],
+                    material["spool_cost"]
+                ]
+                if unit_cost_columns:
+                    row += [material["cost_per_gram"], material["cost_per_kg"], material["cost_per_meter"]]
+                if extruder_column:
+                    row.append(material["extruders"])
+                csv_writer.writerow(row)
+                self._exported_count += 1
+            except (KeyError, ValueError, csv.Error) as e:
+                # errors writing the file itself are not caught, so they stop the export
+                self._skipped_rows.append((material.get("guid", ""), str(e)))
+
+        return True
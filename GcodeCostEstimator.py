@@ -0,0 +1,205 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import math
+import mmap
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+try:
+    import csv
+except ImportError:
+    # older versions of Cura somehow ship with a python version that does not include
+    # this file, so a local copy is supplied as a fallback
+    from . import csv  # type: ignore
+
+from .RowValidator import GUID_PATTERN
+
+from typing import Any, Callable, Dict, IO, Iterable, List, Optional
+
+# Estimates the material cost of sliced files from the filament usage in their header, combined with
+# the spool weight and cost in the material settings. Only the start of each file is read; plain
+# g-code files are memory-mapped so the body of the file is never paged in.
+class GcodeCostEstimator:
+    HEADER_SCAN_SIZE = 64 * 1024
+    UFP_GCODE_PATH = "3D/model.gcode"
+    MAX_WORKERS = 8
+
+    GRIFFIN_PATTERN = re.compile(r"EXTRUDER_TRAIN\.(\d+)\.(MATERIAL\.VOLUME_USED|MATERIAL\.GUID|NOZZLE\.DIAMETER)")
+    MATERIAL_PATTERN = re.compile(r"MATERIAL(\d*)")
+
+    def __init__(self, material_settings: Dict[str, Dict[str, Any]], get_material_metadata: Callable[[str], Optional[Dict[str, Any]]]) -> None:
+        self._material_settings = material_settings
+        self._get_material_metadata = get_material_metadata
+
+        # used for files that do not specify which material they were sliced for
+        self.default_material_guid = None  # type: Optional[str]
+
+    def estimateFiles(self, file_names: Iterable[str], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        with ThreadPoolExecutor(max_workers = max_workers or self.MAX_WORKERS) as executor:
+            return list(executor.map(self.estimateFile, file_names))
+
+    def estimateFile(self, file_name: str) -> Dict[str, Any]:
+        result = {
+            "file": file_name,
+            "extruders": [],
+            "weight": 0.0,
+            "cost": 0.0,
+            "error": None
+        }  # type: Dict[str, Any]
+
+        try:
+            header = self.readHeader(file_name)
+        except (EnvironmentError, ValueError, zipfile.BadZipFile) as e:
+            result["error"] = str(e)
+            return result
+
+        usage = self.parseHeader(header)
+        if not usage:
+            result["error"] = "No filament usage found in header"
+            return result
+
+        for (extruder_nr, extruder_usage) in sorted(usage.items()):
+            estimate = self._estimateExtruder(extruder_nr, extruder_usage)
+            result["extruders"].append(estimate)
+            if estimate["weight"] is not None:
+                result["weight"] += estimate["weight"]
+            if estimate["cost"] is None:
+                result["cost"] = None
+            elif result["cost"] is not None:
+                result["cost"] += estimate["cost"]
+
+        return result
+
+    @classmethod
+    def readHeader(cls, file_name: str) -> str:
+        if zipfile.is_zipfile(file_name):
+            with zipfile.ZipFile(file_name) as archive:
+                with archive.open(cls.UFP_GCODE_PATH) as gcode_file:
+                    data = gcode_file.read(cls.HEADER_SCAN_SIZE)
+        else:
+            with open(file_name, "rb") as gcode_file:
+                try:
+                    mapped_file = mmap.mmap(gcode_file.fileno(), 0, access = mmap.ACCESS_READ)
+                except ValueError:
+                    # empty files can not be mapped
+                    return ""
+                with mapped_file:
+                    data = mapped_file[:cls.HEADER_SCAN_SIZE]
+
+        end_of_header = data.find(b";END_OF_HEADER")
+        if end_of_header >= 0:
+            data = data[:end_of_header]
+        return data.decode("utf-8", errors = "replace")
+
+    # Returns the material guid, the used volume (mm3) or length (m) and the filament diameter per extruder
+    @classmethod
+    def parseHeader(cls, header: str) -> Dict[int, Dict[str, Any]]:
+        usage = {}  # type: Dict[int, Dict[str, Any]]
+        for line in header.splitlines():
+            if not line.startswith(";") or ":" not in line:
+                continue
+            (key, value) = line[1:].split(":", 1)
+            key = key.strip()
+            value = value.strip()
+
+            match = cls.GRIFFIN_PATTERN.fullmatch(key)
+            if match:
+                extruder_usage = usage.setdefault(int(match.group(1)), {})
+                if match.group(2) == "MATERIAL.VOLUME_USED":
+                    extruder_usage["volume"] = cls._parseFloat(value)
+                elif match.group(2) == "MATERIAL.GUID":
+                    extruder_usage["guid"] = value
+                else:
+                    extruder_usage["nozzle"] = cls._parseFloat(value)
+                continue
+
+            if key.lower() == "filament used":
+                # eg ";Filament used: 1.23456m, 0.5m"
+                for (extruder_nr, length) in enumerate(value.split(",")):
+                    length = length.strip().rstrip("m")
+                    usage.setdefault(extruder_nr, {})["length"] = cls._parseFloat(length)
+                continue
+
+            match = cls.MATERIAL_PATTERN.fullmatch(key)
+            if match and GUID_PATTERN.fullmatch(value):
+                # eg ";MATERIAL:<guid>" and ";MATERIAL2:<guid>" from start g-code
+                extruder_nr = int(match.group(1)) - 1 if match.group(1) else 0
+                usage.setdefault(extruder_nr, {})["guid"] = value
+
+        return {
+            extruder_nr: extruder_usage for (extruder_nr, extruder_usage) in usage.items()
+            if extruder_usage.get("volume") or extruder_usage.get("length")
+        }
+
+    def _estimateExtruder(self, extruder_nr: int, usage: Dict[str, Any]) -> Dict[str, Any]:
+        guid = usage.get("guid") or self.default_material_guid
+        estimate = {
+            "extruder": extruder_nr,
+            "guid": guid,
+            "name": "",
+            "weight": None,
+            "cost": None
+        }  # type: Dict[str, Any]
+        if not guid:
+            return estimate
+
+        metadata = self._get_material_metadata(guid)
+        properties = metadata.get("properties", {}) if metadata else {}
+        if metadata:
+            estimate["name"] = "%s %s" % (metadata.get("brand", ""), metadata.get("name", ""))
+
+        density = self._parseFloat(properties.get("density"))
+        volume = usage.get("volume")
+        if volume is None:
+            diameter = self._parseFloat(properties.get("diameter"))
+            if diameter is None:
+                return estimate
+            # length is in m, volume in mm3
+            volume = usage["length"] * 1000 * math.pi * (diameter / 2) ** 2
+        if density is None:
+            return estimate
+
+        weight = volume / 1000 * density  # density is in g/cm3
+        estimate["weight"] = weight
+
+        settings = self._material_settings.get(guid, {})
+        spool_cost = settings.get("spool_cost")
+        spool_weight = settings.get("spool_weight")
+        if spool_cost is not None and spool_weight:
+            estimate["cost"] = weight / spool_weight * spool_cost
+        return estimate
+
+    @staticmethod
+    def writeReport(csv_file: IO[str], results: List[Dict[str, Any]], currency: str) -> None:
+        csv_writer = csv.writer(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        csv_writer.writerow(["file", "extruder", "guid", "name", "weight (g)", "cost (%s)" % currency, "error"])
+
+        total_weight = 0.0
+        total_cost = 0.0
+        for result in results:
+            if result["error"]:
+                csv_writer.writerow([result["file"], "", "", "", "", "", result["error"]])
+                continue
+            for estimate in result["extruders"]:
+                csv_writer.writerow([
+                    result["file"],
+                    estimate["extruder"],
+                    estimate["guid"] or "",
+                    estimate["name"],
+                    "" if estimate["weight"] is None else "%.2f" % estimate["weight"],
+                    "" if estimate["cost"] is None else "%.2f" % estimate["cost"],
+                    ""
+                ])
+            total_weight += result["weight"]
+            # the total includes the extruders of files that could not be fully costed
+            total_cost += sum(estimate["cost"] for estimate in result["extruders"] if estimate["cost"] is not None)
+
+        csv_writer.writerow(["total", "", "", "", "%.2f" % total_weight, "%.2f" % total_cost, ""])
+
+    @staticmethod
+    def _parseFloat(value: Any) -> Optional[float]:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,67 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import json
+
+from UM.Job import Job
+from UM.Logger import Logger
+
+from .AtomicFile import AtomicFile
+from .GcodeCostEstimator import GcodeCostEstimator
+
+from typing import Any, Callable, Dict, List, Optional
+
+class GcodeCostJob(Job):
+    def __init__(self, file_names: List[str], report_file_name: str, material_settings: str, currency: str, get_material_metadata: Callable[[str], Optional[Dict[str, Any]]]) -> None:
+        super().__init__()
+
+        self._file_names = file_names
+        self._report_file_name = report_file_name
+        self._material_settings = material_settings
+        self._currency = currency
+        self._get_material_metadata = get_material_metadata
+
+        self._cancelled = False
+        self._results = []  # type: List[Dict[str, Any]]
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        super().cancel()
+
+    def isCancelled(self) -> bool:
+        return self._cancelled
+
+    def getResults(self) -> List[Dict[str, Any]]:
+        return self._results
+
+    def run(self) -> None:
+        try:
+            material_settings = json.loads(self._material_settings)
+        except Exception as e:
+            Logger.logException("e", "Could not load material settings from preferences")
+            self.setError(e)
+            return
+
+        estimator = GcodeCostEstimator(material_settings, self._get_material_metadata)
+        # files are estimated in batches, so progress can be reported and the job can be cancelled
+        batch_size = GcodeCostEstimator.MAX_WORKERS * 4
+        for start in range(0, len(self._file_names), batch_size):
+            if self._cancelled:
+                return
+            self.progress.emit(100 * start / len(self._file_names))
+            self._results.extend(estimator.estimateFiles(self._file_names[start:start + batch_size]))
+
+        for result in self._results:
+            if result["error"]:
+                Logger.log("w", "Could not estimate cost of %s: %s", result["file"], result["error"])
+
+        try:
+            # a report that can not be written in full does not replace an earlier report
+            with AtomicFile(self._report_file_name, "w", newline = "") as csv_file:
+                GcodeCostEstimator.writeReport(csv_file, self._results, self._currency)
+        except Exception as e:
+            Logger.logException("e", "Could not write cost report to the selected file")
+            self.setError(e)
+            return
+
+        self.progress.emit(100)
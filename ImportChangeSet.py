@@ -0,0 +1,98 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+from itertools import chain
+
+from typing import Any, Dict, Optional, Set
+
+# The difference between imported rows and the current material settings.
+# Only fields that differ from the current settings are recorded, so applying the change set
+# leaves any other data that is stored for a material untouched.
+class ImportChangeSet:
+    def __init__(self, material_settings: Dict[str, Dict[str, Any]]) -> None:
+        self._material_settings = material_settings
+
+        self._added = {}  # type: Dict[str, Dict[str, Any]]
+        self._changed = {}  # type: Dict[str, Dict[str, Any]]
+        self._unchanged = set()  # type: Set[str]
+        self._invalid_count = 0
+        self._empty_count = 0
+
+    def addRow(self, guid: str, data: Dict[str, Any]) -> None:
+        if not data:
+            self._empty_count += 1
+            return
+
+        if guid in self._added:
+            # the same material is listed more than once in the file; the last row wins
+            self._added[guid].update(data)
+            return
+
+        current = self._material_settings.get(guid)
+        if current is None:
+            self._added[guid] = dict(data)
+            return
+
+        # the same material may be listed more than once in the file; the rows are merged and the last
+        # row wins, so a material is counted once and a later row can undo the change of an earlier one
+        merged = dict(self._changed.get(guid, {}))
+        merged.update(data)
+        changed_fields = {
+            key: value for key, value in merged.items()
+            if current.get(key) != value
+        }
+        if changed_fields:
+            self._changed[guid] = changed_fields
+            self._unchanged.discard(guid)
+        else:
+            self._changed.pop(guid, None)
+            self._unchanged.add(guid)
+
+    def addInvalidRow(self) -> None:
+        self._invalid_count += 1
+
+    def isEmpty(self) -> bool:
+        return not self._added and not self._changed
+
+    def getAdded(self) -> Dict[str, Dict[str, Any]]:
+        return self._added
+
+    def getChanged(self) -> Dict[str, Dict[str, Any]]:
+        return self._changed
+
+    def getAddedCount(self) -> int:
+        return len(self._added)
+
+    def getChangedCount(self) -> int:
+        return len(self._changed)
+
+    def getUnchangedCount(self) -> int:
+        return len(self._unchanged)
+
+    def getInvalidCount(self) -> int:
+        return self._invalid_count
+
+    def getEmptyCount(self) -> int:
+        return self._empty_count
+
+    def applyTo(self, material_settings: Dict[str, Dict[str, Any]]) -> None:
+        for guid, data in self._added.items():
+            material_settings.setdefault(guid, {}).update(data)
+        for guid, data in self._changed.items():
+            material_settings.setdefault(guid, {}).update(data)
+
+    # Returns copies of the complete settings of the added and changed materials before applying the
+    # change set, with None for materials that had no settings
+    def getPreviousSettings(self, material_settings: Dict[str, Dict[str, Any]]) -> Dict[str, Optional[Dict[str, Any]]]:
+        return {
+            guid: dict(material_settings[guid]) if guid in material_settings else None
+            for guid in chain(self._added, self._changed)
+        }
+
+    # Returns the complete settings of the added and changed materials, after applying the change set
+    def getAppliedSettings(self, material_settings: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        return {
+            guid: material_settings[guid]
+            for guid in chain(self._added, self._changed)
+            if guid in material_settings
+        }
@@ -0,0 +1,231 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import os
+import json
+
+from UM.Job import Job
+from UM.Logger import Logger
+
+from .CsvSniffer import CsvSniffer
+from .CurrencyRates import CurrencyRates
+from .ImportChangeSet import ImportChangeSet
+from .ImportPipeline import ImportPipeline
+from .MultiFileImport import MultiFileImport, LAST_FILE_WINS
+from .PriceSnapshot import PriceSnapshot
+from .RowValidator import ValidationReport, ISSUE_MESSAGES
+from .StageTimer import StageTimer
+
+from typing import Any, Callable, Dict, Iterator, IO, List, Optional, Tuple
+
+class ImportJob(Job):
+    # costs in another currency than target_currency are converted if currency_rates has a rate for them
+    # name_resolver looks up the material of rows without a valid GUID by name; see RowValidator.name_resolver
+    def __init__(self, file_names: List[str], material_settings: str, is_known_guid: Optional[Callable[[str], bool]] = None, conflict_policy: str = LAST_FILE_WINS,
+                 currency_rates: Optional[CurrencyRates] = None, target_currency: Optional[str] = None, stage_timer: Optional[StageTimer] = None,
+                 name_resolver: Optional[Callable[[str], Tuple[Optional[str], List[Tuple[str, str, float]]]]] = None) -> None:
+        super().__init__()
+
+        self._file_names = file_names
+        self._material_settings = material_settings
+        self._is_known_guid = is_known_guid
+        self._conflict_policy = conflict_policy
+        self._currency_rates = currency_rates
+        self._target_currency = target_currency
+        self._name_resolver = name_resolver
+        # files whose rows are only used to resolve conflicts; see MultiFileImport.reference_file_names
+        self._reference_file_names = []  # type: List[str]
+        self._stage_timer = stage_timer if stage_timer is not None else StageTimer("Import")
+
+        self._cancelled = False
+        self._change_set = None  # type: Optional[ImportChangeSet]
+        self._unknown_count = 0
+        self._currencies = {}  # type: Dict[str, str]
+        self._conversions = {}  # type: Dict[str, Tuple[str, float]]
+        self._conflicts = []  # type: List[Dict[str, Any]]
+        self._errors = {}  # type: Dict[str, str]
+        self._serialized_settings = None  # type: Optional[str]
+        self._previous_settings = {}  # type: Dict[str, Optional[Dict[str, Any]]]
+        self._applied_settings = {}  # type: Dict[str, Dict[str, Any]]
+        self._report = ValidationReport()
+
+        self._file_size = 1
+        self._characters_read = 0
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        super().cancel()
+
+    def isCancelled(self) -> bool:
+        return self._cancelled
+
+    def getFileNames(self) -> List[str]:
+        return self._file_names
+
+    def getChangeSet(self) -> Optional[ImportChangeSet]:
+        return self._change_set
+
+    def getUnknownCount(self) -> int:
+        return self._unknown_count
+
+    # The currencies specified in the headers of the files, by file name
+    def getCurrencies(self) -> Dict[str, str]:
+        return self._currencies
+
+    # The currency the costs were converted from and the rate, by file name
+    def getConversions(self) -> Dict[str, Tuple[str, float]]:
+        return self._conversions
+
+    def getConflicts(self) -> List[Dict[str, Any]]:
+        return self._conflicts
+
+    # The files that could not be imported at all when importing more than one file, with the reason why
+    def getErrors(self) -> Dict[str, str]:
+        return self._errors
+
+    # The rows that could not be imported (in full), with the reason why
+    def getReport(self) -> ValidationReport:
+        return self._report
+
+    # The serialized material settings the job started from
+    def getMaterialSettings(self) -> str:
+        return self._material_settings
+
+    def getSerializedSettings(self) -> Optional[str]:
+        return self._serialized_settings
+
+    # The settings of the added and changed materials before the import, for the journal
+    def getPreviousSettings(self) -> Dict[str, Optional[Dict[str, Any]]]:
+        return self._previous_settings
+
+    def getAppliedSettings(self) -> Dict[str, Dict[str, Any]]:
+        return self._applied_settings
+
+    def getStageTimer(self) -> StageTimer:
+        return self._stage_timer
+
+    def run(self) -> None:
+        stage_timer = self._stage_timer
+        try:
+            with stage_timer.span("json decode"):
+                material_settings = json.loads(self._material_settings)
+        except Exception as e:
+            Logger.logException("e", "Could not load material settings from preferences")
+            self.setError(e)
+            return
+        stage_timer.setCount("json decode", len(material_settings))
+
+        change_set = ImportChangeSet(material_settings)
+        try:
+            if len(self._file_names) == 1 and not self._reference_file_names:
+                completed = self._importFile(self._file_names[0], change_set)
+            else:
+                completed = self._importFiles(change_set)
+        except Exception as e:
+            Logger.logException("e", "Could not import settings from the selected file")
+            self.setError(e)
+            return
+
+        if not completed or self._cancelled:
+            return
+
+        if self._unknown_count:
+            Logger.log("i", "Imported weights and prices for %d materials that are not installed", self._unknown_count)
+
+        self._change_set = change_set
+        if not change_set.isEmpty():
+            # only the changed fields are merged, other data stored for a material is left as is
+            with stage_timer.span("apply changes", change_set.getAddedCount() + change_set.getChangedCount()):
+                self._previous_settings = change_set.getPreviousSettings(material_settings)
+                change_set.applyTo(material_settings)
+                self._applied_settings = change_set.getAppliedSettings(material_settings)
+            with stage_timer.span("json encode", len(material_settings)):
+                self._serialized_settings = json.dumps(material_settings)
+        self.progress.emit(100)
+
+    def _importFile(self, file_name: str, change_set: ImportChangeSet) -> bool:
+        self._report = ValidationReport(os.path.basename(file_name))
+        pipeline = ImportPipeline(change_set, self._is_known_guid, self._report)
+        pipeline.issue_callback = self._onRowIssue
+        pipeline.chunk_callback = self._onChunkImported
+        pipeline.currency_rates = self._currency_rates
+        pipeline.target_currency = self._target_currency
+        pipeline.name_resolver = self._name_resolver
+
+        # reading the file is not timed separately, because the rows are streamed through the pipeline
+        with self._stage_timer.span("read, validate and merge rows"):
+            if PriceSnapshot.isSnapshot(file_name):
+                completed = pipeline.runSnapshot(PriceSnapshot.load(file_name))
+            else:
+                self._file_size = max(os.path.getsize(file_name), 1)
+                (csv_file, dialect) = CsvSniffer.open(file_name)
+                with csv_file:
+                    completed = pipeline.run(self._readLines(csv_file), dialect)
+        self._stage_timer.setCount("read, validate and merge rows", pipeline.getRowCount())
+        if not completed:
+            return False
+
+        currency = pipeline.getCurrency()
+        if currency is not None:
+            self._currencies[file_name] = currency
+        conversion = pipeline.getConversion()
+        if conversion is not None:
+            self._conversions[file_name] = conversion
+            Logger.log("i", "Converted costs in %s from %s at a rate of %f", file_name, conversion[0], conversion[1])
+        self._unknown_count = pipeline.getUnknownCount()
+        return True
+
+    def _importFiles(self, change_set: ImportChangeSet) -> bool:
+        multi_file_import = MultiFileImport(self._file_names, self._conflict_policy)
+        multi_file_import.currency_rates = self._currency_rates
+        multi_file_import.target_currency = self._target_currency
+        multi_file_import.name_resolver = self._name_resolver
+        multi_file_import.reference_file_names = self._reference_file_names
+        multi_file_import.continue_callback = lambda: not self._cancelled
+        multi_file_import.progress_callback = lambda parsed_count, total_count: self.progress.emit(min(100 * parsed_count / total_count, 99))
+        with self._stage_timer.span("read and validate files", len(self._file_names)):
+            if not multi_file_import.parse():
+                return False
+
+        self._errors = multi_file_import.getErrors()
+        for (file_name, error) in self._errors.items():
+            Logger.log("e", "Could not import settings from %s: %s", file_name, error)
+        if not multi_file_import.getResults():
+            raise ValueError("None of the selected files could be imported")
+
+        for _ in range(multi_file_import.getInvalidCount()):
+            change_set.addInvalidRow()
+        with self._stage_timer.span("merge files"):
+            merged = multi_file_import.merge()
+            for (guid, data) in merged.items():
+                change_set.addRow(guid, data)
+                if self._is_known_guid is not None and not self._is_known_guid(guid):
+                    self._unknown_count += 1
+        self._stage_timer.setCount("merge files", len(merged))
+
+        self._report = multi_file_import.getReport()
+        for (code, count) in self._report.getCounts().items():
+            Logger.log("w", "%s: %d rows", ISSUE_MESSAGES[code], count)
+        self._currencies = multi_file_import.getCurrencies()
+        self._conversions = multi_file_import.getConversions()
+        for (file_name, conversion) in self._conversions.items():
+            Logger.log("i", "Converted costs in %s from %s at a rate of %f", file_name, conversion[0], conversion[1])
+        self._conflicts = multi_file_import.getConflicts()
+        for conflict in self._conflicts:
+            Logger.log("i", "Conflicting weights and prices: %s", MultiFileImport.formatConflict(conflict))
+        return True
+
+    def _onRowIssue(self, line_number: int, code: str, row: List[str]) -> None:
+        Logger.log("w", "Line %d: %s: %s", line_number, ISSUE_MESSAGES[code], row)
+
+    def _onChunkImported(self, row_count: int) -> bool:
+        if self._cancelled:
+            return False
+        self.progress.emit(min(100 * self._characters_read / self._file_size, 99))
+        Job.yieldThread()
+        return True
+
+    def _readLines(self, csv_file: IO[str]) -> Iterator[str]:
+        for line in csv_file:
+            self._characters_read += len(line)
+            yield line
@@ -0,0 +1,163 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import re
+from itertools import islice
+try:
+    import csv
+except ImportError:
+    # older versions of Cura somehow ship with a python version that does not include
+    # this file, so a local copy is supplied as a fallback
+    from . import csv  # type: ignore
+
+from .CsvSniffer import CsvSniffer
+from .CurrencyRates import CurrencyRates
+from .ImportChangeSet import ImportChangeSet
+from .PriceSnapshot import PriceSnapshot
+from .RowValidator import RowValidator, ValidationReport, UNKNOWN_GUID
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+
+CURRENCY_PATTERN = re.compile(r"cost\s\((.*)\)")
+
+# Imports rows from a CSV file into a change set, as a chain of generators (read, validate, merge).
+# Rows are read and validated in chunks and are not kept after they are merged, so apart from the
+# change set the memory use does not depend on the size of the file.
+class ImportPipeline:
+    CHUNK_SIZE = 1000
+
+    def __init__(self, change_set: ImportChangeSet, is_known_guid: Optional[Callable[[str], bool]] = None, report: Optional[ValidationReport] = None) -> None:
+        self._change_set = change_set
+        self._validator = RowValidator(is_known_guid, report)
+
+        self._currency = None  # type: Optional[str]
+        self._conversion = None  # type: Optional[Tuple[str, float]]
+        self._row_count = 0
+
+        # when set, costs in another currency than the target currency are converted with these rates
+        self.currency_rates = None  # type: Optional[CurrencyRates]
+        self.target_currency = None  # type: Optional[str]
+
+        # called after every chunk of rows; returning False stops the import
+        self.chunk_callback = None  # type: Optional[Callable[[int], bool]]
+
+    # called with the line number, issue code and offending row for every issue found in the file
+    @property
+    def issue_callback(self) -> Optional[Callable[[int, str, List[str]], None]]:
+        return self._validator.issue_callback
+
+    @issue_callback.setter
+    def issue_callback(self, callback: Optional[Callable[[int, str, List[str]], None]]) -> None:
+        self._validator.issue_callback = callback
+
+    # The currency of the imported costs; this is the target currency if the costs were converted
+    def getCurrency(self) -> Optional[str]:
+        return self._currency
+
+    # The currency the costs were converted from and the rate, if they were converted
+    def getConversion(self) -> Optional[Tuple[str, float]]:
+        return self._conversion
+
+    # looks up the material of rows without a valid GUID by name; see RowValidator.name_resolver
+    @property
+    def name_resolver(self) -> Optional[Callable[[str], Tuple[Optional[str], List[Tuple[str, str, float]]]]]:
+        return self._validator.name_resolver
+
+    @name_resolver.setter
+    def name_resolver(self, resolver: Optional[Callable[[str], Tuple[Optional[str], List[Tuple[str, str, float]]]]]) -> None:
+        self._validator.name_resolver = resolver
+
+    def getReport(self) -> ValidationReport:
+        return self._validator.getReport()
+
+    def getUnknownCount(self) -> int:
+        return self._validator.getReport().getCount(UNKNOWN_GUID)
+
+    def getRowCount(self) -> int:
+        return self._row_count
+
+    # Returns False if the import was stopped by the chunk callback
+    def run(self, lines: Iterable[str], dialect: Union[csv.Dialect, Type[csv.Dialect]] = csv.excel) -> bool:
+        rows = self._read(lines, dialect)
+
+        header = next(rows, None)
+        if header is not None:
+            self._parseHeader(header)
+        self._prepareConversion()
+
+        for _ in self._merge(self._validate(self._chunk(rows))):
+            if self.chunk_callback is not None and not self.chunk_callback(self._row_count):
+                return False
+        return True
+
+    # Imports a price snapshot, which does not need to be parsed or validated
+    def runSnapshot(self, snapshot: PriceSnapshot) -> bool:
+        self._currency = snapshot.getCurrency()
+        self._prepareConversion()
+        rows = snapshot.iterRows(self._conversion[1] if self._conversion else 1.0)
+        for _ in self._merge(self._checkKnownGuids(self._chunk(rows))):
+            if self.chunk_callback is not None and not self.chunk_callback(self._row_count):
+                return False
+        return True
+
+    # Imports a CSV file or a price snapshot
+    def runFile(self, file_name: str) -> bool:
+        if PriceSnapshot.isSnapshot(file_name):
+            return self.runSnapshot(PriceSnapshot.load(file_name))
+        (csv_file, dialect) = CsvSniffer.open(file_name)
+        with csv_file:
+            return self.run(csv_file, dialect)
+
+    def _read(self, lines: Iterable[str], dialect: Union[csv.Dialect, Type[csv.Dialect]]) -> Iterator[List[str]]:
+        return csv.reader(lines, dialect)
+
+    def _parseHeader(self, row: List[str]) -> None:
+        if len(row) < 4:
+            return
+        match = CURRENCY_PATTERN.search(row[3])
+        if match:
+            self._currency = match.group(1)
+
+    def _prepareConversion(self) -> None:
+        if self._currency is None or self.currency_rates is None or self.target_currency is None:
+            return
+        if CurrencyRates.normalizeCurrency(self._currency) == CurrencyRates.normalizeCurrency(self.target_currency):
+            # eg "€" and "EUR"
+            self._currency = self.target_currency
+            return
+        rate = self.currency_rates.getRate(self._currency, self.target_currency)
+        if rate is None:
+            # leave it to the user to decide whether to import the costs as is
+            return
+        self._conversion = (self._currency, rate)
+        self._currency = self.target_currency
+        self._validator.cost_factor = rate
+
+    def _chunk(self, rows: Iterator[Any]) -> Iterator[List[Any]]:
+        while True:
+            chunk = list(islice(rows, self.CHUNK_SIZE))
+            if not chunk:
+                return
+            yield chunk
+
+    def _validate(self, chunks: Iterator[List[List[str]]]) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        for chunk in chunks:
+            # the header is line 1
+            (valid_rows, invalid_count) = self._validator.validateChunk(chunk, self._row_count + 2)
+            self._row_count += len(chunk)
+            for _ in range(invalid_count):
+                self._change_set.addInvalidRow()
+            yield valid_rows
+
+    def _checkKnownGuids(self, chunks: Iterator[List[Tuple[str, Dict[str, Any]]]]) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        for chunk in chunks:
+            self._validator.checkKnownGuids(chunk, self._row_count + 1)
+            self._row_count += len(chunk)
+            yield chunk
+
+    def _merge(self, chunks: Iterator[List[Tuple[str, Dict[str, Any]]]]) -> Iterator[None]:
+        add_row = self._change_set.addRow
+        for chunk in chunks:
+            for (guid, data) in chunk:
+                add_row(guid, data)
+            yield None
@@ -0,0 +1,166 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import threading
+
+from .MaterialNameIndex import MaterialNameIndex
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Index of base materials (the containers for which id == base_file), so exports and imports can
+# look up materials without scanning all material variant containers in the registry.
+# The index is built once from the registry metadata and then kept up to date from the
+# containerAdded/containerRemoved/containerMetaDataChanged signals of the registry.
+class MaterialCatalog:
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+
+        self._materials = {}  # type: Dict[str, Dict[str, Any]]
+        self._by_guid = {}  # type: Dict[str, Set[str]]
+        self._by_brand = {}  # type: Dict[str, Set[str]]
+        self._by_diameter = {}  # type: Dict[float, Set[str]]
+        # incremented on every change, so results derived from the catalog can be cached
+        self._revision = 0
+        # built when names are first matched, and again after the catalog has changed
+        self._name_index = None  # type: Optional[MaterialNameIndex]
+        self._name_index_revision = -1
+
+        self._registry = None  # type: Any
+
+    def attachToRegistry(self, registry: Any) -> None:
+        if self._registry is not None:
+            return
+        self._registry = registry
+
+        self.rebuild(registry.findInstanceContainersMetadata(type = "material"))
+
+        registry.containerAdded.connect(self._onContainerAdded)
+        registry.containerRemoved.connect(self._onContainerRemoved)
+        metadata_changed_signal = getattr(registry, "containerMetaDataChanged", None)
+        if metadata_changed_signal is not None:
+            metadata_changed_signal.connect(self._onContainerMetaDataChanged)
+
+    def rebuild(self, materials_metadata: Iterable[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._materials = {}
+            self._by_guid = {}
+            self._by_brand = {}
+            self._by_diameter = {}
+            self._revision += 1
+
+            for metadata in materials_metadata:
+                self.addMaterial(metadata)
+
+    def addMaterial(self, metadata: Dict[str, Any]) -> None:
+        if "base_file" not in metadata or metadata.get("id") != metadata["base_file"] or "GUID" not in metadata:
+            return
+
+        base_file = metadata["base_file"]
+        with self._lock:
+            if base_file in self._materials:
+                self.removeMaterial(base_file)
+
+            self._materials[base_file] = metadata
+            self._revision += 1
+            self._by_guid.setdefault(metadata["GUID"], set()).add(base_file)
+            self._by_brand.setdefault(metadata.get("brand", ""), set()).add(base_file)
+            diameter = self._diameterKey(metadata)
+            if diameter is not None:
+                self._by_diameter.setdefault(diameter, set()).add(base_file)
+
+    def removeMaterial(self, base_file: str) -> None:
+        with self._lock:
+            metadata = self._materials.pop(base_file, None)
+            if metadata is None:
+                return
+            self._revision += 1
+
+            self._discard(self._by_guid, metadata["GUID"], base_file)
+            self._discard(self._by_brand, metadata.get("brand", ""), base_file)
+            diameter = self._diameterKey(metadata)
+            if diameter is not None:
+                self._discard(self._by_diameter, diameter, base_file)
+
+    def getRevision(self) -> int:
+        return self._revision
+
+    def __len__(self) -> int:
+        return len(self._materials)
+
+    def getAll(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._materials.values())
+
+    def getByBaseFiles(self, base_files: Iterable[str]) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._materials[base_file] for base_file in base_files if base_file in self._materials]
+
+    def getByGuids(self, guids: Iterable[str]) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                self._materials[base_file]
+                for guid in guids
+                for base_file in self._by_guid.get(guid, ())
+            ]
+
+    def getByGuid(self, guid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for base_file in self._by_guid.get(guid, ()):
+                return self._materials[base_file]
+        return None
+
+    def getByBrand(self, brand: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._materials[base_file] for base_file in self._by_brand.get(brand, ())]
+
+    def getByDiameter(self, diameter: float) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._materials[base_file] for base_file in self._by_diameter.get(float(diameter), ())]
+
+    def hasGuid(self, guid: str) -> bool:
+        return guid in self._by_guid
+
+    def getNameIndex(self) -> MaterialNameIndex:
+        with self._lock:
+            if self._name_index is None or self._name_index_revision != self._revision:
+                self._name_index = MaterialNameIndex(self._materials.values())
+                self._name_index_revision = self._revision
+            return self._name_index
+
+    # Returns the GUID of the material a "brand name" text describes, if exactly one material matches,
+    # and the best matching materials; see MaterialNameIndex.match()
+    def matchName(self, text: str) -> Tuple[Optional[str], List[Tuple[str, str, float]]]:
+        return self.getNameIndex().match(text)
+
+    def _onContainerAdded(self, container: Any) -> None:
+        if container.getMetaDataEntry("type") != "material":
+            return
+        self.addMaterial(container.getMetaData())
+
+    def _onContainerRemoved(self, container: Any) -> None:
+        if container.getMetaDataEntry("type") != "material":
+            return
+        self.removeMaterial(container.getId())
+
+    def _onContainerMetaDataChanged(self, container: Any, *args: Any, **kwargs: Any) -> None:
+        if container.getMetaDataEntry("type") != "material":
+            return
+        # the GUID, brand or diameter may have changed, so the material is reindexed as a whole
+        self.removeMaterial(container.getId())
+        self.addMaterial(container.getMetaData())
+
+    @staticmethod
+    def _diameterKey(metadata: Dict[str, Any]) -> Optional[float]:
+        try:
+            return float(metadata["approximate_diameter"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _discard(index: Dict[Any, Set[str]], key: Any, base_file: str) -> None:
+        base_files = index.get(key)
+        if base_files is None:
+            return
+        base_files.discard(base_file)
+        if not base_files:
+            del index[key]
@@ -3,31 +3,24 @@
 
 USE_QT5 = False
 try:
-    from PyQt6.QtCore import QObject
-    from PyQt6.QtWidgets import QFileDialog, QMessageBox
+    from PyQt6.QtCore import QObject, QTimer
+    from PyQt6.QtWidgets import QFileDialog, QInputDialog, QMessageBox
     QMessageBoxStandardButtons = QMessageBox.StandardButton
 except ImportError:
-    from PyQt5.QtCore import QObject
-    from PyQt5.QtWidgets import QFileDialog, QMessageBox
+    from PyQt5.QtCore import QObject, QTimer
+    from PyQt5.QtWidgets import QFileDialog, QInputDialog, QMessageBox
     QMessageBoxStandardButtons = QMessageBox
     USE_QT5 = True
 
 import os.path
 import sys
-import json
-import re
-from uuid import UUID
-try:
-    import csv
-except ImportError:
-    # older versions of Cura somehow ship with a python version that does not include
-    # this file, so a local copy is supplied as a fallback
-    from . import csv  # type: ignore
 
 from UM.Extension import Extension
+from UM.Job import Job
 from UM.Application import Application
 from UM.Logger import Logger
 from UM.Message import Message
+from UM.Resources import Resources
 from UM.Settings.ContainerRegistry import ContainerRegistry
 
 USE_CONTAINER_TREE = True
@@ -39,9 +32,32 @@ except ImportError:
 from UM.i18n import i18nCatalog
 catalog = i18nCatalog("cura")
 
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple, Union, TYPE_CHECKING
+if TYPE_CHECKING:
+    from .CompatibilityMatrixJob import CompatibilityMatrixJob
+    from .CurrencyRates import CurrencyRates
+    from .ExportCache import ExportCache
+    from .ExportJob import ExportJob
+    from .GcodeCostJob import GcodeCostJob
+    from .ImportChangeSet import ImportChangeSet
+    from .ImportJob import ImportJob
+    from .MaterialCatalog import MaterialCatalog
+    from .PriceFeedJob import PriceFeedJob
+    from .PriceHistory import PriceHistory
+    from .RowValidator import ValidationReport
+    from .SettingsJournal import SettingsJournal
+    from .SharedCostStore import SharedCostStore
+    from .StageTimer import StageTimer
+    from .WatchFolder import WatchFolder
+    from .WatchFolderJob import WatchFolderJob
 
 class MaterialCostTools(Extension, QObject,):
+    SHARED_STORE_POLL_INTERVAL = 15000
+    WATCH_FOLDER_POLL_INTERVAL = 10000
+    CURRENCY_RATES_MAX_AGE = 30  # days
+    # MultiFileImport.LAST_FILE_WINS; that module is only imported when it is used
+    DEFAULT_CONFLICT_POLICY = "last_file"
+
     def __init__(self, parent = None) -> None:
         QObject.__init__(self, parent)
         Extension.__init__(self)
@@ -49,15 +65,38 @@ class MaterialCostTools(Extension, QObject,):
         self._application = Application.getInstance()
         self._preferences = self._application.getPreferences()
         self._preferences.addPreference("material_cost_tools/dialog_path", "")
+        self._preferences.addPreference("material_cost_tools/shared_store_path", "")
+        # the revision of the shared database that the material settings were last synchronized with
+        self._preferences.addPreference("material_cost_tools/shared_store_revision", 0)
+        self._preferences.addPreference("material_cost_tools/history_path", "")
+        self._preferences.addPreference("material_cost_tools/import_conflict_policy", self.DEFAULT_CONFLICT_POLICY)
+        self._preferences.addPreference("material_cost_tools/currency_rates_path", "")
+        self._preferences.addPreference("material_cost_tools/currency_rates_max_age", self.CURRENCY_RATES_MAX_AGE)
+        self._preferences.addPreference("material_cost_tools/watch_folder_path", "")
+        self._preferences.addPreference("material_cost_tools/export_unit_costs", False)
+        self._preferences.addPreference("material_cost_tools/price_feeds", "")
 
-        self._message = Message()
+        # the message and dialog options are only created when a menu item is used
+        self._message = None  # type: Optional[Message]
+        self._dialog_options = None  # type: Any
+        self._job = None  # type: Optional[Job]
+        self._catalog = None  # type: Optional[MaterialCatalog]
+        self._export_cache = None  # type: Optional[ExportCache]
+        self._export_cache_key = None  # type: Optional[Tuple[Hashable, ...]]
+        # the materials of the variants of a machine that have been looked up, with the catalog revision, by machine definition
+        self._machine_materials = {}  # type: Dict[str, Tuple[int, Dict[str, List[Dict[str, Any]]]]]
 
-        if USE_QT5:
-            self._dialog_options = QFileDialog.Options()
-            if sys.platform == "linux" and "KDE_FULL_SESSION" in os.environ:
-                self._dialog_options |= QFileDialog.DontUseNativeDialog
-        else:
-            self._dialog_options = None
+        self._shared_store = None  # type: Optional[SharedCostStore]
+        self._shared_store_revision = 0
+        self._shared_store_timer = None  # type: Optional[QTimer]
+
+        self._watch_folder = None  # type: Optional[WatchFolder]
+        self._watch_folder_timer = None  # type: Optional[QTimer]
+
+        self._price_history = None  # type: Optional[PriceHistory]
+        self._journal = None  # type: Optional[SettingsJournal]
+        self._validation_report = None  # type: Optional[ValidationReport]
+        self._stage_timer = None  # type: Optional[StageTimer]
 
         self.setMenuName(catalog.i18nc("@item:inmenu", "Material Cost Tools"))
 
@@ -67,257 +106,703 @@ class MaterialCostTools(Extension, QObject,):
         self.addMenuItem(catalog.i18nc("@item:inmenu", "Export data for favorite materials..."), self.exportFavoriteMaterialData)
         self.addMenuItem(catalog.i18nc("@item:inmenu", "Export data for materials for current printer..."), self.exportPrinterMaterialData)
         self.addMenuItem(catalog.i18nc("@item:inmenu", "Export data for materials with weights and prices..."), self.exportConfiguredData)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Export material compatibility for all printers..."), self.exportCompatibilityMatrix)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Add cost per gram, kilogram and meter to exports"), self.addUnitCostColumns)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Leave cost per gram, kilogram and meter out of exports"), self.removeUnitCostColumns)
         self.addMenuItem(" ", lambda: None)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Export price history..."), self.exportPriceHistory)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Cost g-code files..."), self.costGcodeFiles)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Convert imported prices using exchange rates file..."), self.selectCurrencyRates)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Stop converting imported prices"), self.clearCurrencyRates)
+        self.addMenuItem("   ", lambda: None)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Connect to shared weights and prices database..."), self.connectSharedStore)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Disconnect from shared weights and prices database"), self.disconnectSharedStore)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Import price lists from a watch folder..."), self.selectWatchFolder)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Stop importing from watch folder"), self.clearWatchFolder)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Set price list URLs..."), self.setPriceFeeds)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Sync prices from price list URLs"), self.syncPriceFeeds)
+        self.addMenuItem("  ", lambda: None)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Undo last import or clear"), self.undoLastChange)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Restore weights and prices to an earlier state..."), self.restoreEarlierState)
         self.addMenuItem(catalog.i18nc("@item:inmenu", "Clear all weights and prices"), self.clearData)
+        self.addMenuItem("    ", lambda: None)
+        self.addMenuItem(catalog.i18nc("@item:inmenu", "Diagnostics..."), self.showDiagnostics)
 
-    def exportAllMaterialData(self):
-        materials_metadata = [
-            m for m in ContainerRegistry.getInstance().findInstanceContainersMetadata(type = "material")
-            if "base_file" in m and m["id"] == m["base_file"]
-        ]
+        if self._preferences.getValue("material_cost_tools/shared_store_path"):
+            # synchronize once Cura has finished starting up
+            self._application.callLater(self._openSharedStore)
+        if self._preferences.getValue("material_cost_tools/watch_folder_path"):
+            self._application.callLater(self._openWatchFolder)
 
-        self._exportData(materials_metadata)
+    def exportAllMaterialData(self) -> None:
+        from .StageTimer import StageTimer
+        stage_timer = StageTimer("Export data for all materials")
+        with stage_timer.span("registry scan"):
+            materials_metadata = self._getCatalog().getAll()
+        stage_timer.setCount("registry scan", len(materials_metadata))
 
-    def exportFavoriteMaterialData(self):
-        favorite_ids = set(self._preferences.getValue("cura/favorite_materials").split(";"))
-        materials_metadata = [
-            m for m in ContainerRegistry.getInstance().findInstanceContainersMetadata(type = "material")
-            if "base_file" in m and m["base_file"] in favorite_ids and m["id"] == m["base_file"]
-        ]
+        self._exportData(lambda material_settings: materials_metadata, stage_timer, ("all", ))
 
-        self._exportData(materials_metadata)
+    def exportFavoriteMaterialData(self) -> None:
+        from .StageTimer import StageTimer
+        stage_timer = StageTimer("Export data for favorite materials")
+        favorite_materials = self._preferences.getValue("cura/favorite_materials")
+        with stage_timer.span("registry scan"):
+            favorite_ids = set(favorite_materials.split(";"))
+            materials_metadata = self._getCatalog().getByBaseFiles(favorite_ids)
+        stage_timer.setCount("registry scan", len(materials_metadata))
 
-    def exportPrinterMaterialData(self):
+        self._exportData(lambda material_settings: materials_metadata, stage_timer, ("favorites", hash(favorite_materials)))
+
+    def exportPrinterMaterialData(self) -> None:
+        from .StageTimer import StageTimer
         global_stack = self._application.getGlobalContainerStack()
         if not global_stack or not global_stack.getMetaDataEntry("has_materials", False):
             return
-        extruder_stack = global_stack.extruders.get("0")
-        if not extruder_stack:
+        if not global_stack.extruders:
             return
+        definition_id = global_stack.definition.getId()
 
-        approximate_material_diameter = extruder_stack.getApproximateMaterialDiameter()
+        # the nozzle and material diameter of every extruder, by position
+        extruder_configurations = [
+            (position, extruder_stack.variant.getName(), extruder_stack.getApproximateMaterialDiameter())
+            for (position, extruder_stack) in sorted(global_stack.extruders.items(), key = lambda item: int(item[0]))
+        ]
 
-        if USE_CONTAINER_TREE:
-            nozzle_name = extruder_stack.variant.getName()
-            machine_node = ContainerTree.getInstance().machines[global_stack.definition.getId()]
-            if nozzle_name not in machine_node.variants:
-                Logger.log("w", "Unable to find variant %s in container tree", nozzle_name)
-                return
+        stage_timer = StageTimer("Export data for materials for current printer")
+        stage_name = "container tree traversal" if USE_CONTAINER_TREE else "registry scan"
+        with stage_timer.span(stage_name):
+            # materials that can be used in more than one extruder are exported once, listing all those extruders
+            materials_by_guid = {}  # type: Dict[str, Dict[str, Any]]
+            extruders = {}  # type: Dict[str, List[str]]
+            for (position, nozzle_name, approximate_material_diameter) in extruder_configurations:
+                if USE_CONTAINER_TREE:
+                    variant_materials = self._getVariantMaterials(definition_id, nozzle_name)
+                    if variant_materials is None:
+                        Logger.log("w", "Unable to find variant %s in container tree", nozzle_name)
+                        continue
+                else:
+                    variant_materials = self._getCatalog().getByDiameter(approximate_material_diameter)
 
-            material_nodes = machine_node.variants[nozzle_name].materials
-            materials_metadata = [
-                m.getMetadata() for m in material_nodes.values()
-                if float(m.getMetaDataEntry("approximate_diameter", -1)) == approximate_material_diameter
-            ]
-        else:
-            materials_metadata = [
-                m for m in ContainerRegistry.getInstance().findInstanceContainersMetadata(type = "material")
-                if "base_file" in m and m.get("approximate_diameter", -1) == approximate_material_diameter and m["id"] == m["base_file"]
-            ]
+                for metadata in variant_materials:
+                    if float(metadata.get("approximate_diameter", -1)) != approximate_material_diameter:
+                        continue
+                    guid = metadata["GUID"]
+                    materials_by_guid.setdefault(guid, metadata)
+                    extruder_name = str(int(position) + 1)
+                    if extruder_name not in extruders.setdefault(guid, []):
+                        extruders[guid].append(extruder_name)
+            materials_metadata = list(materials_by_guid.values())
+        stage_timer.setCount(stage_name, len(materials_metadata))
 
-        self._exportData(materials_metadata)
+        # the extruders column is only useful for printers with more than one extruder
+        cache_key_parts = ("printer", definition_id, tuple(extruder_configurations))
+        self._exportData(lambda material_settings: materials_metadata, stage_timer, cache_key_parts, extruders if len(extruder_configurations) > 1 else None)
 
-    def exportConfiguredData(self):
-        try:
-            material_settings = json.loads(self._preferences.getValue("cura/material_settings"))
-        except:
-            Logger.logException("e", "Could not load material settings from preferences")
+    # Returns the metadata of the materials in the container tree for a variant of a machine, or None if
+    # the machine does not have that variant. The result is kept until the materials in the registry change.
+    def _getVariantMaterials(self, definition_id: str, variant_name: str) -> Optional[List[Dict[str, Any]]]:
+        revision = self._getCatalog().getRevision()
+        cached = self._machine_materials.get(definition_id)
+        if cached is None or cached[0] != revision:
+            cached = (revision, {})
+            self._machine_materials[definition_id] = cached
+
+        variant_materials = cached[1].get(variant_name)
+        if variant_materials is None:
+            machine_node = ContainerTree.getInstance().machines[definition_id]
+            if variant_name not in machine_node.variants:
+                return None
+            variant_materials = [m.getMetadata() for m in machine_node.variants[variant_name].materials.values()]
+            cached[1][variant_name] = variant_materials
+        return variant_materials
+
+    def exportConfiguredData(self) -> None:
+        from .StageTimer import StageTimer
+        stage_timer = StageTimer("Export data for materials with weights and prices")
+        with stage_timer.span("registry scan"):
+            material_catalog = self._getCatalog()
+
+        # the material settings are only parsed in the export job
+        self._exportData(lambda material_settings: material_catalog.getByGuids(material_settings.keys()), stage_timer, ("configured", ))
+
+    def exportCompatibilityMatrix(self) -> None:
+        from .CompatibilityMatrixJob import CompatibilityMatrixJob
+        from .StageTimer import StageTimer
+        if not USE_CONTAINER_TREE:
+            self._showMessage(catalog.i18nc("@info:status", "This version of Cura does not list the materials per printer"))
+            return
+        if self._isJobRunning():
             return
 
-        materials_metadata = [
-            m for m in ContainerRegistry.getInstance().findInstanceContainersMetadata(type = "material")
-            if "base_file" in m and m["GUID"] in material_settings.keys() and m["id"] == m["base_file"]
-        ]
+        stage_timer = StageTimer("Export material compatibility for all printers")
+        with stage_timer.span("registry scan"):
+            # every type of printer that has been added, with the material diameter of its first extruder
+            machines = {}  # type: Dict[str, Tuple[str, str, Optional[float]]]
+            for global_stack in ContainerRegistry.getInstance().findContainerStacks(type = "machine"):
+                definition = global_stack.definition
+                if definition.getId() in machines or not global_stack.getMetaDataEntry("has_materials", False):
+                    continue
+                extruder_stack = global_stack.extruders.get("0")
+                approximate_material_diameter = extruder_stack.getApproximateMaterialDiameter() if extruder_stack else None
+                machines[definition.getId()] = (definition.getId(), definition.getName(), approximate_material_diameter)
+        stage_timer.setCount("registry scan", len(machines))
+        if not machines:
+            self._showMessage(catalog.i18nc("@info:status", "There are no printers with materials to export"))
+            return
 
-        self._exportData(materials_metadata)
+        file_name = self._getSaveFileName(catalog.i18nc("@title:window", "Save as"), "CSV files (*.csv)")
+        if not file_name:
+            Logger.log("d", "No file to export to selected")
+            return
 
+        job = CompatibilityMatrixJob(
+            file_name,
+            ContainerTree.getInstance().machines,
+            sorted(machines.values(), key = lambda machine: machine[1]),
+            self._preferences.getValue("cura/material_settings"),
+            self._preferences.getValue("cura/currency"),
+            stage_timer
+        )
+        job.finished.connect(self._onCompatibilityMatrixJobFinished)
+        self._startJob(job, catalog.i18nc("@info:status", "Exporting material compatibility..."))
 
-    def _exportData(self, materials_metadata: List[Dict[str, Any]]) -> None:
-        try:
-            material_settings = json.loads(self._preferences.getValue("cura/material_settings"))
-        except:
-            Logger.logException("e", "Could not load material settings from preferences")
+    def _onCompatibilityMatrixJobFinished(self, job: "CompatibilityMatrixJob") -> None:
+        self._job = None
+        self._hideMessage()
+        self._logStageTimer(job.getStageTimer())
+
+        if job.isCancelled():
+            return
+        if job.hasError():
+            self._showMessage(catalog.i18nc("@info:status", "Could not export settings to the selected file"))
             return
 
-        file_name = ""
-        if USE_QT5:
-            file_name = QFileDialog.getSaveFileName(
-                parent = None,
-                caption = catalog.i18nc("@title:window", "Save as"),
-                directory = self._preferences.getValue("material_cost_tools/dialog_path"),
-                filter = "CSV files (*.csv)",
-                options = self._dialog_options
-            )[0]
-        else:
-            dialog = QFileDialog()
-            dialog.setWindowTitle(catalog.i18nc("@title:window", "Save as"))
-            dialog.setDirectory(self._preferences.getValue("material_cost_tools/dialog_path"))
-            dialog.setNameFilters(["CSV files (*.csv)"])
-            dialog.setAcceptMode(QFileDialog.AcceptMode.AcceptSave)
-            dialog.setFileMode(QFileDialog.FileMode.AnyFile)
-            if dialog.exec():
-                file_name = dialog.selectedFiles()[0]
+        self._showMessage(
+            catalog.i18nc(
+                "@info:status {0} and {1} are counts", "Exported the compatibility of {0} materials with {1} printers and nozzles."
+            ).format(job.getExportedCount(), job.getColumnCount())
+        )
+
+    def _getCatalog(self) -> "MaterialCatalog":
+        from .MaterialCatalog import MaterialCatalog
+        # the catalog is only built when it is first needed, after the registry has loaded all materials
+        if self._catalog is None:
+            self._catalog = MaterialCatalog()
+            self._catalog.attachToRegistry(ContainerRegistry.getInstance())
+        return self._catalog
+
+    def addUnitCostColumns(self) -> None:
+        self._preferences.setValue("material_cost_tools/export_unit_costs", True)
+
+    def removeUnitCostColumns(self) -> None:
+        self._preferences.setValue("material_cost_tools/export_unit_costs", False)
 
+
+    # cache_key_parts starts with the name of the scope, followed by anything else the selected materials depend on
+    # extruders optionally lists the extruders each material can be used in, by GUID
+    def _exportData(self, materials_selector: Callable[[Dict[str, Any]], List[Dict[str, Any]]], stage_timer: "StageTimer", cache_key_parts: Tuple[Hashable, ...],
+                    extruders: Optional[Dict[str, List[str]]] = None) -> None:
+        from .ExportCache import ExportCache
+        from .ExportJob import ExportJob
+        from .PriceSnapshot import PriceSnapshot
+        if self._isJobRunning():
+            return
+
+        file_name = self._getSaveFileName(
+            catalog.i18nc("@title:window", "Save as"), "CSV files (*.csv);;Price snapshots (*.%s)" % PriceSnapshot.FILE_EXTENSION
+        )
         if not file_name:
             Logger.log("d", "No file to export to selected")
             return
 
-        self._preferences.setValue("material_cost_tools/dialog_path", os.path.dirname(file_name))
+        material_settings = self._preferences.getValue("cura/material_settings")
+        if self._export_cache is None:
+            self._export_cache = ExportCache()
+        self._export_cache_key = ExportCache.makeKey(cache_key_parts[0], self._getCatalog().getRevision(), material_settings, *cache_key_parts[1:])
+        with stage_timer.span("export cache lookup"):
+            prepared = self._export_cache.get(self._export_cache_key)
 
-        materials_metadata = [
-            {
-                "guid": m["GUID"],
-                "material": m["material"],
-                "brand": m.get("brand",""),
-                "name": m["name"],
-                "spool_weight": material_settings.get(m["GUID"], {}).get("spool_weight", ""),
-                "spool_cost": material_settings.get(m["GUID"], {}).get("spool_cost", "")
+        job = ExportJob(
+            file_name,
+            materials_selector,
+            material_settings,
+            self._preferences.getValue("cura/currency"),
+            stage_timer,
+            prepared,
+            extruders,
+            bool(self._preferences.getValue("material_cost_tools/export_unit_costs"))
+        )
+        job.finished.connect(self._onExportJobFinished)
+        self._startJob(job, catalog.i18nc("@info:status", "Exporting weights and prices..."))
+
+    def _onExportJobFinished(self, job: "ExportJob") -> None:
+        self._job = None
+        self._hideMessage()
+        self._logStageTimer(job.getStageTimer())
+
+        if job.isCancelled():
+            return
+        if job.hasError():
+            self._showMessage(catalog.i18nc("@info:status", "Could not export settings to the selected file"))
+            return
+
+        if self._export_cache is not None and self._export_cache_key is not None:
+            # repeated exports of this scope use the sorted materials until the materials or settings change
+            self._export_cache.put(self._export_cache_key, job.getPrepared())
+        exported_count = job.getExportedCount()
+        text = catalog.i18ncp(
+            "@info:status {0} is count", "Exported data for {0} material.", "Exported data for {0} materials.", exported_count
+        ).format(exported_count)
+        skipped_count = len(job.getSkippedRows())
+        if skipped_count:
+            text += " " + catalog.i18ncp(
+                "@info:status {0} is count", "{0} material could not be exported; see the log for details.", "{0} materials could not be exported; see the log for details.", skipped_count
+            ).format(skipped_count)
+        self._showMessage(text)
+
+
+    def importData(self) -> None:
+        from .ImportJob import ImportJob
+        from .MultiFileImport import LAST_FILE_WINS, LOWEST_PRICE, NEWEST_FILE
+        from .PriceSnapshot import PriceSnapshot
+        from .StageTimer import StageTimer
+        if self._isJobRunning():
+            return
+
+        file_names = self._getOpenFileNames(
+            catalog.i18nc("@title:window", "Open Files"), "Price lists (*.csv *.%s)" % PriceSnapshot.FILE_EXTENSION
+        )
+        if not file_names:
+            Logger.log("d", "No file to import from selected")
+            return
+
+        conflict_policy = self._preferences.getValue("material_cost_tools/import_conflict_policy")
+        if len(file_names) > 1:
+            policy_names = {
+                LAST_FILE_WINS: catalog.i18nc("@item:inlistbox", "The last selected file wins"),
+                LOWEST_PRICE: catalog.i18nc("@item:inlistbox", "The lowest price wins"),
+                NEWEST_FILE: catalog.i18nc("@item:inlistbox", "The most recently modified file wins")
             }
-            for m in materials_metadata
-            if "brand" in m
-        ]
-        materials_metadata.sort(key = lambda k: (k["brand"], k["material"], k["name"]))
+            policies = list(policy_names.keys())
+            (policy_name, accepted) = QInputDialog.getItem(
+                None,
+                catalog.i18nc("@title:window", "Import weights and prices"),
+                catalog.i18nc("@label", "When a material is listed in more than one file:"),
+                [policy_names[policy] for policy in policies],
+                policies.index(conflict_policy) if conflict_policy in policies else 0,
+                False
+            )
+            if not accepted:
+                return
+            conflict_policy = policies[[policy_names[policy] for policy in policies].index(policy_name)]
+            self._preferences.setValue("material_cost_tools/import_conflict_policy", conflict_policy)
+
+        job = ImportJob(
+            file_names,
+            self._preferences.getValue("cura/material_settings"),
+            self._getCatalog().hasGuid,
+            conflict_policy,
+            self._getCurrencyRates(),
+            self._preferences.getValue("cura/currency"),
+            StageTimer("Import weights and prices"),
+            self._getCatalog().matchName
+        )
+        job.finished.connect(self._onImportJobFinished)
+        self._startJob(job, catalog.i18nc("@info:status", "Importing weights and prices..."))
+
+    def _onImportJobFinished(self, job: "ImportJob") -> None:
+        self._hideMessage()
 
-        exported_count = 0
         try:
-            with open(file_name, 'w', newline='') as csv_file:
-                csv_writer = csv.writer(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-                csv_writer.writerow([
-                    "guid",
-                    "name",
-                    "weight (g)",
-                    "cost (%s)" % self._preferences.getValue("cura/currency")
-                ])
-
-                for material in materials_metadata:
-                    try:
-                        csv_writer.writerow([
-                            material["guid"],
-                            "%s %s" % (material["brand"], material["name"]),
-                            material["spool_weight"],
-                            material["spool_cost"]
-                        ])
-                        exported_count += 1
-                    except:
-                        continue
-        except:
-            Logger.logException("e", "Could not export settings to the selected file")
+            notice = ""
+            errors = job.getErrors()
+            if errors:
+                notice = catalog.i18nc("@info:status {0} is a list of files", "Could not import: {0}").format(
+                    ", ".join(os.path.basename(file_name) for file_name in job.getFileNames() if file_name in errors)
+                )
+            self._applyImportJob(job, notice)
+        finally:
+            # the job is only done once it is applied or dismissed; until then the shared database and the
+            # watch folder are not synced, since they would write to the settings while the dialog is open
+            self._job = None
+            # logged after the preferences are saved, so that is included
+            self._logStageTimer(job.getStageTimer())
+
+    # Returns True if the import was applied, or there was nothing to apply
+    # notice is added to the summary and to the result, eg to tell which files could not be imported
+    def _applyImportJob(self, job: "ImportJob", notice: str = "") -> bool:
+        from .MultiFileImport import MultiFileImport
+        from .RowValidator import MATCHED_BY_NAME
+        if job.isCancelled():
+            return False
+        notice = "\n" + notice if notice else ""
+        change_set = job.getChangeSet()
+        if job.hasError() or change_set is None:
+            self._showMessage(catalog.i18nc("@info:status", "Could not import settings from the selected file") + notice)
+            return False
+
+        report = job.getReport()
+        if change_set.isEmpty():
+            # nothing to write, so the preferences are left untouched
+            self._showImportResult(
+                catalog.i18nc("@info:status", "The weights and prices in the file are the same as the current weights and prices.") + notice, report
+            )
+            return True
+
+        summary = catalog.i18nc(
+            "@label {0} to {3} are counts",
+            "New materials: {0}\nChanged materials: {1}\nUnchanged materials: {2}\nInvalid rows: {3}"
+        ).format(
+            change_set.getAddedCount(), change_set.getChangedCount(), change_set.getUnchangedCount(), change_set.getInvalidCount()
+        )
+
+        if not report.isEmpty():
+            summary += "\n" + catalog.i18nc("@label {0} and {1} are counts", "Rows with problems: {0} errors, {1} warnings").format(
+                report.getErrorCount(), sum(report.getCounts().values()) - report.getErrorCount()
+            )
+        matched_count = report.getCount(MATCHED_BY_NAME)
+        if matched_count:
+            summary += "\n" + catalog.i18nc("@label {0} is count", "Rows without a GUID matched to a material by name: {0}").format(matched_count)
+
+        conversions = job.getConversions()
+        for (from_currency, rate) in sorted(set(conversions.values())):
+            summary += "\n" + catalog.i18nc("@label {0} and {2} are currencies, {1} is a rate", "Prices converted from {0} at a rate of {1} {2}").format(
+                from_currency, "%.4f" % rate, self._preferences.getValue("cura/currency")
+            )
+        currency_rates = self._getCurrencyRates()
+        if conversions and currency_rates is not None and currency_rates.isStale(float(self._preferences.getValue("material_cost_tools/currency_rates_max_age"))):
+            summary += "\n" + catalog.i18nc("@label {0} is a number of days", "Warning: the exchange rates are {0} days old").format(int(currency_rates.getAge()))
+
+        conflicts = job.getConflicts()
+        if conflicts:
+            summary += "\n" + catalog.i18nc("@label {0} is count", "Conflicting materials: {0}").format(len(conflicts))
+        summary += notice
+
+        configured_currency = self._preferences.getValue("cura/currency")
+        other_currencies = sorted(set(job.getCurrencies().values()) - {configured_currency})
+        if other_currencies:
+            question = catalog.i18nc("@label",
+                "The file contains prices specified in %s, but your Cura is configured to use %s.\nAre you sure you want to import these prices as is?" % (
+                    ", ".join(other_currencies), configured_currency
+                )
+            )
+        else:
+            question = catalog.i18nc("@label", "Do you want to import these weights and prices?")
+
+        message_box = QMessageBox()
+        message_box.setWindowTitle(catalog.i18nc("@title:window", "Import weights and prices"))
+        message_box.setText("%s\n\n%s" % (summary, question))
+        message_box.setStandardButtons(QMessageBoxStandardButtons.Yes | QMessageBoxStandardButtons.No)
+        if conflicts:
+            material_catalog = self._getCatalog()
+            conflict_lines = []
+            for conflict in conflicts:
+                metadata = material_catalog.getByGuid(conflict["guid"])
+                name = "%s %s" % (metadata.get("brand", ""), metadata.get("name", "")) if metadata else ""
+                conflict_lines.append(MultiFileImport.formatConflict(conflict, name))
+            message_box.setDetailedText("\n".join(conflict_lines))
+        message_box.exec()
+        if message_box.standardButton(message_box.clickedButton()) != QMessageBoxStandardButtons.Yes:
+            if not report.isEmpty():
+                self._showImportResult(catalog.i18nc("@info:status", "No weights and prices were imported.") + notice, report)
+            return False
+
+        imported_count = change_set.getAddedCount() + change_set.getChangedCount()
+        stage_timer = job.getStageTimer()
+        with stage_timer.span("preference save"):
+            saved_settings = self._saveImportedSettings(job)
+        if saved_settings is None:
+            return False
+        (previous_settings, applied_settings) = saved_settings
+        if self._shared_store is not None:
+            with stage_timer.span("shared database update", imported_count):
+                self._pushToSharedStore(change_set)
+        with stage_timer.span("price history update", imported_count):
+            self._recordPriceHistory(applied_settings)
+        with stage_timer.span("journal update", imported_count):
+            self._recordJournal(
+                "import",
+                catalog.i18nc("@label {0} is a list of file names", "import of {0}").format(", ".join(os.path.basename(file_name) for file_name in job.getFileNames())),
+                previous_settings,
+                applied_settings
+            )
+
+        self._showImportResult(
+            catalog.i18ncp(
+                "@info:status {0} is count", "Imported weight & price for {0} material.", "Imported weights & prices for {0} materials.", imported_count
+            ).format(imported_count) + notice,
+            report
+        )
+        return True
+
+    def _showImportResult(self, text: str, report: "ValidationReport") -> None:
+        self._showMessage(text)
+        if report.isEmpty():
             return
+        self._validation_report = report
+        self._message.addAction("save_report", catalog.i18nc("@action:button", "Save error report"), "", "")
+        self._message.actionTriggered.connect(self._onMessageActionTriggered)
 
-        self._message.hide()
-        self._message = Message(
+    def saveValidationReport(self) -> None:
+        report = self._validation_report
+        if report is None:
+            return
+        self._hideMessage()
+
+        file_name = self._getSaveFileName(catalog.i18nc("@title:window", "Save error report as"), "CSV files (*.csv)")
+        if not file_name:
+            Logger.log("d", "No file to save the error report to selected")
+            return
+
+        try:
+            with open(file_name, "w", newline = "") as csv_file:
+                issue_count = report.writeCsv(csv_file)
+        except EnvironmentError:
+            Logger.logException("e", "Could not save the error report to the selected file")
+            self._showMessage(catalog.i18nc("@info:status", "Could not save the error report to the selected file"))
+            return
+
+        total_count = sum(report.getCounts().values())
+        if issue_count < total_count:
+            # only the first rows with each kind of problem are kept
+            self._showMessage(
+                catalog.i18nc("@info:status {0} and {1} are counts", "Saved the first {0} of {1} problems to the error report.").format(issue_count, total_count)
+            )
+            return
+        self._showMessage(
             catalog.i18ncp(
-                "@info:status {0} is count", "Exported data for {0} material.", "Exported data for {0} materials.", exported_count
-            ).format(exported_count),
-            title=catalog.i18nc("@info:title", "Material Cost Tools")
+                "@info:status {0} is count", "Saved {0} problem to the error report.", "Saved {0} problems to the error report.", issue_count
+            ).format(issue_count)
         )
+
+
+    def _logStageTimer(self, stage_timer: "StageTimer") -> None:
+        self._stage_timer = stage_timer
+        for line in stage_timer.format().splitlines():
+            Logger.log("d", line)
+
+    def showDiagnostics(self) -> None:
+        if self._stage_timer is None:
+            text = catalog.i18nc("@label", "No import or export has been done yet.")
+        else:
+            text = self._stage_timer.format()
+        if self._catalog is not None:
+            text += "\n\n" + catalog.i18nc("@label {0} is count", "Materials in catalog: {0}").format(len(self._catalog))
+
+        message_box = QMessageBox()
+        message_box.setWindowTitle(catalog.i18nc("@title:window", "Diagnostics"))
+        message_box.setText(text)
+        message_box.exec()
+
+    def _isJobRunning(self) -> bool:
+        if self._job is not None:
+            Logger.log("w", "Another import or export is still in progress")
+            # a separate message, so the progress and the cancel button of the running job stay visible
+            Message(
+                catalog.i18nc("@info:status", "Another import or export is still in progress. Try again when it has finished."),
+                title = catalog.i18nc("@info:title", "Material Cost Tools")
+            ).show()
+            return True
+        return False
+
+    def _startJob(self, job: Job, text: str) -> None:
+        self._job = job
+
+        self._hideMessage()
+        self._message = Message(
+            text,
+            lifetime = 0,
+            dismissable = False,
+            progress = -1,
+            title = catalog.i18nc("@info:title", "Material Cost Tools")
+        )
+        self._message.addAction("cancel", catalog.i18nc("@action:button", "Cancel"), "", "")
+        self._message.actionTriggered.connect(self._onMessageActionTriggered)
         self._message.show()
 
+        job.progress.connect(self._onJobProgress)
+        job.start()
 
-    def importData(self) -> None:
-        file_name = ""
+    def _onJobProgress(self, progress: float) -> None:
+        if self._job is not None and self._message is not None:
+            self._message.setProgress(progress)
+
+    def _onMessageActionTriggered(self, message: Message, action: str) -> None:
+        if action == "cancel" and self._job is not None:
+            self._job.cancel()
+        elif action == "save_report":
+            self.saveValidationReport()
+
+    def _getOpenFileName(self, caption: str, name_filter: str) -> str:
+        file_names = self._getFileNames(caption, name_filter, save = False)
+        return file_names[0] if file_names else ""
+
+    def _getOpenFileNames(self, caption: str, name_filter: str) -> List[str]:
+        return self._getFileNames(caption, name_filter, save = False, multiple = True)
+
+    def _getSaveFileName(self, caption: str, name_filter: str, confirm_overwrite: bool = True) -> str:
+        file_names = self._getFileNames(caption, name_filter, save = True, confirm_overwrite = confirm_overwrite)
+        return file_names[0] if file_names else ""
+
+    def _getFileNames(self, caption: str, name_filter: str, save: bool, multiple: bool = False, confirm_overwrite: bool = True) -> List[str]:
+        file_names = []  # type: List[str]
         if USE_QT5:
-            file_name = QFileDialog.getOpenFileName(
+            if self._dialog_options is None:
+                self._dialog_options = QFileDialog.Options()
+                if sys.platform == "linux" and "KDE_FULL_SESSION" in os.environ:
+                    self._dialog_options |= QFileDialog.DontUseNativeDialog
+            options = self._dialog_options
+            if not confirm_overwrite:
+                options |= QFileDialog.DontConfirmOverwrite
+            if save:
+                get_file_names = QFileDialog.getSaveFileName
+            elif multiple:
+                get_file_names = QFileDialog.getOpenFileNames
+            else:
+                get_file_names = QFileDialog.getOpenFileName
+            selected = get_file_names(
                 parent = None,
-                caption = catalog.i18nc("@title:window", "Open File"),
+                caption = caption,
                 directory = self._preferences.getValue("material_cost_tools/dialog_path"),
-                filter = "CSV files (*.csv)",
-                options = self._dialog_options
+                filter = name_filter,
+                options = options
             )[0]
+            if isinstance(selected, list):
+                file_names = selected
+            elif selected:
+                file_names = [selected]
         else:
             dialog = QFileDialog()
-            dialog.setWindowTitle(catalog.i18nc("@title:window", "Open File"))
+            dialog.setWindowTitle(caption)
             dialog.setDirectory(self._preferences.getValue("material_cost_tools/dialog_path"))
-            dialog.setNameFilters(["CSV files (*.csv)"])
-            dialog.setAcceptMode(QFileDialog.AcceptMode.AcceptOpen)
-            dialog.setFileMode(QFileDialog.FileMode.ExistingFile)
+            dialog.setNameFilters(name_filter.split(";;"))
+            if save:
+                dialog.setAcceptMode(QFileDialog.AcceptMode.AcceptSave)
+                dialog.setFileMode(QFileDialog.FileMode.AnyFile)
+                if not confirm_overwrite:
+                    dialog.setOption(QFileDialog.Option.DontConfirmOverwrite)
+            else:
+                dialog.setAcceptMode(QFileDialog.AcceptMode.AcceptOpen)
+                dialog.setFileMode(QFileDialog.FileMode.ExistingFiles if multiple else QFileDialog.FileMode.ExistingFile)
             if dialog.exec():
-                file_name = dialog.selectedFiles()[0]
+                file_names = dialog.selectedFiles()
 
-        if not file_name:
-            Logger.log("d", "No file to import from selected")
+        if file_names:
+            self._preferences.setValue("material_cost_tools/dialog_path", os.path.dirname(file_names[0]))
+        return file_names
+
+    def _hideMessage(self) -> None:
+        if self._message is not None:
+            self._message.hide()
+
+    def _showMessage(self, text: str) -> None:
+        self._hideMessage()
+        self._message = Message(
+            text,
+            title = catalog.i18nc("@info:title", "Material Cost Tools")
+        )
+        self._message.show()
+
+
+    def exportPriceHistory(self) -> None:
+        history = self._getPriceHistory()
+        if not os.path.exists(history.getPath()):
+            self._showMessage(catalog.i18nc("@info:status", "No weights and prices have been imported yet"))
             return
 
-        self._preferences.setValue("material_cost_tools/dialog_path", os.path.dirname(file_name))
+        file_name = self._getSaveFileName(catalog.i18nc("@title:window", "Save as"), "CSV files (*.csv)")
+        if not file_name:
+            Logger.log("d", "No file to export to selected")
+            return
 
+        material_catalog = self._getCatalog()
+        names = {
+            m["GUID"]: "%s %s" % (m.get("brand", ""), m.get("name", ""))
+            for m in material_catalog.getByGuids(history.getGuids())
+        }
         try:
-            material_settings = json.loads(self._preferences.getValue("cura/material_settings"))
-        except:
-            Logger.logException("e", "Could not load material settings from preferences")
+            with open(file_name, "w", newline = "") as csv_file:
+                row_count = history.writeCsv(csv_file, names = names)
+        except EnvironmentError:
+            Logger.logException("e", "Could not export price history to the selected file")
+            self._showMessage(catalog.i18nc("@info:status", "Could not export the price history to the selected file"))
             return
 
-        imported_count = 0
+        self._showMessage(
+            catalog.i18ncp(
+                "@info:status {0} is count", "Exported {0} price history entry.", "Exported {0} price history entries.", row_count
+            ).format(row_count)
+        )
+
+    def _getPriceHistory(self) -> "PriceHistory":
+        from .PriceHistory import PriceHistory
+        path = self._preferences.getValue("material_cost_tools/history_path")
+        if not path:
+            path = os.path.join(Resources.getDataStoragePath(), "material_cost_history.bin")
+        if self._price_history is None or self._price_history.getPath() != path:
+            self._price_history = PriceHistory(path)
+        return self._price_history
+
+    def _recordPriceHistory(self, material_settings: Dict[str, Dict[str, Any]]) -> None:
         try:
-            with open(file_name, 'r', newline='') as csv_file:
-                csv_reader = csv.reader(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-                line_number = -1
-                for row in csv_reader:
-                    line_number += 1
-                    if line_number == 0:
-                        if len(row) < 4:
-                            continue
-                        match = re.search("cost\s\((.*)\)", row[3])
-                        if not match:
-                            continue
-
-                        currency = match.group(1)
-
-                        if currency != self._preferences.getValue("cura/currency"):
-
-                            result = QMessageBox.question(
-                                None,
-                                catalog.i18nc("@title:window", "Import weights and prices"),
-                                catalog.i18nc("@label",
-                                    "The file contains prices specified in %s, but your Cura is configured to use %s.\nAre you sure you want to import these prices as is?" % (
-                                        currency, self._preferences.getValue("cura/currency")
-                                    )
-                                )
-                            )
-
-                            if result == QMessageBoxStandardButtons.No:
-                                return
-                    else:
-                        try:
-                            (guid, name, weight, cost) = row[0:4]
-                        except:
-                            Logger.log("e", "Row does not have enough data: %s" % row)
-                            continue
-
-                        try:
-                            uuid = UUID(guid)
-                        except:
-                            Logger.log("e", "UUID is malformed: %s" % row)
-                            continue
-
-                        data = {}
-                        try:
-                             data["spool_cost"] = float(cost)
-                        except:
-                            pass
-                        try:
-                            data["spool_weight"] = int(weight)
-                        except:
-                            pass
-                        if data:
-                            material_settings[guid] = data
-                            imported_count += 1
-        except:
-            Logger.logException("e", "Could not import settings from the selected file")
+            self._getPriceHistory().append(material_settings)
+        except EnvironmentError:
+            Logger.logException("w", "Could not record price history")
+
+    def costGcodeFiles(self) -> None:
+        from .GcodeCostJob import GcodeCostJob
+        if self._isJobRunning():
             return
 
-        self._preferences.setValue("cura/material_settings", json.dumps(material_settings))
+        file_names = self._getOpenFileNames(catalog.i18nc("@title:window", "Open Files"), "G-code files (*.gcode *.ufp)")
+        if not file_names:
+            Logger.log("d", "No files to estimate costs for selected")
+            return
 
-        self._message.hide()
-        self._message = Message(
-            catalog.i18ncp(
-                "@info:status {0} is count", "Imported weight & price for {0} material.", "Imported weights & prices for {0} materials.", imported_count
-            ).format(imported_count),
-            title=catalog.i18nc("@info:title", "Material Cost Tools")
+        report_file_name = self._getSaveFileName(catalog.i18nc("@title:window", "Save cost report as"), "CSV files (*.csv)")
+        if not report_file_name:
+            Logger.log("d", "No file to save the cost report to selected")
+            return
+
+        job = GcodeCostJob(
+            file_names,
+            report_file_name,
+            self._preferences.getValue("cura/material_settings"),
+            self._preferences.getValue("cura/currency"),
+            self._getCatalog().getByGuid
         )
-        self._message.show()
+        job.finished.connect(self._onGcodeCostJobFinished)
+        self._startJob(job, catalog.i18nc("@info:status", "Estimating costs of g-code files..."))
+
+    def _onGcodeCostJobFinished(self, job: "GcodeCostJob") -> None:
+        self._job = None
+        self._hideMessage()
+
+        if job.isCancelled():
+            return
+        if job.hasError():
+            self._showMessage(catalog.i18nc("@info:status", "Could not write the cost report to the selected file"))
+            return
+
+        results = job.getResults()
+        # the same total as in the report, which includes the extruders of files that could not be fully costed
+        total_cost = sum(estimate["cost"] for result in results for estimate in result["extruders"] if estimate["cost"] is not None)
+        failed_count = len([result for result in results if result["error"] or result["cost"] is None])
+        text = catalog.i18ncp(
+            "@info:status {0} is count, {1} is cost, {2} is currency", "Estimated a total cost of {1:.2f} {2} for {0} file.", "Estimated a total cost of {1:.2f} {2} for {0} files.", len(results)
+        ).format(len(results), total_cost, self._preferences.getValue("cura/currency"))
+        if failed_count:
+            text += " " + catalog.i18ncp(
+                "@info:status {0} is count", "{0} file could not be fully costed.", "{0} files could not be fully costed.", failed_count
+            ).format(failed_count)
+        self._showMessage(text)
 
 
     def clearData(self) -> None:
+        import json
+        if self._isJobRunning():
+            return
         result = QMessageBox.question(
             None,
             catalog.i18nc("@title:window", "Clear weights and prices"),
@@ -325,4 +810,493 @@ class MaterialCostTools(Extension, QObject,):
         )
 
         if result == QMessageBoxStandardButtons.Yes:
+            try:
+                material_settings = json.loads(self._preferences.getValue("cura/material_settings"))
+            except:
+                Logger.logException("e", "Could not load material settings from preferences")
+                material_settings = {}
             self._preferences.resetPreference("cura/material_settings")
+            self._replaceInSharedStore(dict.fromkeys(material_settings))
+            self._recordJournal("clear", catalog.i18nc("@label", "clearing of all weights and prices"), material_settings, {})
+
+    def undoLastChange(self) -> None:
+        if self._isJobRunning():
+            return
+        entry = self._getJournal().getLastEntry()
+        if entry is None:
+            self._showMessage(catalog.i18nc("@info:status", "There are no imports or clears to undo"))
+            return
+
+        result = QMessageBox.question(
+            None,
+            catalog.i18nc("@title:window", "Undo last import or clear"),
+            catalog.i18nc("@label {0} is a description, {1} is a date and time, {2} is count", "Are you sure you want to undo the {0} at {1}, which changed {2} materials?").format(
+                entry["description"], self._formatJournalTime(entry["time"]), entry["material_count"]
+            )
+        )
+        if result == QMessageBoxStandardButtons.Yes:
+            self._revertJournal(entry["id"])
+
+    def restoreEarlierState(self) -> None:
+        if self._isJobRunning():
+            return
+        entries = list(reversed(self._getJournal().getEntries()))
+        if not entries:
+            self._showMessage(catalog.i18nc("@info:status", "There are no imports or clears to undo"))
+            return
+
+        entry_names = [
+            catalog.i18nc("@item:inlistbox {0} is a date and time, {1} is a description, {2} is count", "{0}: {1} ({2} materials)").format(
+                self._formatJournalTime(entry["time"]), entry["description"], entry["material_count"]
+            ) for entry in entries
+        ]
+        (entry_name, accepted) = QInputDialog.getItem(
+            None,
+            catalog.i18nc("@title:window", "Restore weights and prices"),
+            catalog.i18nc("@label", "Restore the weights and prices as they were before:"),
+            entry_names,
+            0,
+            False
+        )
+        if not accepted:
+            return
+        self._revertJournal(entries[entry_names.index(entry_name)]["id"])
+
+    # Reverts a journal entry and all newer entries
+    def _revertJournal(self, entry_id: int) -> None:
+        import json
+        try:
+            material_settings = json.loads(self._preferences.getValue("cura/material_settings"))
+        except:
+            Logger.logException("e", "Could not load material settings from preferences")
+            return
+
+        try:
+            (reverted_guids, kept_guids) = self._getJournal().revert(material_settings, entry_id)
+        except (EnvironmentError, KeyError):
+            Logger.logException("e", "Could not undo changes to the weights and prices")
+            self._showMessage(catalog.i18nc("@info:status", "Could not undo changes to the weights and prices"))
+            return
+
+        if reverted_guids:
+            self._preferences.setValue("cura/material_settings", json.dumps(material_settings))
+            self._replaceInSharedStore({guid: material_settings.get(guid) for guid in reverted_guids})
+            self._recordPriceHistory({guid: material_settings[guid] for guid in reverted_guids if guid in material_settings})
+        text = catalog.i18ncp(
+            "@info:status {0} is count", "Restored the weight & price of {0} material.", "Restored the weights & prices of {0} materials.", len(reverted_guids)
+        ).format(len(reverted_guids))
+        if kept_guids:
+            text += " " + catalog.i18ncp(
+                "@info:status {0} is count", "{0} material that was changed since was left as it is.", "{0} materials that were changed since were left as they are.", len(kept_guids)
+            ).format(len(kept_guids))
+        self._showMessage(text)
+
+    def _getJournal(self) -> "SettingsJournal":
+        from .SettingsJournal import SettingsJournal
+        path = os.path.join(Resources.getDataStoragePath(), "material_cost_journal.jsonl")
+        if self._journal is None or self._journal.getPath() != path:
+            self._journal = SettingsJournal(path)
+        return self._journal
+
+    def _recordJournal(self, action: str, description: str, previous_settings: Dict[str, Optional[Dict[str, Any]]], settings: Dict[str, Dict[str, Any]]) -> None:
+        from .SettingsJournal import SettingsJournal
+        try:
+            self._getJournal().record(action, description, SettingsJournal.makeChanges(previous_settings, settings))
+        except EnvironmentError:
+            Logger.logException("w", "Could not record changes to the weights and prices in the journal")
+
+    def _formatJournalTime(self, timestamp: float) -> str:
+        import time
+        return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+
+    def selectCurrencyRates(self) -> None:
+        from .CurrencyRates import CurrencyRates
+        file_name = self._getOpenFileName(catalog.i18nc("@title:window", "Exchange rates file"), "JSON files (*.json)")
+        if not file_name:
+            return
+
+        try:
+            currency_rates = CurrencyRates.load(file_name)
+        except Exception:
+            Logger.logException("e", "Could not load exchange rates from %s", file_name)
+            self._showMessage(catalog.i18nc("@info:status", "The selected file does not contain a table of exchange rates"))
+            return
+        self._preferences.setValue("material_cost_tools/currency_rates_path", file_name)
+
+        if currency_rates.getRate(currency_rates.getBase(), self._preferences.getValue("cura/currency")) is None:
+            self._showMessage(
+                catalog.i18nc("@info:status", "The exchange rates file does not contain a rate for {0}, so prices will not be converted").format(
+                    self._preferences.getValue("cura/currency")
+                )
+            )
+
+    def clearCurrencyRates(self) -> None:
+        self._preferences.setValue("material_cost_tools/currency_rates_path", "")
+
+    def _getCurrencyRates(self) -> Optional["CurrencyRates"]:
+        from .CurrencyRates import CurrencyRates
+        path = self._preferences.getValue("material_cost_tools/currency_rates_path")
+        if not path:
+            return None
+        try:
+            # the rates are only read again if the file has changed
+            return CurrencyRates.load(path)
+        except Exception:
+            Logger.logException("w", "Could not load exchange rates from %s", path)
+            return None
+
+
+    def connectSharedStore(self) -> None:
+        file_name = self._getSaveFileName(
+            catalog.i18nc("@title:window", "Shared weights and prices database"), "SQLite databases (*.sqlite *.db)", confirm_overwrite = False
+        )
+        if not file_name:
+            return
+
+        self._closeSharedStore()
+        self._preferences.setValue("material_cost_tools/shared_store_path", file_name)
+        self._preferences.setValue("material_cost_tools/shared_store_revision", 0)
+        self._openSharedStore()
+
+    def disconnectSharedStore(self) -> None:
+        self._closeSharedStore()
+        self._preferences.setValue("material_cost_tools/shared_store_path", "")
+        self._preferences.setValue("material_cost_tools/shared_store_revision", 0)
+
+    def _openSharedStore(self) -> None:
+        import sqlite3
+        from .SharedCostStore import SharedCostStore
+        path = self._preferences.getValue("material_cost_tools/shared_store_path")
+        if not path or self._shared_store is not None:
+            return
+
+        try:
+            revision = int(self._preferences.getValue("material_cost_tools/shared_store_revision"))
+        except (TypeError, ValueError):
+            revision = 0
+
+        store = SharedCostStore(path)
+        try:
+            store.open()
+            # only the rows that changed since the last session are read, unless the database was replaced
+            if revision > store.getRevision():
+                Logger.log("w", "Shared weights and prices database %s is older than the last synchronization; reading all materials", path)
+                revision = 0
+        except sqlite3.Error:
+            store.close()
+            Logger.logException("e", "Could not open shared weights and prices database %s", path)
+            self._showMessage(catalog.i18nc("@info:status", "Could not open the shared weights and prices database"))
+            return
+
+        self._shared_store = store
+        self._shared_store_revision = revision
+        self._syncSharedStore()
+
+        if self._shared_store_timer is None:
+            self._shared_store_timer = QTimer()
+            self._shared_store_timer.setInterval(self.SHARED_STORE_POLL_INTERVAL)
+            self._shared_store_timer.timeout.connect(self._syncSharedStore)
+        self._shared_store_timer.start()
+
+    def _closeSharedStore(self) -> None:
+        if self._shared_store_timer is not None:
+            self._shared_store_timer.stop()
+        if self._shared_store is not None:
+            self._shared_store.close()
+            self._shared_store = None
+
+    def _syncSharedStore(self) -> None:
+        import json
+        import sqlite3
+        from .ImportChangeSet import ImportChangeSet
+        if self._shared_store is None or self._job is not None:
+            # a running import would overwrite the synchronized settings; try again later
+            return
+
+        try:
+            if not self._shared_store.hasChanged():
+                return
+            (revision, stored_settings) = self._shared_store.getChangesSince(self._shared_store_revision)
+        except sqlite3.Error:
+            Logger.logException("w", "Could not read from shared weights and prices database")
+            return
+
+        if stored_settings:
+            try:
+                material_settings = json.loads(self._preferences.getValue("cura/material_settings"))
+            except:
+                Logger.logException("e", "Could not load material settings from preferences")
+                return
+
+            change_set = ImportChangeSet(material_settings)
+            removed_guids = set()  # type: Set[str]
+            for (guid, data) in stored_settings.items():
+                # weights and prices that were cleared or undone elsewhere are removed here as well
+                current = material_settings.get(guid)
+                removed_keys = [key for (key, value) in data.items() if value is None and current is not None and key in current]
+                if removed_keys:
+                    for key in removed_keys:
+                        del current[key]
+                    if not current:
+                        del material_settings[guid]
+                    removed_guids.add(guid)
+                change_set.addRow(guid, {key: value for (key, value) in data.items() if value is not None})
+            if removed_guids or not change_set.isEmpty():
+                change_set.applyTo(material_settings)
+                self._preferences.setValue("cura/material_settings", json.dumps(material_settings))
+                Logger.log("i", "Synchronized weights and prices for %d materials from shared database", len(removed_guids.union(change_set.getAdded(), change_set.getChanged())))
+
+        if revision != self._shared_store_revision:
+            self._shared_store_revision = revision
+            self._preferences.setValue("material_cost_tools/shared_store_revision", revision)
+
+    def _pushToSharedStore(self, change_set: "ImportChangeSet") -> None:
+        import sqlite3
+        if self._shared_store is None:
+            return
+
+        material_settings = dict(change_set.getAdded())
+        material_settings.update(change_set.getChanged())
+        try:
+            self._shared_store.upsertMany(material_settings)
+        except sqlite3.Error:
+            Logger.logException("e", "Could not write to shared weights and prices database")
+            self._showMessage(catalog.i18nc("@info:status", "Could not write to the shared weights and prices database"))
+
+    # Writes the complete weights and prices of materials, with None for materials that no longer have
+    # any, so clearing and undoing changes also removes values from the shared database
+    def _replaceInSharedStore(self, material_settings: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        import sqlite3
+        if self._shared_store is None:
+            return
+
+        try:
+            self._shared_store.replaceMany(material_settings)
+        except sqlite3.Error:
+            Logger.logException("e", "Could not write to shared weights and prices database")
+            self._showMessage(catalog.i18nc("@info:status", "Could not write to the shared weights and prices database"))
+
+
+    def selectWatchFolder(self) -> None:
+        directory = QFileDialog.getExistingDirectory(
+            None,
+            catalog.i18nc("@title:window", "Folder to import price lists from"),
+            self._preferences.getValue("material_cost_tools/watch_folder_path") or self._preferences.getValue("material_cost_tools/dialog_path")
+        )
+        if not directory:
+            return
+
+        self._closeWatchFolder()
+        self._preferences.setValue("material_cost_tools/watch_folder_path", directory)
+        self._openWatchFolder()
+
+    def clearWatchFolder(self) -> None:
+        self._closeWatchFolder()
+        self._preferences.setValue("material_cost_tools/watch_folder_path", "")
+
+    def _openWatchFolder(self) -> None:
+        from .WatchFolder import WatchFolder
+        path = self._preferences.getValue("material_cost_tools/watch_folder_path")
+        if not path or self._watch_folder is not None:
+            return
+
+        self._watch_folder = WatchFolder(path, os.path.join(Resources.getDataStoragePath(), "material_cost_watch_folder.json"))
+        self._pollWatchFolder()
+
+        if self._watch_folder_timer is None:
+            self._watch_folder_timer = QTimer()
+            self._watch_folder_timer.setInterval(self.WATCH_FOLDER_POLL_INTERVAL)
+            self._watch_folder_timer.timeout.connect(self._pollWatchFolder)
+        self._watch_folder_timer.start()
+
+    def _closeWatchFolder(self) -> None:
+        if self._watch_folder_timer is not None:
+            self._watch_folder_timer.stop()
+        self._watch_folder = None
+
+    def _pollWatchFolder(self) -> None:
+        from .StageTimer import StageTimer
+        from .WatchFolderJob import WatchFolderJob
+        if self._watch_folder is None or self._job is not None:
+            # files that change while another job runs are picked up by the next poll
+            return
+        if self._watch_folder.hasRejectedFiles():
+            # files that could not be imported are tried again when the currency settings change
+            self._setWatchFolderCurrency()
+        # only the modification times and sizes are compared here; the job reads the changed files
+        if not self._watch_folder.getChangedFiles():
+            return
+
+        self._setWatchFolderCurrency()
+        self._watch_folder.name_resolver = self._getCatalog().matchName
+        job = WatchFolderJob(
+            self._watch_folder,
+            self._preferences.getValue("cura/material_settings"),
+            self._getCatalog().hasGuid,
+            StageTimer("Import from watch folder")
+        )
+        job.finished.connect(self._onWatchFolderJobFinished)
+        # there is no progress message, since nobody asked for this import
+        self._job = job
+        job.start()
+
+    def _setWatchFolderCurrency(self) -> None:
+        if self._watch_folder is not None:
+            self._watch_folder.currency_rates = self._getCurrencyRates()
+            self._watch_folder.target_currency = self._preferences.getValue("cura/currency")
+
+    # Writes the change set of a finished import to the preferences, and returns the previous and the applied
+    # settings of the imported materials. If the settings were changed since the job read them, the change set
+    # is applied to the current settings, so those changes are not overwritten by what the job serialized.
+    def _saveImportedSettings(self, job: Union["ImportJob", "WatchFolderJob"]) -> Optional[Tuple[Dict[str, Optional[Dict[str, Any]]], Dict[str, Dict[str, Any]]]]:
+        import json
+        change_set = job.getChangeSet()
+        serialized_settings = job.getSerializedSettings()
+        if change_set is None or serialized_settings is None:
+            return None
+
+        current_settings = self._preferences.getValue("cura/material_settings")
+        if current_settings == job.getMaterialSettings():
+            self._preferences.setValue("cura/material_settings", serialized_settings)
+            return (job.getPreviousSettings(), job.getAppliedSettings())
+
+        try:
+            material_settings = json.loads(current_settings)
+        except Exception:
+            Logger.logException("e", "Could not load material settings from preferences")
+            return None
+        previous_settings = change_set.getPreviousSettings(material_settings)
+        change_set.applyTo(material_settings)
+        applied_settings = change_set.getAppliedSettings(material_settings)
+        self._preferences.setValue("cura/material_settings", json.dumps(material_settings))
+        return (previous_settings, applied_settings)
+
+    def _onWatchFolderJobFinished(self, job: "WatchFolderJob") -> None:
+        self._job = None
+        self._logStageTimer(job.getStageTimer())
+
+        change_set = job.getChangeSet()
+        if job.isCancelled() or job.hasError() or change_set is None:
+            return
+        watch_folder = job.getWatchFolder()
+        if watch_folder is not self._watch_folder:
+            # the folder was changed or closed while the job was running
+            return
+
+        saved_settings = None
+        if job.getSerializedSettings() is not None:
+            imported_count = change_set.getAddedCount() + change_set.getChangedCount()
+            stage_timer = job.getStageTimer()
+            with stage_timer.span("preference save"):
+                saved_settings = self._saveImportedSettings(job)
+        if saved_settings is not None:
+            (previous_settings, applied_settings) = saved_settings
+            if self._shared_store is not None:
+                with stage_timer.span("shared database update", imported_count):
+                    self._pushToSharedStore(change_set)
+            with stage_timer.span("price history update", imported_count):
+                self._recordPriceHistory(applied_settings)
+            with stage_timer.span("journal update", imported_count):
+                self._recordJournal(
+                    "watch_folder",
+                    catalog.i18nc("@label {0} is a folder", "import from watch folder {0}").format(watch_folder.getDirectory()),
+                    previous_settings,
+                    applied_settings
+                )
+            Logger.log("i", "Imported weights and prices for %d materials from watch folder %s", imported_count, watch_folder.getDirectory())
+
+        try:
+            watch_folder.commit()
+        except EnvironmentError:
+            Logger.logException("w", "Could not save the index of watch folder %s", watch_folder.getDirectory())
+
+        errors = watch_folder.getErrors()
+        if saved_settings is None and not errors:
+            return
+        text = catalog.i18ncp(
+            "@info:status {0} is count", "Imported weight & price for {0} material from the watch folder.", "Imported weights & prices for {0} materials from the watch folder.",
+            change_set.getAddedCount() + change_set.getChangedCount()
+        ).format(change_set.getAddedCount() + change_set.getChangedCount())
+        if errors:
+            text += "\n" + catalog.i18nc("@info:status {0} is a list of files", "Could not import: {0}").format(", ".join(sorted(errors)))
+        self._showImportResult(text, watch_folder.getReport())
+
+
+    def setPriceFeeds(self) -> None:
+        from .PriceFeeds import PriceFeeds
+        (text, accepted) = QInputDialog.getMultiLineText(
+            None,
+            catalog.i18nc("@title:window", "Price list URLs"),
+            catalog.i18nc("@label", "The URLs of the price lists to sync, one per line:"),
+            "\n".join(PriceFeeds.parseUrls(self._preferences.getValue("material_cost_tools/price_feeds")))
+        )
+        if not accepted:
+            return
+        self._preferences.setValue("material_cost_tools/price_feeds", ";".join(PriceFeeds.parseUrls(text)))
+
+    def syncPriceFeeds(self) -> None:
+        from .PriceFeedJob import PriceFeedJob
+        from .PriceFeeds import PriceFeeds
+        from .StageTimer import StageTimer
+        if self._isJobRunning():
+            return
+
+        urls = PriceFeeds.parseUrls(self._preferences.getValue("material_cost_tools/price_feeds"))
+        if not urls:
+            self._showMessage(catalog.i18nc("@info:status", "No price list URLs have been set"))
+            return
+
+        data_path = Resources.getDataStoragePath()
+        price_feeds = PriceFeeds(urls, os.path.join(data_path, "material_cost_feeds"), os.path.join(data_path, "material_cost_feeds.json"))
+        job = PriceFeedJob(
+            price_feeds,
+            self._preferences.getValue("cura/material_settings"),
+            self._getCatalog().hasGuid,
+            self._preferences.getValue("material_cost_tools/import_conflict_policy"),
+            self._getCurrencyRates(),
+            self._preferences.getValue("cura/currency"),
+            StageTimer("Sync price lists"),
+            self._getCatalog().matchName
+        )
+        job.finished.connect(self._onPriceFeedJobFinished)
+        self._startJob(job, catalog.i18nc("@info:status", "Downloading price lists..."))
+
+    def _onPriceFeedJobFinished(self, job: "PriceFeedJob") -> None:
+        self._hideMessage()
+
+        try:
+            price_feeds = job.getPriceFeeds()
+            errors = price_feeds.getErrors()
+            if job.isCancelled():
+                return
+            notice = ""
+            if errors:
+                notice = catalog.i18nc("@info:status {0} is a list of URLs", "Could not download: {0}").format(
+                    ", ".join(url for url in price_feeds.getUrls() if url in errors)
+                )
+            import_errors = job.getErrors()
+            if import_errors:
+                # the downloaded files are named after the URLs, but the URLs are what the user knows
+                notice += ("\n" if notice else "") + catalog.i18nc("@info:status {0} is a list of URLs", "Could not import: {0}").format(
+                    ", ".join(url for url in price_feeds.getUrls() if price_feeds.getFileName(url) in import_errors)
+                )
+            if not job.getFileNames():
+                if errors:
+                    self._showMessage(notice)
+                else:
+                    self._showMessage(catalog.i18nc("@info:status", "The price lists have not changed since they were last synced."))
+                applied = True
+            else:
+                applied = self._applyImportJob(job, notice)
+
+            if applied:
+                # feeds that were not applied are downloaded and offered again on the next sync
+                try:
+                    price_feeds.commit()
+                except EnvironmentError:
+                    Logger.logException("w", "Could not save the state of the price lists")
+        finally:
+            # like an import, the job is done once it is applied or dismissed
+            self._job = None
+            self._logStageTimer(job.getStageTimer())
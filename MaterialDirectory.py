@@ -0,0 +1,75 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import os
+import xml.etree.ElementTree as ET
+
+from typing import Any, Dict, Iterator, Optional
+
+# Reads the metadata of base materials from .xml.fdm_material files, without using the Cura
+# container registry. The metadata uses the same keys as the registry metadata of materials.
+class MaterialDirectory:
+    NAMESPACE = "{http://www.ultimaker.com/material}"
+    FILE_EXTENSION = ".xml.fdm_material"
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+
+    def getMaterialsMetadata(self) -> Iterator[Dict[str, Any]]:
+        for (directory, _, file_names) in os.walk(self._path):
+            for file_name in sorted(file_names):
+                if not file_name.endswith(self.FILE_EXTENSION):
+                    continue
+                metadata = self.readMetadata(os.path.join(directory, file_name))
+                if metadata is not None:
+                    yield metadata
+
+    @classmethod
+    def readMetadata(cls, file_path: str) -> Optional[Dict[str, Any]]:
+        try:
+            root = ET.parse(file_path).getroot()
+        except (ET.ParseError, EnvironmentError):
+            return None
+
+        ns = cls.NAMESPACE
+        guid = root.findtext("%smetadata/%sGUID" % (ns, ns))
+        if not guid:
+            return None
+
+        container_id = os.path.basename(file_path)[:-len(cls.FILE_EXTENSION)]
+        metadata = {
+            "id": container_id,
+            "base_file": container_id,
+            "type": "material",
+            "GUID": guid.strip()
+        }  # type: Dict[str, Any]
+
+        name_element = root.find("%smetadata/%sname" % (ns, ns))
+        if name_element is not None:
+            brand = name_element.findtext("%sbrand" % ns, "")
+            material = name_element.findtext("%smaterial" % ns, "")
+            color = name_element.findtext("%scolor" % ns, "")
+            label = name_element.findtext("%slabel" % ns)
+            metadata["brand"] = brand
+            metadata["material"] = material
+            metadata["color_name"] = color
+            # same naming as XmlMaterialProfile
+            if label is not None:
+                metadata["name"] = label
+            elif color == "Generic":
+                metadata["name"] = material
+            else:
+                metadata["name"] = "%s %s" % (color, material)
+
+        properties = {}
+        for property_element in root.iterfind("%sproperties/*" % ns):
+            properties[property_element.tag[len(ns):]] = property_element.text
+        if properties:
+            metadata["properties"] = properties
+        if "diameter" in properties:
+            try:
+                metadata["approximate_diameter"] = str(round(float(properties["diameter"])))
+            except (TypeError, ValueError):
+                pass
+
+        return metadata
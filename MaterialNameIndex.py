@@ -0,0 +1,160 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import math
+import re
+import unicodedata
+from itertools import islice
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z]+|[0-9]+")
+# "1.75" and "1,75" are one token, so diameters can be matched
+DECIMAL_PATTERN = re.compile(r"(?<=[0-9])[.,](?=[0-9])")
+
+# Finds materials by the "brand name" text that exports write in the name column, for price lists that
+# do not have GUIDs. Materials are indexed by the tokens of their brand, name, material type and
+# diameter; a text matches the materials that share the most distinctive (least common) tokens with it.
+# Tokens that are not in the index are matched to indexed tokens that share most of their trigrams,
+# to allow for typos. A match is only accepted if it is clearly better than the next best match, and a
+# text that names a material type, such as "PETG", does not match materials of another type.
+class MaterialNameIndex:
+    ACCEPT_SCORE = 0.75
+    MIN_SCORE = 0.5
+    MARGIN = 0.1
+    MAX_CANDIDATES = 5
+    MIN_TRIGRAM_SIMILARITY = 0.5
+    # a text that matches more materials than this is too unspecific to pick one, so not all are scored
+    MAX_SCORED_CANDIDATES = 200
+
+    def __init__(self, materials_metadata: Iterable[Dict[str, Any]]) -> None:
+        self._names = {}  # type: Dict[str, str]
+        self._exact = {}  # type: Dict[str, Set[str]]
+        self._tokens = {}  # type: Dict[str, Set[str]]
+        self._postings = {}  # type: Dict[str, Set[str]]
+        self._material_types = {}  # type: Dict[str, Set[str]]
+
+        for metadata in materials_metadata:
+            guid = metadata.get("GUID")
+            if not guid or guid in self._names:
+                continue
+            name = "%s %s" % (metadata.get("brand", ""), metadata.get("name", ""))
+            name_tokens = self.tokenize(name)
+            self._names[guid] = name
+            self._exact.setdefault(" ".join(sorted(name_tokens)), set()).add(guid)
+
+            tokens = set(name_tokens)
+            material_type = set(self.tokenize(metadata.get("material", "")))
+            self._material_types[guid] = material_type
+            tokens.update(material_type)
+            diameter = metadata.get("properties", {}).get("diameter")
+            if diameter:
+                tokens.update(self.tokenize(str(diameter)))
+            self._tokens[guid] = tokens
+            for token in tokens:
+                self._postings.setdefault(token, set()).add(guid)
+
+        self._type_tokens = set().union(*self._material_types.values())  # type: Set[str]
+
+        # tokens that few materials have say more about which material is meant
+        material_count = len(self._names)
+        self._weights = {token: math.log(1 + material_count / len(guids)) for (token, guids) in self._postings.items()}
+        self._material_weights = {guid: sum(self._weights[token] for token in tokens) for (guid, tokens) in self._tokens.items()}
+
+        self._trigrams = {}  # type: Dict[str, Set[str]]
+        for token in self._postings:
+            if len(token) < 4 or token.isdigit():
+                continue
+            for trigram in self._getTrigrams(token):
+                self._trigrams.setdefault(trigram, set()).add(token)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def getName(self, guid: str) -> str:
+        return self._names.get(guid, "")
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        # "Établissement" matches "etablissement"
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+        return TOKEN_PATTERN.findall(DECIMAL_PATTERN.sub("", text))
+
+    # Returns the GUID of the material the text describes, or None if no material or more than one
+    # material matches well enough; and the best matching materials as (GUID, name, score) tuples
+    def match(self, text: str) -> Tuple[Optional[str], List[Tuple[str, str, float]]]:
+        query_tokens = self.tokenize(text)
+        if not query_tokens:
+            return (None, [])
+
+        exact = self._exact.get(" ".join(sorted(query_tokens)))
+        if exact is not None and len(exact) == 1:
+            guid = next(iter(exact))
+            return (guid, [(guid, self._names[guid], 1.0)])
+
+        tokens = set()  # type: Set[str]
+        # words that can not be matched make every match less likely; short words and numbers that are
+        # not in the index are mostly units and article numbers, and are ignored
+        unmatched_weight = 0.0
+        for token in query_tokens:
+            if token not in self._postings:
+                token = self._findSimilarToken(token)
+                if token is None:
+                    unmatched_weight += math.log(1 + len(self._names)) / 2
+                    continue
+            tokens.add(token)
+        if not tokens:
+            return (None, [])
+
+        # the candidates are the materials that have the rarest tokens, narrowed down by the other tokens
+        # as long as that leaves any materials, so only a few materials have to be scored
+        ordered_tokens = sorted(tokens, key = lambda token: (len(self._postings[token]), token))
+        candidates = self._postings[ordered_tokens[0]]
+        for token in ordered_tokens[1:]:
+            narrowed = candidates & self._postings[token]
+            if not narrowed:
+                break
+            candidates = narrowed
+
+        too_many = len(candidates) > self.MAX_SCORED_CANDIDATES
+        query_weight = sum(self._weights[token] for token in tokens) + unmatched_weight
+        scored = []  # type: List[Tuple[float, str]]
+        type_tokens = tokens & self._type_tokens
+        if type_tokens:
+            candidates = {guid for guid in candidates if type_tokens & self._material_types[guid]}
+        for guid in islice(candidates, self.MAX_SCORED_CANDIDATES):
+            common_weight = sum(self._weights[token] for token in tokens & self._tokens[guid])
+            scored.append((2 * common_weight / (query_weight + self._material_weights[guid]), guid))
+        scored.sort(reverse = True)
+
+        # an unspecific text is reported as ambiguous, with some of the materials it matches
+        matches = [(guid, self._names[guid], round(score, 3)) for (score, guid) in scored[:self.MAX_CANDIDATES] if score >= self.MIN_SCORE or too_many]
+        if too_many or not matches or matches[0][2] < self.ACCEPT_SCORE:
+            return (None, matches)
+        if len(scored) > 1 and scored[0][0] - scored[1][0] < self.MARGIN:
+            return (None, matches)
+        return (matches[0][0], matches)
+
+    def _findSimilarToken(self, token: str) -> Optional[str]:
+        if len(token) < 4 or token.isdigit():
+            return None
+        trigrams = self._getTrigrams(token)
+        shared_counts = {}  # type: Dict[str, int]
+        for trigram in trigrams:
+            for similar_token in self._trigrams.get(trigram, ()):
+                shared_counts[similar_token] = shared_counts.get(similar_token, 0) + 1
+
+        best_token = None
+        best_similarity = self.MIN_TRIGRAM_SIMILARITY
+        for (similar_token, shared_count) in shared_counts.items():
+            # the trigrams of both tokens, as a fraction of the trigrams of either token
+            similarity = shared_count / (len(trigrams) + len(similar_token) - shared_count)
+            if similarity >= best_similarity:
+                best_token = similar_token
+                best_similarity = similarity
+        return best_token
+
+    @staticmethod
+    def _getTrigrams(token: str) -> Set[str]:
+        padded = " %s " % token
+        return {padded[index:index + 3] for index in range(len(padded) - 2)}
@@ -0,0 +1,171 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from .CurrencyRates import CurrencyRates
+from .ImportChangeSet import ImportChangeSet
+from .ImportPipeline import ImportPipeline
+from .RowValidator import ValidationReport
+
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+LAST_FILE_WINS = "last_file"
+LOWEST_PRICE = "lowest_price"
+NEWEST_FILE = "newest_file"
+CONFLICT_POLICIES = [LAST_FILE_WINS, LOWEST_PRICE, NEWEST_FILE]
+
+# Parses a single file into a dictionary of material settings. This is a module level function so it
+# can also be run in a process pool.
+def parseFile(file_name: str, currency_rates: Optional[CurrencyRates] = None, target_currency: Optional[str] = None,
+              name_resolver: Optional[Callable[[str], Tuple[Optional[str], List[Tuple[str, str, float]]]]] = None) -> Dict[str, Any]:
+    change_set = ImportChangeSet({})
+    pipeline = ImportPipeline(change_set, report = ValidationReport(os.path.basename(file_name)))
+    pipeline.currency_rates = currency_rates
+    pipeline.target_currency = target_currency
+    pipeline.name_resolver = name_resolver
+    pipeline.runFile(file_name)
+    return {
+        "file": file_name,
+        "modified": os.path.getmtime(file_name),
+        "currency": pipeline.getCurrency(),
+        "conversion": pipeline.getConversion(),
+        "settings": change_set.getAdded(),
+        "invalid_count": change_set.getInvalidCount(),
+        "report": pipeline.getReport()
+    }
+
+# Parses several price lists concurrently and merges them into one set of material settings.
+# When a material is listed in more than one file with different values, the conflict policy decides
+# which file is used, and the conflict is recorded so it can be reported.
+class MultiFileImport:
+    MAX_WORKERS = 4
+
+    def __init__(self, file_names: List[str], policy: str = LAST_FILE_WINS) -> None:
+        if policy not in CONFLICT_POLICIES:
+            raise ValueError("Unknown conflict policy: %s" % policy)
+
+        self._file_names = file_names
+        self._policy = policy
+
+        self._results = []  # type: List[Dict[str, Any]]
+        self._reference_results = []  # type: List[Dict[str, Any]]
+        self._errors = {}  # type: Dict[str, str]
+        self._conflicts = []  # type: List[Dict[str, Any]]
+
+        # when set, costs in another currency than the target currency are converted with these rates
+        self.currency_rates = None  # type: Optional[CurrencyRates]
+        self.target_currency = None  # type: Optional[str]
+        # when set, rows without a valid GUID are looked up by name; this is not done when parsing in separate processes
+        self.name_resolver = None  # type: Optional[Callable[[str], Tuple[Optional[str], List[Tuple[str, str, float]]]]]
+        # files that were imported before and did not change since; their rows are only used to resolve conflicts
+        # with the materials in the other files, and their issues are not reported again
+        self.reference_file_names = []  # type: List[str]
+
+        # called with the number of parsed files and the total number of files
+        self.progress_callback = None  # type: Optional[Callable[[int, int], None]]
+        # called before parsing every next file; returning False stops the import
+        self.continue_callback = None  # type: Optional[Callable[[], bool]]
+
+    def getResults(self) -> List[Dict[str, Any]]:
+        return self._results
+
+    def getErrors(self) -> Dict[str, str]:
+        return self._errors
+
+    def getConflicts(self) -> List[Dict[str, Any]]:
+        return self._conflicts
+
+    def getCurrencies(self) -> Dict[str, str]:
+        return {result["file"]: result["currency"] for result in self._results if result["currency"] is not None}
+
+    # The currency the costs were converted from and the rate, by file name
+    def getConversions(self) -> Dict[str, Tuple[str, float]]:
+        return {result["file"]: result["conversion"] for result in self._results if result["conversion"] is not None}
+
+    def getInvalidCount(self) -> int:
+        return sum(result["invalid_count"] for result in self._results)
+
+    # Returns the issues found in all parsed files
+    def getReport(self) -> ValidationReport:
+        report = ValidationReport()
+        for result in self._results:
+            report.extend(result["report"])
+        return report
+
+    # Returns False if the import was stopped by the continue callback
+    def parse(self, max_workers: Optional[int] = None, use_processes: bool = False) -> bool:
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor  # type: Callable[..., Executor]
+        results_by_file = {}  # type: Dict[str, Dict[str, Any]]
+        file_names = list(dict.fromkeys(self._file_names + self.reference_file_names))
+        with executor_class(max_workers = max_workers or self.MAX_WORKERS) as executor:
+            name_resolver = self.name_resolver if not use_processes else None
+            futures = {executor.submit(parseFile, file_name, self.currency_rates, self.target_currency, name_resolver): file_name for file_name in file_names}
+            for future in as_completed(futures):
+                if self.continue_callback is not None and not self.continue_callback():
+                    for pending in futures:
+                        pending.cancel()
+                    return False
+                file_name = futures[future]
+                try:
+                    results_by_file[file_name] = future.result()
+                except Exception as e:
+                    self._errors[file_name] = str(e)
+                if self.progress_callback is not None:
+                    self.progress_callback(len(results_by_file) + len(self._errors), len(futures))
+
+        # keep the order in which the files were specified, regardless of which file was parsed first
+        self._results = [results_by_file[file_name] for file_name in self._file_names if file_name in results_by_file]
+        self._reference_results = [
+            results_by_file[file_name] for file_name in self.reference_file_names if file_name in results_by_file and file_name not in self._file_names
+        ]
+        return True
+
+    def merge(self) -> Dict[str, Dict[str, Any]]:
+        results = self._results + self._reference_results
+        if self._policy == NEWEST_FILE:
+            results = sorted(results, key = lambda result: result["modified"])
+
+        merged = {}  # type: Dict[str, Dict[str, Any]]
+        sources = {}  # type: Dict[str, List[Tuple[str, Dict[str, Any]]]]
+        for result in results:
+            for (guid, data) in result["settings"].items():
+                sources.setdefault(guid, []).append((result["file"], data))
+        if self._reference_results:
+            # materials that are only in the reference files have not changed since they were imported
+            imported_guids = set()  # type: Set[str]
+            for result in self._results:
+                imported_guids.update(result["settings"])
+            sources = {guid: guid_sources for (guid, guid_sources) in sources.items() if guid in imported_guids}
+
+        self._conflicts = []
+        for (guid, guid_sources) in sources.items():
+            if len(guid_sources) == 1:
+                merged[guid] = guid_sources[0][1]
+                continue
+
+            if self._policy == LOWEST_PRICE:
+                priced = [source for source in guid_sources if "spool_cost" in source[1]]
+                # with equal prices, the last file wins
+                chosen = min(reversed(priced), key = lambda source: source[1]["spool_cost"]) if priced else guid_sources[-1]
+            else:
+                chosen = guid_sources[-1]
+            merged[guid] = chosen[1]
+
+            if any(data != chosen[1] for (_, data) in guid_sources):
+                self._conflicts.append({
+                    "guid": guid,
+                    "sources": guid_sources,
+                    "chosen": chosen[0]
+                })
+
+        return merged
+
+    @staticmethod
+    def formatConflict(conflict: Dict[str, Any], name: str = "") -> str:
+        values = "; ".join(
+            "%s: %s" % (os.path.basename(file_name), ", ".join("%s=%s" % item for item in sorted(data.items())))
+            for (file_name, data) in conflict["sources"]
+        )
+        return "%s%s: %s -> %s" % (conflict["guid"], " (%s)" % name if name else "", values, os.path.basename(conflict["chosen"]))
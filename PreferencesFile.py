@@ -0,0 +1,34 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import configparser
+
+from .AtomicFile import AtomicFile
+
+from typing import Optional
+
+# Reads and writes preferences in a Cura preferences file (eg cura.cfg) without Cura running.
+# Keys use the same "section/name" notation as UM.Preferences.
+class PreferencesFile:
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._parser = configparser.ConfigParser(interpolation = None)
+
+    def load(self) -> None:
+        with open(self._path, "r", encoding = "utf-8") as preferences_file:
+            self._parser.read_file(preferences_file)
+
+    def getValue(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        (section, name) = key.split("/", 1)
+        return self._parser.get(section, name, fallback = default)
+
+    def setValue(self, key: str, value: str) -> None:
+        (section, name) = key.split("/", 1)
+        if not self._parser.has_section(section):
+            self._parser.add_section(section)
+        self._parser.set(section, name, value)
+
+    def save(self) -> None:
+        # write to a temporary file first, so Cura never sees a half-written preferences file
+        with AtomicFile(self._path, "w", encoding = "utf-8") as preferences_file:
+            self._parser.write(preferences_file)
@@ -0,0 +1,42 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+from UM.Logger import Logger
+
+from .CurrencyRates import CurrencyRates
+from .ImportJob import ImportJob
+from .MultiFileImport import LAST_FILE_WINS
+from .PriceFeeds import PriceFeeds
+from .StageTimer import StageTimer
+
+from typing import Callable, List, Optional, Tuple
+
+# Downloads the price feeds that changed since the last sync, and imports them like the files of a
+# normal import. The state of the feeds is left to be committed once the import has been applied.
+class PriceFeedJob(ImportJob):
+    def __init__(self, price_feeds: PriceFeeds, material_settings: str, is_known_guid: Optional[Callable[[str], bool]] = None, conflict_policy: str = LAST_FILE_WINS,
+                 currency_rates: Optional[CurrencyRates] = None, target_currency: Optional[str] = None, stage_timer: Optional[StageTimer] = None,
+                 name_resolver: Optional[Callable[[str], Tuple[Optional[str], List[Tuple[str, str, float]]]]] = None) -> None:
+        super().__init__([], material_settings, is_known_guid, conflict_policy, currency_rates, target_currency,
+                         stage_timer if stage_timer is not None else StageTimer("Price feed sync"), name_resolver)
+
+        self._price_feeds = price_feeds
+
+    def getPriceFeeds(self) -> PriceFeeds:
+        return self._price_feeds
+
+    def run(self) -> None:
+        # the progress bar shows the progress of the downloads, and then of the import
+        self._price_feeds.progress_callback = lambda fetched_count, total_count: self.progress.emit(min(100 * fetched_count / total_count, 99))
+        self._price_feeds.continue_callback = lambda: not self.isCancelled()
+        with self._stage_timer.span("fetch feeds", len(self._price_feeds.getUrls())):
+            self._file_names = self._price_feeds.fetch()
+        for (url, error) in self._price_feeds.getErrors().items():
+            Logger.log("w", "Could not download price feed %s: %s", url, error)
+        if not self._file_names or self.isCancelled():
+            return
+
+        if self._conflict_policy != LAST_FILE_WINS:
+            # a feed that did not change can still have the lowest price or the newest file for a material in a feed that did
+            self._reference_file_names = self._price_feeds.getUnchangedFileNames()
+        super().run()
@@ -0,0 +1,215 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import email.utils
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import re
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .AtomicFile import AtomicFile
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Downloads price lists from URLs, such as the price lists of vendors or of an in-house server, to files
+# that are imported like any other price list. The feeds are downloaded concurrently. The ETag and
+# Last-Modified headers of the last download of every feed are kept in a state file and sent along
+# with the next request, so a server can answer that a feed did not change without sending it again;
+# a feed that is sent again with the same content as before does not count as changed either.
+# The state is only saved by commit(), once the downloaded files have been imported.
+class PriceFeeds:
+    VERSION = 1
+    MAX_WORKERS = 8
+    TIMEOUT = 30  # seconds
+    # how often the continue callback is called while waiting for the downloads
+    POLL_INTERVAL = 0.1  # seconds
+    CHUNK_SIZE = 64 * 1024
+    SCHEMES = ["http", "https", "file"]
+
+    CHANGED = "changed"
+    UNCHANGED = "unchanged"
+
+    def __init__(self, urls: List[str], cache_directory: str, state_path: str) -> None:
+        # the same feed is only downloaded once
+        self._urls = list(dict.fromkeys(urls))
+        self._cache_directory = cache_directory
+        self._state_path = state_path
+
+        self._state = {}  # type: Dict[str, Dict[str, Any]]
+        self._pending_state = {}  # type: Dict[str, Dict[str, Any]]
+        self._results = []  # type: List[Dict[str, Any]]
+        self._errors = {}  # type: Dict[str, str]
+
+        # called with the number of fetched feeds and the total number of feeds
+        self.progress_callback = None  # type: Optional[Callable[[int, int], None]]
+        # called while downloading, also from the download threads; returning False stops the downloads
+        self.continue_callback = None  # type: Optional[Callable[[], bool]]
+
+    def getUrls(self) -> List[str]:
+        return self._urls
+
+    # Splits the text of the price feeds preference into URLs
+    @staticmethod
+    def parseUrls(text: str) -> List[str]:
+        return [url for url in re.split(r"[\s;]+", text or "") if url]
+
+    # Returns the file a feed is downloaded to
+    def getFileName(self, url: str) -> str:
+        parsed_url = urllib.parse.urlsplit(url)
+        name = os.path.splitext(os.path.basename(parsed_url.path))[0] or parsed_url.hostname or "feed"
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", name)[:40]
+        return os.path.join(self._cache_directory, "%s-%s.feed" % (name, hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]))
+
+    # The result of every feed: the url, the status (CHANGED or UNCHANGED), the file it was downloaded to and its size
+    def getResults(self) -> List[Dict[str, Any]]:
+        return self._results
+
+    # The files of the feeds that did not change since the last sync, in the order of the URLs
+    def getUnchangedFileNames(self) -> List[str]:
+        return [result["file"] for result in self._results if result["status"] == self.UNCHANGED]
+
+    # The feeds that could not be downloaded, with the reason why
+    def getErrors(self) -> Dict[str, str]:
+        return self._errors
+
+    # Downloads the feeds that changed since the state was last committed
+    # Returns the files of the changed feeds, in the order of the URLs, or an empty list if the
+    # downloads were stopped by the continue callback
+    def fetch(self, max_workers: Optional[int] = None) -> List[str]:
+        self._loadState()
+        self._pending_state = {}
+        self._results = []
+        self._errors = {}
+        os.makedirs(self._cache_directory, exist_ok = True)
+
+        results_by_url = {}  # type: Dict[str, Dict[str, Any]]
+        if self._urls:
+            executor = ThreadPoolExecutor(max_workers = min(max_workers or self.MAX_WORKERS, len(self._urls)))
+            try:
+                futures = {executor.submit(self._fetchFeed, url, self._state.get(url, {})): url for url in self._urls}
+                pending = set(futures)
+                while pending:
+                    # the downloads are not waited for all at once, so a stop request is noticed
+                    (done, pending) = wait(pending, timeout = self.POLL_INTERVAL, return_when = FIRST_COMPLETED)
+                    for future in done:
+                        url = futures[future]
+                        try:
+                            fetched = future.result()
+                        except (EnvironmentError, ValueError, http.client.HTTPException) as e:
+                            self._errors[url] = str(e)
+                            continue
+                        if fetched is not None:
+                            (results_by_url[url], self._pending_state[url]) = fetched
+                    if done and self.progress_callback is not None:
+                        self.progress_callback(len(results_by_url) + len(self._errors), len(self._urls))
+                    if not self._shouldContinue():
+                        for future in pending:
+                            future.cancel()
+                        self._pending_state = {}
+                        return []
+            finally:
+                # downloads that are still running after a stop end at their next read, without waiting for them here
+                executor.shutdown(wait = False)
+
+        self._results = [results_by_url[url] for url in self._urls if url in results_by_url]
+        return [result["file"] for result in self._results if result["status"] == self.CHANGED]
+
+    # Saves the validators of the feeds fetched by the last fetch(), so unchanged feeds are skipped next time
+    def commit(self) -> None:
+        self._state.update(self._pending_state)
+        self._pending_state = {}
+        # feeds that are no longer configured are forgotten
+        state = {url: self._state[url] for url in self._urls if url in self._state}
+        with AtomicFile(self._state_path, "w", encoding = "utf-8") as state_file:
+            json.dump({"version": self.VERSION, "feeds": state}, state_file, indent = 1)
+
+    def _shouldContinue(self) -> bool:
+        return self.continue_callback is None or self.continue_callback()
+
+    # Returns the result and the new state of the feed, or None if the downloads were stopped
+    def _fetchFeed(self, url: str, state: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        if urllib.parse.urlsplit(url).scheme.lower() not in self.SCHEMES:
+            raise ValueError("Unsupported URL: %s" % url)
+        if not self._shouldContinue():
+            return None
+
+        file_name = self.getFileName(url)
+        has_file = os.path.exists(file_name)
+        request = urllib.request.Request(url, headers = {"Accept-Encoding": "gzip", "User-Agent": "MaterialCostTools"})
+        # a conditional request only makes sense if the last download is still there
+        if has_file and state.get("etag"):
+            request.add_header("If-None-Match", state["etag"])
+        if has_file and state.get("last_modified"):
+            request.add_header("If-Modified-Since", state["last_modified"])
+
+        try:
+            response = urllib.request.urlopen(request, timeout = self.TIMEOUT)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and has_file:
+                e.close()
+                return (self._makeResult(url, self.UNCHANGED, file_name), state)
+            raise
+
+        with response:
+            headers = response.headers
+            source = response  # type: Any
+            if (headers.get("Content-Encoding") or "").lower() == "gzip":
+                source = gzip.GzipFile(fileobj = response)
+
+            # the feed is streamed to a temporary file, which only replaces the last download if it differs
+            content_hash = hashlib.sha1()
+            atomic_file = AtomicFile(file_name, "wb")
+            with atomic_file as feed_file:
+                for chunk in iter(lambda: source.read(self.CHUNK_SIZE), b""):
+                    if not self._shouldContinue():
+                        # keep the last download
+                        atomic_file.discard()
+                        return None
+                    content_hash.update(chunk)
+                    feed_file.write(chunk)
+                unchanged = has_file and content_hash.hexdigest() == state.get("hash")
+                if unchanged:
+                    atomic_file.discard()
+
+        new_state = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "hash": content_hash.hexdigest()
+        }
+        if unchanged:
+            return (self._makeResult(url, self.UNCHANGED, file_name), new_state)
+
+        # the newest file wins conflicts by the modification time, which should be that of the feed
+        if new_state["last_modified"]:
+            try:
+                modified = email.utils.parsedate_to_datetime(new_state["last_modified"]).timestamp()
+                os.utime(file_name, (modified, modified))
+            except (TypeError, ValueError, OverflowError):
+                pass
+        return (self._makeResult(url, self.CHANGED, file_name), new_state)
+
+    def _makeResult(self, url: str, status: str, file_name: str) -> Dict[str, Any]:
+        return {
+            "url": url,
+            "status": status,
+            "file": file_name,
+            "size": os.path.getsize(file_name)
+        }
+
+    def _loadState(self) -> None:
+        try:
+            with open(self._state_path, "r", encoding = "utf-8") as state_file:
+                state = json.load(state_file)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            # the feeds are downloaded again
+            return
+        if isinstance(state, dict) and state.get("version") == self.VERSION and isinstance(state.get("feeds"), dict):
+            self._state = state["feeds"]
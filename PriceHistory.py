@@ -0,0 +1,309 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_right
+from uuid import UUID
+try:
+    import csv
+except ImportError:
+    # older versions of Cura somehow ship with a python version that does not include
+    # this file, so a local copy is supplied as a fallback
+    from . import csv  # type: ignore
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    import msvcrt
+
+from typing import Any, Dict, IO, List, Optional, Tuple
+
+# History of spool weights and prices, stored as an append-only binary file.
+# Every import appends one chunk, which holds the GUIDs that were not seen before (16 bytes each)
+# followed by four columns: GUID index (uint32), timestamp (uint32), cost (float32) and weight (int32).
+# Only materials that were added or changed by an import are recorded, so a daily import of an
+# unchanged price list does not grow the file. Missing values are stored as NaN and -1.
+# The file may be shared by several Cura instances; appending is done while the file is locked.
+class PriceHistory:
+    CHUNK_HEADER = struct.Struct("<4sII")
+    CHUNK_MAGIC = b"MCTC"
+    GUID_SIZE = 16
+    RECORD_SIZE = 16
+    MISSING_WEIGHT = -1
+    # weights are stored as int32; larger weights are recorded as missing
+    MAX_WEIGHT = 2 ** 31 - 1
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._guids_loaded = False
+        self._records_loaded = False
+        self._valid_size = 0
+
+        self._guids = []  # type: List[str]
+        self._guid_indices = {}  # type: Dict[str, int]
+
+        self._record_guids = array("I")
+        self._timestamps = array("I")
+        self._costs = array("f")
+        self._weights = array("i")
+
+        self._records_by_guid = None  # type: Optional[Dict[int, List[int]]]
+
+    def getPath(self) -> str:
+        return self._path
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self._timestamps)
+
+    def getGuids(self) -> List[str]:
+        self._load()
+        return list(self._guids)
+
+    def append(self, material_settings: Dict[str, Dict[str, Any]], timestamp: Optional[float] = None) -> int:
+        if timestamp is None:
+            timestamp = time.time()
+
+        guids = []  # type: List[str]
+        costs = array("f")
+        weights = array("i")
+        for (guid, data) in material_settings.items():
+            try:
+                guid = str(UUID(guid))
+            except ValueError:
+                continue
+            guids.append(guid)
+            costs.append(self._toFloat(data.get("spool_cost")))
+            weights.append(self._toInt(data.get("spool_weight")))
+
+        if not guids:
+            return 0
+
+        directory = os.path.dirname(os.path.abspath(self._path))
+        os.makedirs(directory, exist_ok = True)
+        with open(self._path, "a+b") as history_file:
+            self._lockFile(history_file)
+            try:
+                # another instance may have appended chunks since the file was last read, with GUIDs that the new
+                # chunk has to refer to by the same index; appending only needs the GUID table, not the records
+                self._guids_loaded = True
+                self._scanChunks(history_file, self._records_loaded)
+
+                new_guids = {}  # type: Dict[str, int]
+                record_guids = array("I")
+                for guid in guids:
+                    guid_index = self._guid_indices.get(guid)
+                    if guid_index is None:
+                        guid_index = new_guids.setdefault(guid, len(self._guids) + len(new_guids))
+                    record_guids.append(guid_index)
+                timestamps = array("I", [int(timestamp)] * len(guids))
+
+                chunk = bytearray(self.CHUNK_HEADER.pack(self.CHUNK_MAGIC, len(new_guids), len(timestamps)))
+                for guid in new_guids:
+                    chunk += UUID(guid).bytes
+                for column in (record_guids, timestamps, costs, weights):
+                    chunk += self._toLittleEndian(column)
+
+                history_file.seek(0, os.SEEK_END)
+                if history_file.tell() > self._valid_size:
+                    # drop an incomplete chunk left by an interrupted write, so the new chunk can be read back;
+                    # no other instance can be writing while the file is locked
+                    history_file.truncate(self._valid_size)
+                history_file.write(chunk)
+                history_file.flush()
+            finally:
+                self._unlockFile(history_file)
+        self._valid_size += len(chunk)
+
+        for guid in new_guids:
+            self._guid_indices[guid] = len(self._guids)
+            self._guids.append(guid)
+        if self._records_loaded:
+            self._record_guids.extend(record_guids)
+            self._timestamps.extend(timestamps)
+            self._costs.extend(costs)
+            self._weights.extend(weights)
+            self._records_by_guid = None
+
+        return len(timestamps)
+
+    # Returns (timestamp, cost, weight) tuples for a material, oldest first
+    def getHistory(self, guid: str) -> List[Tuple[int, Optional[float], Optional[int]]]:
+        return [self._getRecord(index) for index in self._getRecordIndices(guid)]
+
+    # Returns the cost and weight of a material as they were at the specified time, or None if no
+    # price was known at that time
+    def getValuesAt(self, guid: str, timestamp: float) -> Optional[Tuple[Optional[float], Optional[int]]]:
+        record_indices = self._getRecordIndices(guid)
+        position = bisect_right([self._timestamps[index] for index in record_indices], timestamp)
+        if position == 0:
+            return None
+        (_, cost, weight) = self._getRecord(record_indices[position - 1])
+        return (cost, weight)
+
+    def getCostAt(self, guid: str, timestamp: float) -> Optional[float]:
+        values = self.getValuesAt(guid, timestamp)
+        return values[0] if values else None
+
+    # Returns the weights and prices of all materials as they were at the specified time, in the
+    # format of the cura/material_settings preference
+    def getSettingsAt(self, timestamp: float) -> Dict[str, Dict[str, Any]]:
+        self._load()
+        material_settings = {}  # type: Dict[str, Dict[str, Any]]
+        for guid in self._guids:
+            values = self.getValuesAt(guid, timestamp)
+            if values is None:
+                continue
+            data = {}  # type: Dict[str, Any]
+            if values[0] is not None:
+                data["spool_cost"] = values[0]
+            if values[1] is not None:
+                data["spool_weight"] = values[1]
+            material_settings[guid] = data
+        return material_settings
+
+    def writeCsv(self, csv_file: IO[str], guids: Optional[List[str]] = None, names: Optional[Dict[str, str]] = None) -> int:
+        self._load()
+        csv_writer = csv.writer(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        csv_writer.writerow(["guid", "name", "date", "weight (g)", "cost"])
+
+        row_count = 0
+        for guid in (guids if guids is not None else self._guids):
+            name = names.get(guid, "") if names else ""
+            for (timestamp, cost, weight) in self.getHistory(guid):
+                csv_writer.writerow([
+                    guid,
+                    name,
+                    time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)),
+                    "" if weight is None else weight,
+                    "" if cost is None else round(cost, 4)
+                ])
+                row_count += 1
+        return row_count
+
+    def _getRecordIndices(self, guid: str) -> List[int]:
+        self._load()
+        try:
+            guid = str(UUID(guid))
+        except ValueError:
+            return []
+        guid_index = self._guid_indices.get(guid)
+        if guid_index is None:
+            return []
+
+        if self._records_by_guid is None:
+            records_by_guid = {}  # type: Dict[int, List[int]]
+            for (record_index, record_guid) in enumerate(self._record_guids):
+                records_by_guid.setdefault(record_guid, []).append(record_index)
+            for record_indices in records_by_guid.values():
+                record_indices.sort(key = lambda index: self._timestamps[index])
+            self._records_by_guid = records_by_guid
+        return self._records_by_guid.get(guid_index, [])
+
+    def _getRecord(self, index: int) -> Tuple[int, Optional[float], Optional[int]]:
+        cost = self._costs[index]  # type: Optional[float]
+        if cost != cost:  # NaN
+            cost = None
+        else:
+            # float32 can not represent most prices exactly
+            cost = round(cost, 4)
+        weight = self._weights[index]  # type: Optional[int]
+        if weight == self.MISSING_WEIGHT:
+            weight = None
+        return (self._timestamps[index], cost, weight)
+
+    def _load(self) -> None:
+        if self._records_loaded:
+            return
+        self._records_loaded = True
+
+        # the GUID table is read again along with the records
+        self._guids = []
+        self._guid_indices = {}
+        self._guids_loaded = True
+        self._valid_size = 0
+
+        if not os.path.exists(self._path):
+            return
+        with open(self._path, "rb") as history_file:
+            self._scanChunks(history_file, True)
+
+    # Reads the chunks after the part of the file that was read before; the records are only read if with_records is set
+    def _scanChunks(self, history_file: IO[bytes], with_records: bool) -> None:
+        file_size = os.fstat(history_file.fileno()).st_size
+        history_file.seek(self._valid_size)
+        while True:
+            header = history_file.read(self.CHUNK_HEADER.size)
+            if len(header) < self.CHUNK_HEADER.size:
+                break
+            (magic, guid_count, record_count) = self.CHUNK_HEADER.unpack(header)
+            chunk_end = self._valid_size + self.CHUNK_HEADER.size + guid_count * self.GUID_SIZE + record_count * self.RECORD_SIZE
+            if magic != self.CHUNK_MAGIC or chunk_end > file_size:
+                # an interrupted write leaves an incomplete chunk at the end, which is ignored
+                break
+            self._addGuids(history_file.read(guid_count * self.GUID_SIZE))
+            if with_records:
+                for column in (self._record_guids, self._timestamps, self._costs, self._weights):
+                    column.extend(self._fromLittleEndian(column.typecode, history_file.read(record_count * column.itemsize)))
+                self._records_by_guid = None
+            else:
+                history_file.seek(chunk_end)
+            self._valid_size = chunk_end
+
+    def _addGuids(self, guid_data: bytes) -> None:
+        for offset in range(0, len(guid_data), self.GUID_SIZE):
+            guid = str(UUID(bytes = bytes(guid_data[offset:offset + self.GUID_SIZE])))
+            self._guid_indices[guid] = len(self._guids)
+            self._guids.append(guid)
+
+    @staticmethod
+    def _toLittleEndian(column: array) -> bytes:
+        if sys.byteorder == "big":
+            column = array(column.typecode, column)
+            column.byteswap()
+        return column.tobytes()
+
+    @staticmethod
+    def _fromLittleEndian(typecode: str, data: bytes) -> array:
+        column = array(typecode)
+        column.frombytes(data)
+        if sys.byteorder == "big":
+            column.byteswap()
+        return column
+
+    @staticmethod
+    def _toFloat(value: Any) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return float("nan")
+
+    @classmethod
+    def _toInt(cls, value: Any) -> int:
+        try:
+            value = int(value)
+        except (TypeError, ValueError, OverflowError):
+            return cls.MISSING_WEIGHT
+        return value if 0 <= value <= cls.MAX_WEIGHT else cls.MISSING_WEIGHT
+
+    # Waits until no other instance is appending to the file
+    @staticmethod
+    def _lockFile(history_file: IO[bytes]) -> None:
+        if sys.platform == "win32":
+            # locks the first byte, which also works when the file is still empty
+            history_file.seek(0)
+            msvcrt.locking(history_file.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(history_file.fileno(), fcntl.LOCK_EX)
+
+    @staticmethod
+    def _unlockFile(history_file: IO[bytes]) -> None:
+        if sys.platform == "win32":
+            history_file.seek(0)
+            msvcrt.locking(history_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(history_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,168 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import math
+import struct
+import sys
+import zlib
+from array import array
+from uuid import UUID
+
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional, Tuple, Union
+
+# A complete table of spool weights and prices in a compact binary format, meant to distribute a
+# price list that has already been validated. The file consists of a header with the currency,
+# the number of materials and a CRC32 checksum of the body, followed by three columns: the GUIDs
+# (16 bytes each), the costs (float32) and the weights (int32), all little-endian. Missing values
+# are stored as NaN and -1. The columns are used in place through memoryviews, so loading a
+# snapshot does not copy or parse the data.
+class PriceSnapshot:
+    HEADER = struct.Struct("<4sHH8sII")
+    MAGIC = b"MCTS"
+    VERSION = 1
+    GUID_SIZE = 16
+    MISSING_WEIGHT = -1
+    MAX_WEIGHT = 2 ** 31 - 1
+    # float32 can not store larger costs
+    MAX_COST = 3.4e38
+    FILE_EXTENSION = "mctsnap"
+    CHUNK_SIZE = 500
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview], verify: bool = True) -> None:
+        buffer = memoryview(data)
+        if len(buffer) < self.HEADER.size:
+            raise ValueError("File is too short to be a price snapshot")
+        (magic, version, _, currency, count, checksum) = self.HEADER.unpack_from(buffer)
+        if magic != self.MAGIC:
+            raise ValueError("File is not a price snapshot")
+        if version > self.VERSION:
+            raise ValueError("Price snapshot version %d is not supported" % version)
+
+        body = buffer[self.HEADER.size:]
+        if len(body) != count * (self.GUID_SIZE + 4 + 4):
+            raise ValueError("Price snapshot is truncated")
+        if verify and zlib.crc32(body) != checksum:
+            raise ValueError("Price snapshot checksum does not match")
+
+        self._currency = currency.rstrip(b"\0").decode("utf-8")
+        self._count = count
+
+        # the header size is a multiple of 4, so the number columns are aligned
+        self._guids = body[:count * self.GUID_SIZE]
+        self._costs = self._column(body[count * self.GUID_SIZE:count * (self.GUID_SIZE + 4)], "f")
+        self._weights = self._column(body[count * (self.GUID_SIZE + 4):], "i")
+
+    @classmethod
+    def load(cls, file_name: str, verify: bool = True) -> "PriceSnapshot":
+        with open(file_name, "rb") as snapshot_file:
+            return cls(snapshot_file.read(), verify)
+
+    @classmethod
+    def isSnapshot(cls, file_name: str) -> bool:
+        with open(file_name, "rb") as snapshot_file:
+            return snapshot_file.read(len(cls.MAGIC)) == cls.MAGIC
+
+    # Writes the materials with a weight and/or a price. Materials that can not be stored are added to
+    # skipped_rows with the reason why. chunk_callback is called like that of ExportWriter; returning
+    # False stops the export.
+    # Returns the number of materials written, or None if the export was stopped
+    @classmethod
+    def write(cls, snapshot_file: IO[bytes], material_settings: Dict[str, Dict[str, Any]], currency: str,
+              chunk_callback: Optional[Callable[[int, int], bool]] = None, skipped_rows: Optional[List[Tuple[str, str]]] = None) -> Optional[int]:
+        guids = bytearray()
+        costs = array("f")
+        weights = array("i")
+        for (index, (guid, data)) in enumerate(material_settings.items()):
+            if index % cls.CHUNK_SIZE == 0 and chunk_callback is not None:
+                if not chunk_callback(index, len(material_settings)):
+                    return None
+
+            cost = cls._toFloat(data.get("spool_cost"))
+            weight = cls._toInt(data.get("spool_weight"))
+            if cost != cost and weight == cls.MISSING_WEIGHT:
+                continue
+            reason = None
+            if not (weight == cls.MISSING_WEIGHT or 0 <= weight <= cls.MAX_WEIGHT):
+                reason = "Weight %s is out of range" % weight
+            elif cost == cost and not (0.0 <= cost <= cls.MAX_COST):
+                reason = "Cost %s is out of range" % cost
+            else:
+                try:
+                    guids += UUID(guid).bytes
+                except ValueError as e:
+                    reason = str(e)
+            if reason is not None:
+                if skipped_rows is not None:
+                    skipped_rows.append((guid, reason))
+                continue
+            costs.append(cost)
+            weights.append(weight)
+
+        if sys.byteorder != "little":
+            costs.byteswap()
+            weights.byteswap()
+        body = bytes(guids) + costs.tobytes() + weights.tobytes()
+
+        encoded_currency = currency.encode("utf-8")
+        if len(encoded_currency) > 8:
+            raise ValueError("Currency %s is too long to be stored in a price snapshot" % currency)
+        snapshot_file.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, 0, encoded_currency, len(costs), zlib.crc32(body)))
+        snapshot_file.write(body)
+        return len(costs)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def getCurrency(self) -> str:
+        return self._currency
+
+    # Returns the guid and material settings of every material in the snapshot, optionally with the
+    # costs converted to another currency
+    def iterRows(self, cost_factor: float = 1.0) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        # converting all GUIDs to hex at once is much faster than creating a UUID per material
+        hex_guids = self._guids.hex()
+        infinity = math.inf
+        costs = self._costs.tolist()
+        # float32 can not represent most prices exactly; converted prices are rounded to cents
+        decimals = 4
+        if cost_factor != 1.0:
+            costs = list(map(cost_factor.__mul__, costs))
+            decimals = 2
+        for (index, cost, weight) in zip(range(0, self._count * 32, 32), costs, self._weights.tolist()):
+            guid = "%s-%s-%s-%s-%s" % (
+                hex_guids[index:index + 8], hex_guids[index + 8:index + 12], hex_guids[index + 12:index + 16],
+                hex_guids[index + 16:index + 20], hex_guids[index + 20:index + 32]
+            )
+            data = {}  # type: Dict[str, Any]
+            # missing costs are NaN, and missing weights are negative; a damaged or handmade snapshot
+            # could have other values that can not be stored as material settings
+            if 0.0 <= cost < infinity:
+                data["spool_cost"] = round(cost, decimals)
+            if weight >= 0:
+                data["spool_weight"] = weight
+            yield (guid, data)
+
+    def getSettings(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self.iterRows())
+
+    @staticmethod
+    def _column(data: memoryview, typecode: str) -> Union[memoryview, array]:
+        if sys.byteorder == "little":
+            return data.cast(typecode)
+        column = array(typecode, data.tobytes())
+        column.byteswap()
+        return column
+
+    @staticmethod
+    def _toFloat(value: Any) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return float("nan")
+
+    @classmethod
+    def _toInt(cls, value: Any) -> int:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return cls.MISSING_WEIGHT
@@ -0,0 +1,255 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import math
+import re
+try:
+    import csv
+except ImportError:
+    # older versions of Cura somehow ship with a python version that does not include
+    # this file, so a local copy is supplied as a fallback
+    from . import csv  # type: ignore
+
+from typing import Any, Callable, Dict, IO, List, Optional, Tuple
+
+GUID_PATTERN = re.compile(r"\{?[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}\}?")
+NUMBER_PATTERN = re.compile(r"\s*([+-]?)(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*")
+DECIMAL_COMMA_PATTERN = re.compile(r"\s*([+-]?)(\d+,\d+)\s*")
+# "1,000" may as well be a thousand with a thousands separator; only a lone zero can not be followed by one
+AMBIGUOUS_DECIMAL_COMMA_PATTERN = re.compile(r"\s*[+-]?(?!0,)\d+,\d{3}\s*")
+# larger values are mistakes, and would overflow when they are converted or stored as whole numbers
+MAX_COST = 1e9
+MAX_WEIGHT = 1000000  # grams
+
+# Issue codes, with whether the issue prevents (part of) a row from being imported
+MISSING_COLUMNS = "missing_columns"
+MALFORMED_GUID = "malformed_guid"
+UNKNOWN_GUID = "unknown_guid"
+INVALID_COST = "invalid_cost"
+NEGATIVE_COST = "negative_cost"
+INVALID_WEIGHT = "invalid_weight"
+NEGATIVE_WEIGHT = "negative_weight"
+DECIMAL_COMMA = "decimal_comma"
+AMBIGUOUS_DECIMAL_COMMA = "ambiguous_decimal_comma"
+MATCHED_BY_NAME = "matched_by_name"
+AMBIGUOUS_NAME = "ambiguous_name"
+UNMATCHED_NAME = "unmatched_name"
+ISSUE_MESSAGES = {
+    MISSING_COLUMNS: "Row does not have enough data",
+    MALFORMED_GUID: "UUID is malformed",
+    UNKNOWN_GUID: "Material is not installed",
+    INVALID_COST: "Cost is not a number or is too large",
+    NEGATIVE_COST: "Cost is negative",
+    INVALID_WEIGHT: "Weight is not a whole number or is too large",
+    NEGATIVE_WEIGHT: "Weight is negative",
+    DECIMAL_COMMA: "Value uses a decimal comma",
+    AMBIGUOUS_DECIMAL_COMMA: "Value could use a decimal comma or a thousands separator",
+    MATCHED_BY_NAME: "Material was found by name",
+    AMBIGUOUS_NAME: "Name matches more than one material",
+    UNMATCHED_NAME: "No material matches the name"
+}
+WARNINGS = {UNKNOWN_GUID, DECIMAL_COMMA, MATCHED_BY_NAME}
+
+# Collects the issues found while validating rows, and writes them as a CSV file. Every issue is counted,
+# but only the first rows with each kind of issue are kept as a sample, so a very broken file does not
+# keep all of its rows in memory.
+class ValidationReport:
+    MAX_SAMPLES = 100
+
+    def __init__(self, file_name: str = "") -> None:
+        self._file_name = file_name
+        self._issues = []  # type: List[Tuple[str, int, str, List[str], str]]
+        self._counts = {}  # type: Dict[str, int]
+        self._sample_counts = {}  # type: Dict[str, int]
+
+    # details optionally tells more about this particular issue, eg the materials a name matches
+    def addIssue(self, line_number: int, code: str, row: List[str], details: str = "") -> None:
+        self._counts[code] = self._counts.get(code, 0) + 1
+        self._addSample((self._file_name, line_number, code, row, details))
+
+    # Adds the issues of a report for another file
+    def extend(self, report: "ValidationReport") -> None:
+        for (code, count) in report.getCounts().items():
+            self._counts[code] = self._counts.get(code, 0) + count
+        for issue in report._issues:
+            self._addSample(issue)
+
+    def getCounts(self) -> Dict[str, int]:
+        return self._counts
+
+    def getCount(self, code: str) -> int:
+        return self._counts.get(code, 0)
+
+    def getErrorCount(self) -> int:
+        return sum(count for (code, count) in self._counts.items() if code not in WARNINGS)
+
+    def isEmpty(self) -> bool:
+        return not self._counts
+
+    # Writes the sampled rows; returns the number of rows written
+    def writeCsv(self, csv_file: IO[str]) -> int:
+        csv_writer = csv.writer(csv_file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        csv_writer.writerow(["file", "line", "severity", "issue", "description", "guid", "name", "weight (g)", "cost", "details"])
+        for (file_name, line_number, code, row, details) in self._issues:
+            csv_writer.writerow(
+                [file_name, line_number, "warning" if code in WARNINGS else "error", code, ISSUE_MESSAGES[code]] + (row + ["", "", "", ""])[:4] + [details]
+            )
+        return len(self._issues)
+
+    def _addSample(self, issue: Tuple[str, int, str, List[str], str]) -> None:
+        code = issue[2]
+        sample_count = self._sample_counts.get(code, 0)
+        if sample_count < self.MAX_SAMPLES:
+            self._sample_counts[code] = sample_count + 1
+            self._issues.append(issue)
+
+# Validates and coerces rows of a price list a chunk at a time. Each column of the chunk is checked
+# as a whole with precompiled patterns, so valid values never raise and catch exceptions.
+class RowValidator:
+    def __init__(self, is_known_guid: Optional[Callable[[str], bool]] = None, report: Optional[ValidationReport] = None) -> None:
+        self._is_known_guid = is_known_guid
+        self._report = report if report is not None else ValidationReport()
+
+        # called with the line number, issue code and offending row for every issue
+        self.issue_callback = None  # type: Optional[Callable[[int, str, List[str]], None]]
+        # costs are multiplied by this factor to convert them to another currency
+        self.cost_factor = 1.0
+        # when set, rows without a valid GUID are looked up by the name in the second column (or the first column);
+        # returns the GUID if exactly one material matches, and the best matching materials as (GUID, name, score)
+        self.name_resolver = None  # type: Optional[Callable[[str], Tuple[Optional[str], List[Tuple[str, str, float]]]]]
+
+    def getReport(self) -> ValidationReport:
+        return self._report
+
+    # Returns the guid and coerced data of every row that can be imported, and the number of rows that
+    # can not be imported at all
+    def validateChunk(self, rows: List[List[str]], first_line_number: int) -> Tuple[List[Tuple[str, Dict[str, Any]]], int]:
+        # short rows are padded so every column has a value for every row, and are reported below
+        complete_rows = [row if len(row) >= 4 else ["", "", "", ""] for row in rows]
+
+        guids = [row[0].strip() for row in complete_rows]
+        valid_guids = list(map(GUID_PATTERN.fullmatch, guids))
+        (costs, cost_issues) = self._parseColumn([row[3] for row in complete_rows], INVALID_COST, NEGATIVE_COST, MAX_COST)
+        if self.cost_factor != 1.0:
+            costs = self.convertColumn(costs, self.cost_factor)
+        (weights, weight_issues) = self._parseColumn([row[2] for row in complete_rows], INVALID_WEIGHT, NEGATIVE_WEIGHT, MAX_WEIGHT)
+        known_guids = list(map(self._is_known_guid, guids)) if self._is_known_guid is not None else None
+
+        valid_rows = []  # type: List[Tuple[str, Dict[str, Any]]]
+        invalid_count = 0
+        for (index, row) in enumerate(rows):
+            line_number = first_line_number + index
+            if len(row) < 4:
+                self._addIssue(line_number, MISSING_COLUMNS, row)
+                invalid_count += 1
+                continue
+            if not valid_guids[index]:
+                guid = self._resolveName(line_number, row)
+                if guid is None:
+                    invalid_count += 1
+                    continue
+                guids[index] = guid
+                if known_guids is not None:
+                    known_guids[index] = True
+
+            data = {}  # type: Dict[str, Any]
+            cost = costs[index]
+            if cost is not None:
+                # an exchange rate can still make a cost too large to be stored as JSON
+                if math.isfinite(cost):
+                    data["spool_cost"] = cost
+                else:
+                    cost_issues[index] = INVALID_COST
+            weight = weights[index]
+            if weight is not None:
+                if weight == int(weight):
+                    data["spool_weight"] = int(weight)
+                else:
+                    weight_issues[index] = INVALID_WEIGHT
+
+            for issue in (cost_issues[index], weight_issues[index]):
+                if issue is not None:
+                    self._addIssue(line_number, issue, row)
+            if not data and (cost_issues[index] or weight_issues[index]):
+                invalid_count += 1
+                continue
+
+            if data and known_guids is not None and not known_guids[index]:
+                self._addIssue(line_number, UNKNOWN_GUID, row)
+            valid_rows.append((guids[index], data))
+
+        return (valid_rows, invalid_count)
+
+    # Converts a column of costs to another currency in one pass; converted costs are rounded to cents
+    @staticmethod
+    def convertColumn(costs: List[Optional[float]], factor: float) -> List[Optional[float]]:
+        return [None if cost is None else round(cost * factor, 2) for cost in costs]
+
+    # Rows from a price snapshot were validated when the snapshot was written; this only reports the
+    # materials that are not installed
+    def checkKnownGuids(self, rows: List[Tuple[str, Dict[str, Any]]], first_line_number: int) -> None:
+        if self._is_known_guid is None:
+            return
+        for (index, (guid, data)) in enumerate(rows):
+            if data and not self._is_known_guid(guid):
+                self._addIssue(first_line_number + index, UNKNOWN_GUID, [guid, "", str(data.get("spool_weight", "")), str(data.get("spool_cost", ""))])
+
+    # Parses a column of numbers; empty values are allowed and parsed as None
+    @staticmethod
+    def _parseColumn(values: List[str], invalid_code: str, negative_code: str, maximum: float) -> Tuple[List[Optional[float]], List[Optional[str]]]:
+        parsed = []  # type: List[Optional[float]]
+        issues = []  # type: List[Optional[str]]
+        number_match = NUMBER_PATTERN.fullmatch
+        decimal_comma_match = DECIMAL_COMMA_PATTERN.fullmatch
+        ambiguous_decimal_comma_match = AMBIGUOUS_DECIMAL_COMMA_PATTERN.fullmatch
+        for value in values:
+            match = number_match(value)
+            issue = None
+            if match:
+                number = float(value)  # type: Optional[float]
+            elif not value.strip():
+                number = None
+            else:
+                match = decimal_comma_match(value)
+                if match and ambiguous_decimal_comma_match(value):
+                    match = None
+                    number = None
+                    issue = AMBIGUOUS_DECIMAL_COMMA
+                elif match:
+                    number = float(value.replace(",", "."))
+                    issue = DECIMAL_COMMA
+                else:
+                    number = None
+                    issue = invalid_code
+            if match and match.group(1) == "-" and number:
+                number = None
+                issue = negative_code
+            elif number is not None and not number <= maximum:
+                # this includes numbers with a large exponent, which are parsed as infinity
+                number = None
+                issue = invalid_code
+            parsed.append(number)
+            issues.append(issue)
+        return (parsed, issues)
+
+    # Returns the GUID of the material the name in a row without a valid GUID describes, or None if the row
+    # can not be imported; this is only done for the rows that need it, so it is not done per column
+    def _resolveName(self, line_number: int, row: List[str]) -> Optional[str]:
+        text = row[1].strip() or row[0].strip()
+        if self.name_resolver is None or not text:
+            self._addIssue(line_number, MALFORMED_GUID, row)
+            return None
+
+        (guid, matches) = self.name_resolver(text)
+        if guid is not None:
+            self._addIssue(line_number, MATCHED_BY_NAME, row, "%s (%s)" % (matches[0][1], guid))
+        elif matches:
+            self._addIssue(line_number, AMBIGUOUS_NAME, row, "; ".join("%s (%s)" % (name, candidate) for (candidate, name, _) in matches))
+        else:
+            self._addIssue(line_number, UNMATCHED_NAME, row)
+        return guid
+
+    def _addIssue(self, line_number: int, code: str, row: List[str], details: str = "") -> None:
+        self._report.addIssue(line_number, code, row, details)
+        if self.issue_callback is not None:
+            self.issue_callback(line_number, code, row)
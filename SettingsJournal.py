@@ -0,0 +1,140 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import json
+import os
+import time
+
+from .AtomicFile import AtomicFile
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# The settings of a material before and after a change; None if the material had or has no settings
+Change = Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+# A journal of the changes that imports and clearing all weights and prices made to the material
+# settings, so they can be undone. Every entry is a line of JSON that only holds the settings of the
+# materials that changed, before and after the change, so an import that changes a few prices adds a
+# few hundred bytes however many materials there are. Entries are appended; the file is only rewritten
+# when entries are undone, or when the oldest entries are dropped because there are too many.
+class SettingsJournal:
+    MAX_ENTRIES = 100
+    # the oldest entries are dropped in batches, so the file is not rewritten for every new entry
+    COMPACT_MARGIN = 20
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._entries = None  # type: Optional[List[Dict[str, Any]]]
+        # set if the file ends with an incomplete entry, which a new entry must not be appended to
+        self._damaged = False
+
+    def getPath(self) -> str:
+        return self._path
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    # Returns the entries from old to new, without the changes
+    def getEntries(self) -> List[Dict[str, Any]]:
+        return [
+            {key: value for (key, value) in entry.items() if key != "changes"}
+            for entry in self._load()
+        ]
+
+    def getLastEntry(self) -> Optional[Dict[str, Any]]:
+        entries = self.getEntries()
+        return entries[-1] if entries else None
+
+    # Returns the materials whose settings differ, with their settings before and after
+    @staticmethod
+    def makeChanges(before: Dict[str, Optional[Dict[str, Any]]], after: Dict[str, Optional[Dict[str, Any]]]) -> Dict[str, Change]:
+        changes = {}  # type: Dict[str, Change]
+        for guid in set(before) | set(after):
+            before_settings = before.get(guid) or None
+            after_settings = after.get(guid) or None
+            if before_settings != after_settings:
+                changes[guid] = (before_settings, after_settings)
+        return changes
+
+    # Returns the id of the new entry, or None if nothing changed
+    def record(self, action: str, description: str, changes: Dict[str, Change], timestamp: Optional[float] = None) -> Optional[int]:
+        if not changes:
+            return None
+        entries = self._load()
+        entry = {
+            "id": entries[-1]["id"] + 1 if entries else 1,
+            "time": timestamp if timestamp is not None else time.time(),
+            "action": action,
+            "description": description,
+            "material_count": len(changes),
+            "changes": {guid: list(change) for (guid, change) in changes.items()}
+        }
+        entries.append(entry)
+
+        if len(entries) > self.MAX_ENTRIES + self.COMPACT_MARGIN:
+            del entries[:len(entries) - self.MAX_ENTRIES]
+            self._save()
+        elif self._damaged:
+            self._save()
+        else:
+            directory = os.path.dirname(os.path.abspath(self._path))
+            os.makedirs(directory, exist_ok = True)
+            with open(self._path, "a", encoding = "utf-8") as journal_file:
+                journal_file.write(json.dumps(entry, separators = (",", ":")) + "\n")
+        return entry["id"]
+
+    # Reverts the entry with the id and all newer entries, from new to old, and removes them from the
+    # journal. Materials whose settings were changed since (by hand, or by a change that is not in the
+    # journal) are left as they are.
+    # Returns the GUIDs of the materials whose settings were changed by reverting, and of the materials that
+    # were left as they are. When several entries are reverted, a material can be reverted by a newer entry
+    # and kept by an older one; it is then only returned as changed.
+    def revert(self, material_settings: Dict[str, Dict[str, Any]], entry_id: int) -> Tuple[List[str], List[str]]:
+        entries = self._load()
+        index = next((index for (index, entry) in enumerate(entries) if entry["id"] == entry_id), None)
+        if index is None:
+            raise KeyError(entry_id)
+
+        original_settings = {}  # type: Dict[str, Optional[Dict[str, Any]]]
+        kept = set()  # type: Set[str]
+        for entry in reversed(entries[index:]):
+            for (guid, (before, after)) in entry["changes"].items():
+                if (material_settings.get(guid) or None) != after:
+                    kept.add(guid)
+                    continue
+                original_settings.setdefault(guid, material_settings.get(guid))
+                if before is None:
+                    del material_settings[guid]
+                else:
+                    material_settings[guid] = before
+
+        changed = {guid for (guid, settings) in original_settings.items() if (material_settings.get(guid) or None) != (settings or None)}
+        del entries[index:]
+        self._save()
+        return (sorted(changed), sorted(kept - changed))
+
+    def _load(self) -> List[Dict[str, Any]]:
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = []
+        try:
+            with open(self._path, "r", encoding = "utf-8") as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # the end of an entry that was being written when Cura crashed
+                        self._damaged = True
+                        continue
+                    if isinstance(entry, dict) and "id" in entry and "changes" in entry:
+                        self._entries.append(entry)
+        except FileNotFoundError:
+            pass
+        return self._entries
+
+    def _save(self) -> None:
+        with AtomicFile(self._path, "w", encoding = "utf-8") as journal_file:
+            for entry in self._load():
+                journal_file.write(json.dumps(entry, separators = (",", ":")) + "\n")
+        self._damaged = False
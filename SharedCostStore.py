@@ -0,0 +1,156 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import sqlite3
+
+from typing import Any, Dict, Optional, Tuple
+
+# Weights and prices stored in an SQLite database that can be shared by several Cura instances.
+# Every write gets a new revision number, so readers only have to fetch the rows that changed
+# since they last synchronized instead of reloading all materials.
+# Rows that were replaced as a whole (by clearing or undoing changes) are marked as complete; an
+# empty field of a complete row means that the weight or price was removed, rather than never set.
+class SharedCostStore:
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS material_costs (
+            guid TEXT PRIMARY KEY NOT NULL,
+            spool_cost REAL,
+            spool_weight INTEGER,
+            revision INTEGER NOT NULL,
+            complete INTEGER NOT NULL DEFAULT 0
+        )""",
+        "CREATE INDEX IF NOT EXISTS material_costs_revision ON material_costs (revision)"
+    ]
+    # databases created by earlier versions lack these columns
+    COLUMNS = [
+        ("complete", "INTEGER NOT NULL DEFAULT 0")
+    ]
+    TIMEOUT = 10.0
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._connection = None  # type: Optional[sqlite3.Connection]
+        self._data_version = None  # type: Optional[int]
+
+    def getPath(self) -> str:
+        return self._path
+
+    def open(self) -> None:
+        if self._connection is not None:
+            return
+
+        # transactions are managed explicitly, so writers can lock the database before reading the revision
+        connection = sqlite3.connect(self._path, timeout = self.TIMEOUT, isolation_level = None)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            # the database is locked, so other instances do not add the same columns at the same time
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for statement in self.SCHEMA:
+                    connection.execute(statement)
+                columns = [row[1] for row in connection.execute("PRAGMA table_info(material_costs)")]
+                for (name, definition) in self.COLUMNS:
+                    if name not in columns:
+                        connection.execute("ALTER TABLE material_costs ADD COLUMN %s %s" % (name, definition))
+                connection.execute("COMMIT")
+            except:
+                connection.execute("ROLLBACK")
+                raise
+        except:
+            connection.close()
+            raise
+        self._connection = connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        self._data_version = None
+
+    # Returns True if another connection committed changes since the last time this was called.
+    # This is a cheap check that does not read any rows.
+    def hasChanged(self) -> bool:
+        data_version = self._getConnection().execute("PRAGMA data_version").fetchone()[0]
+        changed = data_version != self._data_version
+        self._data_version = data_version
+        return changed
+
+    # Returns the highest revision in the store, or 0 if the store is empty
+    def getRevision(self) -> int:
+        return self._getConnection().execute("SELECT COALESCE(MAX(revision), 0) FROM material_costs").fetchone()[0]
+
+    # Returns the highest revision in the store, and the weights and prices of all materials that
+    # changed after the specified revision. A weight or price that was removed is returned as None.
+    def getChangesSince(self, revision: int) -> Tuple[int, Dict[str, Dict[str, Any]]]:
+        material_settings = {}  # type: Dict[str, Dict[str, Any]]
+        latest_revision = revision
+        cursor = self._getConnection().execute(
+            "SELECT guid, spool_cost, spool_weight, revision, complete FROM material_costs WHERE revision > ? ORDER BY revision",
+            (revision, )
+        )
+        for (guid, spool_cost, spool_weight, row_revision, complete) in cursor:
+            data = {}  # type: Dict[str, Any]
+            if spool_cost is not None or complete:
+                data["spool_cost"] = spool_cost
+            if spool_weight is not None or complete:
+                data["spool_weight"] = spool_weight
+            material_settings[guid] = data
+            latest_revision = row_revision
+        return (latest_revision, material_settings)
+
+    # Inserts or updates the specified fields for a number of materials in a single transaction.
+    # Fields that are not specified for a material keep their stored value.
+    def upsertMany(self, material_settings: Dict[str, Dict[str, Any]]) -> None:
+        if not material_settings:
+            return
+
+        connection = self._getConnection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            revision = connection.execute("SELECT COALESCE(MAX(revision), 0) + 1 FROM material_costs").fetchone()[0]
+            for (guid, data) in material_settings.items():
+                spool_cost = data.get("spool_cost")
+                spool_weight = data.get("spool_weight")
+                cursor = connection.execute(
+                    "UPDATE material_costs SET spool_cost = COALESCE(?, spool_cost), spool_weight = COALESCE(?, spool_weight), revision = ? WHERE guid = ?",
+                    (spool_cost, spool_weight, revision, guid)
+                )
+                if cursor.rowcount == 0:
+                    connection.execute(
+                        "INSERT INTO material_costs (guid, spool_cost, spool_weight, revision) VALUES (?, ?, ?, ?)",
+                        (guid, spool_cost, spool_weight, revision)
+                    )
+            connection.execute("COMMIT")
+        except:
+            connection.execute("ROLLBACK")
+            raise
+
+    def upsert(self, guid: str, data: Dict[str, Any]) -> None:
+        self.upsertMany({guid: data})
+
+    # Replaces the weight and price of a number of materials in a single transaction. Fields that are
+    # not specified for a material are removed; None removes both the weight and the price.
+    def replaceMany(self, material_settings: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        if not material_settings:
+            return
+
+        connection = self._getConnection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            revision = connection.execute("SELECT COALESCE(MAX(revision), 0) + 1 FROM material_costs").fetchone()[0]
+            for (guid, data) in material_settings.items():
+                spool_cost = data.get("spool_cost") if data else None
+                spool_weight = data.get("spool_weight") if data else None
+                connection.execute(
+                    "INSERT OR REPLACE INTO material_costs (guid, spool_cost, spool_weight, revision, complete) VALUES (?, ?, ?, ?, 1)",
+                    (guid, spool_cost, spool_weight, revision)
+                )
+            connection.execute("COMMIT")
+        except:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _getConnection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.open()
+        return self._connection  # type: ignore
@@ -0,0 +1,61 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+from typing import Iterator, List, Optional, Tuple
+
+# Records how long the stages of an import or export take, and how many rows each stage handled,
+# so the cause of a slow run can be found. Stages can be timed both on the main thread and in a job.
+class StageTimer:
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._started = time.time()
+        self._stages = []  # type: List[Tuple[str, float, Optional[int]]]
+        self._lock = Lock()
+
+    def getName(self) -> str:
+        return self._name
+
+    # Returns the name, duration in seconds and row count of every stage, in the order they finished
+    def getStages(self) -> List[Tuple[str, float, Optional[int]]]:
+        with self._lock:
+            return list(self._stages)
+
+    def getTotal(self) -> float:
+        return sum(duration for (_, duration, _) in self.getStages())
+
+    @contextmanager
+    def span(self, stage: str, count: Optional[int] = None) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.addStage(stage, time.perf_counter() - start_time, count)
+
+    def addStage(self, stage: str, duration: float, count: Optional[int] = None) -> None:
+        with self._lock:
+            self._stages.append((stage, duration, count))
+
+    # Sets the row count of the last stage with this name, for counts that are only known afterwards
+    def setCount(self, stage: str, count: int) -> None:
+        with self._lock:
+            for index in range(len(self._stages) - 1, -1, -1):
+                if self._stages[index][0] == stage:
+                    self._stages[index] = (stage, self._stages[index][1], count)
+                    return
+
+    def formatLines(self) -> List[str]:
+        lines = []
+        for (stage, duration, count) in self.getStages():
+            line = "%s: %.1f ms" % (stage, duration * 1000)
+            if count is not None:
+                line += " (%d rows)" % count
+            lines.append(line)
+        lines.append("total: %.1f ms" % (self.getTotal() * 1000))
+        return lines
+
+    def format(self) -> str:
+        return "%s, %s\n%s" % (self._name, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self._started)), "\n".join(self.formatLines()))
@@ -0,0 +1,241 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import hashlib
+import json
+import os
+
+from .AtomicFile import AtomicFile
+from .CurrencyRates import CurrencyRates
+from .ImportChangeSet import ImportChangeSet
+from .ImportPipeline import ImportPipeline
+from .PriceSnapshot import PriceSnapshot
+from .RowValidator import ValidationReport
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Imports the price lists that are dropped into or updated in a folder. An index stores the
+# modification time, size, content hash and a hash per row of every file in the folder, so a poll
+# only reads the files whose time or size changed, only parses the files whose content changed, and
+# only imports the rows that changed since the file was last imported. Rows that did not change are
+# not imported again, so a price that was edited in Cura is not overwritten by an unchanged file.
+# A file that could not be imported is tried again when it changes, or when the currency settings
+# changed since, since those decide whether its prices can be converted.
+class WatchFolder:
+    INDEX_VERSION = 1
+    FILE_EXTENSIONS = (".csv", "." + PriceSnapshot.FILE_EXTENSION)
+    READ_BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, directory: str, index_path: str) -> None:
+        self._directory = os.path.abspath(directory)
+        self._index_path = index_path
+
+        self._index = None  # type: Optional[Dict[str, Dict[str, Any]]]
+        self._pending_index = None  # type: Optional[Dict[str, Dict[str, Any]]]
+        self._results = []  # type: List[Dict[str, Any]]
+        self._errors = {}  # type: Dict[str, str]
+
+        # when set, costs in another currency than the target currency are converted with these rates
+        self.currency_rates = None  # type: Optional[CurrencyRates]
+        self.target_currency = None  # type: Optional[str]
+        # when set, rows without a valid GUID are looked up by name; see RowValidator.name_resolver
+        self.name_resolver = None  # type: Optional[Callable[[str], Tuple[Optional[str], List[Tuple[str, str, float]]]]]
+
+        # called before reading every next file; returning False stops the import
+        self.continue_callback = None  # type: Optional[Callable[[], bool]]
+
+    def getDirectory(self) -> str:
+        return self._directory
+
+    def getIndexPath(self) -> str:
+        return self._index_path
+
+    # The imported files, with the number of rows in the file and the number of changed rows
+    def getResults(self) -> List[Dict[str, Any]]:
+        return self._results
+
+    def getErrors(self) -> Dict[str, str]:
+        return self._errors
+
+    # Returns the issues found in the parsed files
+    def getReport(self) -> ValidationReport:
+        report = ValidationReport()
+        for result in self._results:
+            report.extend(result["report"])
+        return report
+
+    # Returns whether there are files that could not be imported
+    def hasRejectedFiles(self) -> bool:
+        return any("error" in entry for entry in self._getIndex().values())
+
+    # Returns the files that were added, modified or removed since they were last imported, judging by
+    # their modification time and size only. This is cheap enough to do on every poll.
+    def getChangedFiles(self) -> List[str]:
+        index = self._getIndex()
+        files = self._listFiles()
+        changed = [
+            file_name for (file_name, (modified, size)) in files.items()
+            if file_name not in index or index[file_name]["modified"] != modified or index[file_name]["size"] != size or self._shouldRetry(index[file_name])
+        ]
+        changed.extend(file_name for file_name in index if file_name not in files)
+        return sorted(changed)
+
+    # Adds the rows that changed since the files were last imported to the change set. The index is
+    # only updated by commit(), once the changes have been stored.
+    # Files are read from oldest to newest, so the most recently modified file wins.
+    # Returns False if the import was stopped by the continue callback
+    def collectChanges(self, change_set: ImportChangeSet, is_known_guid: Optional[Callable[[str], bool]] = None) -> bool:
+        index = self._getIndex()
+        files = self._listFiles()
+        pending_index = {file_name: entry for (file_name, entry) in index.items() if file_name in files}
+        self._results = []
+        self._errors = {}
+
+        for (file_name, (modified, size)) in sorted(files.items(), key = lambda item: item[1][0]):
+            entry = index.get(file_name)
+            if entry is not None and entry["modified"] == modified and entry["size"] == size and not self._shouldRetry(entry):
+                continue
+            if self.continue_callback is not None and not self.continue_callback():
+                return False
+
+            path = os.path.join(self._directory, file_name)
+            try:
+                content_hash = self._hashFile(path)
+            except EnvironmentError as e:
+                # eg a file that is still being copied on Windows; it is read again on the next poll
+                self._errors[file_name] = str(e)
+                pending_index.pop(file_name, None)
+                continue
+            if entry is not None and entry["hash"] == content_hash and not self._shouldRetry(entry):
+                # touched, but not changed
+                pending_index[file_name] = dict(entry, modified = modified, size = size)
+                continue
+
+            previous_rows = entry["rows"] if entry is not None else {}  # type: Dict[str, str]
+            try:
+                result = self._importFile(path, previous_rows, change_set, is_known_guid)
+            except Exception as e:
+                # keep the row hashes, so only the rows that changed are imported once the file is fixed
+                self._errors[file_name] = str(e)
+                pending_index[file_name] = {
+                    "modified": modified, "size": size, "hash": content_hash, "rows": previous_rows,
+                    "error": str(e), "currency_settings": self._getCurrencySettings()
+                }
+                continue
+
+            self._results.append(result)
+            pending_index[file_name] = {"modified": modified, "size": size, "hash": content_hash, "rows": result["rows"]}
+
+        self._pending_index = pending_index
+        return True
+
+    # Stores the index of the files that were imported by collectChanges()
+    def commit(self) -> None:
+        if self._pending_index is None:
+            return
+        self._index = self._pending_index
+        self._pending_index = None
+        self._saveIndex()
+
+    # Forgets which files were imported, so all files are imported again on the next poll
+    def reset(self) -> None:
+        self._index = {}
+        self._pending_index = None
+        if os.path.exists(self._index_path):
+            os.remove(self._index_path)
+
+    def _importFile(self, path: str, previous_rows: Dict[str, str], change_set: ImportChangeSet, is_known_guid: Optional[Callable[[str], bool]]) -> Dict[str, Any]:
+        file_change_set = ImportChangeSet({})
+        pipeline = ImportPipeline(file_change_set, is_known_guid, ValidationReport(os.path.basename(path)))
+        pipeline.currency_rates = self.currency_rates
+        pipeline.target_currency = self.target_currency
+        pipeline.name_resolver = self.name_resolver
+        pipeline.runFile(path)
+        currency = pipeline.getCurrency()
+        if currency is not None and self.target_currency is not None and CurrencyRates.normalizeCurrency(currency) != CurrencyRates.normalizeCurrency(self.target_currency):
+            # there is nobody to ask whether to import these prices as is
+            raise ValueError("Prices are specified in %s instead of %s" % (currency, self.target_currency))
+
+        for _ in range(file_change_set.getInvalidCount()):
+            change_set.addInvalidRow()
+
+        rows = {}  # type: Dict[str, str]
+        changed_count = 0
+        for (guid, data) in file_change_set.getAdded().items():
+            row_hash = self._hashRow(data)
+            rows[guid] = row_hash
+            if previous_rows.get(guid) != row_hash:
+                change_set.addRow(guid, data)
+                changed_count += 1
+
+        return {
+            "file": path,
+            "currency": currency,
+            "conversion": pipeline.getConversion(),
+            "row_count": len(rows),
+            "changed_count": changed_count,
+            "report": pipeline.getReport(),
+            "rows": rows
+        }
+
+    # Returns whether a file that could not be imported should be tried again, although it did not change
+    def _shouldRetry(self, entry: Dict[str, Any]) -> bool:
+        return "error" in entry and entry.get("currency_settings") != self._getCurrencySettings()
+
+    # The settings that decide whether the prices of a file can be imported, as stored in the index
+    def _getCurrencySettings(self) -> List[Any]:
+        return [
+            CurrencyRates.normalizeCurrency(self.target_currency) if self.target_currency is not None else None,
+            self.currency_rates.getCurrencies() if self.currency_rates is not None else None
+        ]
+
+    def _listFiles(self) -> Dict[str, Any]:
+        files = {}
+        try:
+            entries = list(os.scandir(self._directory))
+        except EnvironmentError:
+            return files
+        for entry in entries:
+            if not entry.name.lower().endswith(self.FILE_EXTENSIONS) or entry.name.startswith("."):
+                continue
+            try:
+                stat = entry.stat()
+            except EnvironmentError:
+                continue
+            if entry.is_file():
+                files[entry.name] = (stat.st_mtime, stat.st_size)
+        return files
+
+    def _hashFile(self, path: str) -> str:
+        content_hash = hashlib.sha1()
+        with open(path, "rb") as watched_file:
+            for block in iter(lambda: watched_file.read(self.READ_BLOCK_SIZE), b""):
+                content_hash.update(block)
+        return content_hash.hexdigest()
+
+    @staticmethod
+    def _hashRow(data: Dict[str, Any]) -> str:
+        # the hashes are stored, so the builtin hash() can not be used; 64 bits is plenty per material
+        return hashlib.sha1(json.dumps(data, sort_keys = True).encode("utf-8")).hexdigest()[:16]
+
+    def _getIndex(self) -> Dict[str, Dict[str, Any]]:
+        if self._index is None:
+            self._index = self._loadIndex()
+        return self._index
+
+    def _loadIndex(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self._index_path, "r", encoding = "utf-8") as index_file:
+                data = json.load(index_file)
+        except (EnvironmentError, ValueError):
+            return {}
+        # an index of another folder is of no use
+        if not isinstance(data, dict) or data.get("version") != self.INDEX_VERSION or data.get("directory") != self._directory:
+            return {}
+        return data.get("files", {})
+
+    def _saveIndex(self) -> None:
+        data = {"version": self.INDEX_VERSION, "directory": self._directory, "files": self._index}
+        # write to a temporary file first, so an interrupted write does not lose the index
+        with AtomicFile(self._index_path, "w", encoding = "utf-8") as index_file:
+            json.dump(data, index_file, separators = (",", ":"))
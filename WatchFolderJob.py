@@ -0,0 +1,96 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import json
+
+from UM.Job import Job
+from UM.Logger import Logger
+
+from .ImportChangeSet import ImportChangeSet
+from .StageTimer import StageTimer
+from .WatchFolder import WatchFolder
+
+from typing import Any, Callable, Dict, Optional
+
+# Collects the rows that changed in the files of the watch folder, and applies them to the material
+# settings. The index of the watch folder is left to be committed once the settings are saved.
+class WatchFolderJob(Job):
+    def __init__(self, watch_folder: WatchFolder, material_settings: str, is_known_guid: Optional[Callable[[str], bool]] = None, stage_timer: Optional[StageTimer] = None) -> None:
+        super().__init__()
+
+        self._watch_folder = watch_folder
+        self._material_settings = material_settings
+        self._is_known_guid = is_known_guid
+        self._stage_timer = stage_timer if stage_timer is not None else StageTimer("Watch folder import")
+
+        self._cancelled = False
+        self._change_set = None  # type: Optional[ImportChangeSet]
+        self._serialized_settings = None  # type: Optional[str]
+        self._previous_settings = {}  # type: Dict[str, Optional[Dict[str, Any]]]
+        self._applied_settings = {}  # type: Dict[str, Dict[str, Any]]
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        super().cancel()
+
+    def isCancelled(self) -> bool:
+        return self._cancelled
+
+    def getWatchFolder(self) -> WatchFolder:
+        return self._watch_folder
+
+    def getChangeSet(self) -> Optional[ImportChangeSet]:
+        return self._change_set
+
+    # The serialized material settings the job started from
+    def getMaterialSettings(self) -> str:
+        return self._material_settings
+
+    def getSerializedSettings(self) -> Optional[str]:
+        return self._serialized_settings
+
+    # The settings of the added and changed materials before the import, for the journal
+    def getPreviousSettings(self) -> Dict[str, Optional[Dict[str, Any]]]:
+        return self._previous_settings
+
+    def getAppliedSettings(self) -> Dict[str, Dict[str, Any]]:
+        return self._applied_settings
+
+    def getStageTimer(self) -> StageTimer:
+        return self._stage_timer
+
+    def run(self) -> None:
+        stage_timer = self._stage_timer
+        try:
+            with stage_timer.span("json decode"):
+                material_settings = json.loads(self._material_settings)
+        except Exception as e:
+            Logger.logException("e", "Could not load material settings from preferences")
+            self.setError(e)
+            return
+        stage_timer.setCount("json decode", len(material_settings))
+
+        change_set = ImportChangeSet(material_settings)
+        self._watch_folder.continue_callback = lambda: not self._cancelled
+        try:
+            with stage_timer.span("read changed files"):
+                completed = self._watch_folder.collectChanges(change_set, self._is_known_guid)
+        except Exception as e:
+            Logger.logException("e", "Could not import settings from the watch folder")
+            self.setError(e)
+            return
+        stage_timer.setCount("read changed files", sum(result["row_count"] for result in self._watch_folder.getResults()))
+        if not completed or self._cancelled:
+            return
+
+        for (file_name, error) in self._watch_folder.getErrors().items():
+            Logger.log("w", "Could not import settings from %s: %s", file_name, error)
+
+        self._change_set = change_set
+        if not change_set.isEmpty():
+            with stage_timer.span("apply changes", change_set.getAddedCount() + change_set.getChangedCount()):
+                self._previous_settings = change_set.getPreviousSettings(material_settings)
+                change_set.applyTo(material_settings)
+                self._applied_settings = change_set.getAppliedSettings(material_settings)
+            with stage_timer.span("json encode", len(material_settings)):
+                self._serialized_settings = json.dumps(material_settings)
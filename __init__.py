@@ -1,10 +1,11 @@
 # Copyright (c) 2022 Aldo Hoeben / fieldOfView
 # MaterialCostTools is released under the terms of the AGPLv3 or higher.
 
-from . import MaterialCostTools
-
 def getMetaData():
     return {}
 
 def register(app):
+    # imported here so the package can also be used without Cura, see __main__.py
+    # the extension itself imports the rest of the plugin only when a menu item is used
+    from . import MaterialCostTools
     return {"extension": MaterialCostTools.MaterialCostTools()}
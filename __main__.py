@@ -0,0 +1,368 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+# Command line interface to import and export weights and prices without running Cura, eg:
+#   python -m MaterialCostTools export --preferences cura.cfg --materials-dir materials --output prices.csv
+#   python -m MaterialCostTools import --preferences cura.cfg --input prices.csv
+#   python -m MaterialCostTools cost-gcode --preferences cura.cfg --materials-dir materials *.gcode
+#   python -m MaterialCostTools watch --preferences cura.cfg --folder prices --index prices-index.json
+#   python -m MaterialCostTools sync --preferences cura.cfg --feed https://example.com/prices.csv --state feeds.json --cache-dir feeds
+
+import argparse
+import json
+import os
+import sys
+import time
+try:
+    import csv
+except ImportError:
+    # older versions of Cura somehow ship with a python version that does not include
+    # this file, so a local copy is supplied as a fallback
+    from . import csv  # type: ignore
+
+from .AtomicFile import AtomicFile
+from .CurrencyRates import CurrencyRates
+from .ExportWriter import ExportWriter
+from .GcodeCostEstimator import GcodeCostEstimator
+from .ImportChangeSet import ImportChangeSet
+from .ImportPipeline import ImportPipeline
+from .MaterialCatalog import MaterialCatalog
+from .MaterialDirectory import MaterialDirectory
+from .MultiFileImport import MultiFileImport, CONFLICT_POLICIES, LAST_FILE_WINS
+from .PreferencesFile import PreferencesFile
+from .PriceFeeds import PriceFeeds
+from .PriceHistory import PriceHistory
+from .PriceSnapshot import PriceSnapshot
+from .RowValidator import ValidationReport, ISSUE_MESSAGES, MATCHED_BY_NAME
+from .WatchFolder import WatchFolder
+
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CURRENCY = "€"
+
+
+def loadPreferences(path: str) -> PreferencesFile:
+    preferences = PreferencesFile(path)
+    preferences.load()
+    return preferences
+
+def loadMaterialSettings(preferences: PreferencesFile) -> Dict[str, Dict[str, Any]]:
+    return json.loads(preferences.getValue("cura/material_settings", "{}") or "{}")
+
+def loadCatalog(materials_dirs: List[str]) -> MaterialCatalog:
+    material_catalog = MaterialCatalog()
+    for materials_dir in materials_dirs:
+        for metadata in MaterialDirectory(materials_dir).getMaterialsMetadata():
+            material_catalog.addMaterial(metadata)
+    return material_catalog
+
+
+def exportCommand(args: argparse.Namespace) -> int:
+    preferences = loadPreferences(args.preferences)
+    material_settings = loadMaterialSettings(preferences)
+    material_catalog = loadCatalog(args.materials_dir)
+
+    if args.scope == "favorites":
+        favorite_ids = set((preferences.getValue("cura/favorite_materials", "") or "").split(";"))
+        materials_metadata = material_catalog.getByBaseFiles(favorite_ids)
+    elif args.scope == "configured":
+        materials_metadata = material_catalog.getByGuids(material_settings.keys())
+    else:
+        materials_metadata = material_catalog.getAll()
+
+    currency = preferences.getValue("cura/currency", DEFAULT_CURRENCY) or DEFAULT_CURRENCY
+    writer = ExportWriter(currency)
+    writer.unit_costs = args.unit_costs
+    rows = writer.iterRows(ExportWriter.sortMaterials(materials_metadata), material_settings)
+    if args.output.lower().endswith("." + PriceSnapshot.FILE_EXTENSION):
+        with AtomicFile(args.output, "wb") as snapshot_file:
+            exported_count = PriceSnapshot.write(snapshot_file, ExportWriter.getRowSettings(rows), currency, skipped_rows = writer.getSkippedRows()) or 0
+    else:
+        with AtomicFile(args.output, "w", newline = "") as csv_file:
+            writer.write(csv_file, rows)
+        exported_count = writer.getExportedCount()
+
+    print("Exported data for %d materials to %s" % (exported_count, args.output))
+    for (guid, reason) in writer.getSkippedRows():
+        print("Skipped material %s: %s" % (guid, reason), file = sys.stderr)
+    return 0
+
+def importCommand(args: argparse.Namespace) -> int:
+    preferences = loadPreferences(args.preferences)
+    material_settings = loadMaterialSettings(preferences)
+    material_catalog = loadCatalog(args.materials_dir) if args.materials_dir else None
+
+    is_known_guid = material_catalog.hasGuid if material_catalog is not None else None
+
+    configured_currency = preferences.getValue("cura/currency", DEFAULT_CURRENCY) or DEFAULT_CURRENCY
+    currency_rates = None  # type: Optional[CurrencyRates]
+    if args.currency_rates:
+        currency_rates = CurrencyRates.load(args.currency_rates)
+        if currency_rates.isStale(args.max_rate_age):
+            print("Warning: the exchange rates are %d days old" % currency_rates.getAge(), file = sys.stderr)
+
+    change_set = ImportChangeSet(material_settings)
+    unknown_count = 0
+    reference_input = getattr(args, "reference_input", [])
+    if len(args.input) == 1 and not reference_input:
+        pipeline = ImportPipeline(change_set, is_known_guid, ValidationReport(os.path.basename(args.input[0])))
+        pipeline.currency_rates = currency_rates
+        pipeline.target_currency = configured_currency
+        pipeline.name_resolver = material_catalog.matchName if material_catalog is not None else None
+        if args.verbose:
+            pipeline.issue_callback = lambda line_number, code, row: print("Line %d: %s: %s" % (line_number, ISSUE_MESSAGES[code], row), file = sys.stderr)
+        pipeline.runFile(args.input[0])
+        currencies = set([pipeline.getCurrency()]) if pipeline.getCurrency() is not None else set()
+        unknown_count = pipeline.getUnknownCount()
+        conversions = [pipeline.getConversion()] if pipeline.getConversion() is not None else []
+        report = pipeline.getReport()
+    else:
+        multi_file_import = MultiFileImport(args.input, args.conflict_policy)
+        multi_file_import.currency_rates = currency_rates
+        multi_file_import.target_currency = configured_currency
+        multi_file_import.name_resolver = material_catalog.matchName if material_catalog is not None else None
+        multi_file_import.reference_file_names = reference_input
+        if args.processes and material_catalog is not None:
+            print("Rows without a GUID are not matched by name when parsing in separate processes", file = sys.stderr)
+        multi_file_import.parse(use_processes = args.processes)
+        for (file_name, error) in multi_file_import.getErrors().items():
+            print("Could not import %s: %s" % (file_name, error), file = sys.stderr)
+        for _ in range(multi_file_import.getInvalidCount()):
+            change_set.addInvalidRow()
+        for (guid, data) in multi_file_import.merge().items():
+            change_set.addRow(guid, data)
+            if is_known_guid is not None and not is_known_guid(guid):
+                unknown_count += 1
+        currencies = set(multi_file_import.getCurrencies().values())
+        report = multi_file_import.getReport()
+        conversions = list(multi_file_import.getConversions().values())
+
+        conflicts = multi_file_import.getConflicts()
+        if conflicts:
+            print("Conflicting materials: %d" % len(conflicts))
+            for conflict in conflicts:
+                metadata = material_catalog.getByGuid(conflict["guid"]) if material_catalog is not None else None
+                name = "%s %s" % (metadata.get("brand", ""), metadata.get("name", "")) if metadata else ""
+                print("  " + MultiFileImport.formatConflict(conflict, name))
+
+    print("New materials: %d\nChanged materials: %d\nUnchanged materials: %d\nInvalid rows: %d" % (
+        change_set.getAddedCount(), change_set.getChangedCount(), change_set.getUnchangedCount(), change_set.getInvalidCount()
+    ))
+    if unknown_count:
+        print("Rows for materials that are not installed: %d" % unknown_count)
+    if not report.isEmpty():
+        print("Rows with problems: %d errors, %d warnings" % (report.getErrorCount(), sum(report.getCounts().values()) - report.getErrorCount()))
+        if report.getCount(MATCHED_BY_NAME):
+            print("Rows without a GUID matched to a material by name: %d" % report.getCount(MATCHED_BY_NAME))
+        if args.errors_report:
+            with open(args.errors_report, "w", newline = "") as csv_file:
+                report.writeCsv(csv_file)
+
+    for (from_currency, rate) in sorted(set(conversions)):
+        print("Prices converted from %s at a rate of %.4f %s" % (from_currency, rate, configured_currency))
+
+    other_currencies = sorted(currencies - {configured_currency})
+    if other_currencies and not args.accept_currency:
+        print("The file contains prices specified in %s, but the preferences are configured to use %s. Use --accept-currency to import these prices as is." % (
+            ", ".join(other_currencies), configured_currency
+        ), file = sys.stderr)
+        return 1
+
+    if args.dry_run or change_set.isEmpty():
+        return 0
+
+    change_set.applyTo(material_settings)
+    preferences.setValue("cura/material_settings", json.dumps(material_settings))
+    preferences.save()
+
+    if args.history:
+        PriceHistory(args.history).append(change_set.getAppliedSettings(material_settings))
+    return 0
+
+def watchCommand(args: argparse.Namespace) -> int:
+    material_catalog = loadCatalog(args.materials_dir) if args.materials_dir else None
+    watch_folder = WatchFolder(args.folder, args.index)
+
+    def setCurrency(preferences: PreferencesFile) -> None:
+        watch_folder.currency_rates = CurrencyRates.load(args.currency_rates) if args.currency_rates else None
+        watch_folder.target_currency = preferences.getValue("cura/currency", DEFAULT_CURRENCY) or DEFAULT_CURRENCY
+
+    while True:
+        if watch_folder.hasRejectedFiles():
+            # files that could not be imported are tried again when the currency settings change
+            setCurrency(loadPreferences(args.preferences))
+        if watch_folder.getChangedFiles():
+            # the preferences are read again on every poll, since Cura may have changed them
+            preferences = loadPreferences(args.preferences)
+            material_settings = loadMaterialSettings(preferences)
+            setCurrency(preferences)
+            watch_folder.name_resolver = material_catalog.matchName if material_catalog is not None else None
+
+            change_set = ImportChangeSet(material_settings)
+            watch_folder.collectChanges(change_set, material_catalog.hasGuid if material_catalog is not None else None)
+            for result in watch_folder.getResults():
+                print("%s: %d rows, %d changed" % (os.path.basename(result["file"]), result["row_count"], result["changed_count"]))
+            for (file_name, error) in watch_folder.getErrors().items():
+                print("Could not import %s: %s" % (file_name, error), file = sys.stderr)
+
+            if not change_set.isEmpty():
+                change_set.applyTo(material_settings)
+                preferences.setValue("cura/material_settings", json.dumps(material_settings))
+                preferences.save()
+                if args.history:
+                    PriceHistory(args.history).append(change_set.getAppliedSettings(material_settings))
+                print("New materials: %d\nChanged materials: %d" % (change_set.getAddedCount(), change_set.getChangedCount()))
+            watch_folder.commit()
+
+        if not args.interval:
+            return 0
+        time.sleep(args.interval)
+
+def syncCommand(args: argparse.Namespace) -> int:
+    price_feeds = PriceFeeds(args.feed, args.cache_dir, args.state)
+    file_names = price_feeds.fetch(max_workers = args.workers)
+    for result in price_feeds.getResults():
+        print("%s: %s (%d bytes)" % (result["url"], result["status"], result["size"]))
+    errors = price_feeds.getErrors()
+    for (url, error) in errors.items():
+        print("Could not download %s: %s" % (url, error), file = sys.stderr)
+
+    result = 0
+    if file_names:
+        # the downloaded price lists are imported like any other files
+        args.input = file_names
+        if args.conflict_policy != LAST_FILE_WINS:
+            # a feed that did not change can still win a conflict with a feed that did
+            args.reference_input = price_feeds.getUnchangedFileNames()
+        result = importCommand(args)
+    if result == 0 and not args.dry_run:
+        price_feeds.commit()
+    return 1 if errors else result
+
+def historyCommand(args: argparse.Namespace) -> int:
+    history = PriceHistory(args.history)
+    material_catalog = loadCatalog(args.materials_dir) if args.materials_dir else None
+    names = {}  # type: Dict[str, str]
+    if material_catalog is not None:
+        names = {m["GUID"]: "%s %s" % (m.get("brand", ""), m.get("name", "")) for m in material_catalog.getAll()}
+
+    output_file = open(args.output, "w", newline = "") if args.output else sys.stdout
+    try:
+        if args.as_of:
+            # weights and prices as they were at the specified date, in a format that can be imported again
+            timestamp = time.mktime(time.strptime(args.as_of, "%Y-%m-%d")) + 24 * 60 * 60 - 1
+            material_settings = history.getSettingsAt(timestamp)
+            csv_writer = csv.writer(output_file)
+            csv_writer.writerow(["guid", "name", "weight (g)", "cost (%s)" % args.currency])
+            for (guid, data) in material_settings.items():
+                if args.guid and guid not in args.guid:
+                    continue
+                csv_writer.writerow([guid, names.get(guid, ""), data.get("spool_weight", ""), data.get("spool_cost", "")])
+        else:
+            history.writeCsv(output_file, guids = args.guid, names = names)
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+    return 0
+
+def costGcodeCommand(args: argparse.Namespace) -> int:
+    preferences = loadPreferences(args.preferences)
+    material_settings = loadMaterialSettings(preferences)
+    material_catalog = loadCatalog(args.materials_dir)
+
+    estimator = GcodeCostEstimator(material_settings, material_catalog.getByGuid)
+    estimator.default_material_guid = args.default_material
+    results = estimator.estimateFiles(args.files, max_workers = args.workers)
+
+    currency = preferences.getValue("cura/currency", DEFAULT_CURRENCY) or DEFAULT_CURRENCY
+    if args.output:
+        with AtomicFile(args.output, "w", newline = "") as csv_file:
+            GcodeCostEstimator.writeReport(csv_file, results, currency)
+    else:
+        GcodeCostEstimator.writeReport(sys.stdout, results, currency)
+
+    return 1 if any(result["error"] for result in results) else 0
+
+
+def createParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog = "MaterialCostTools", description = "Import and export material weights and prices in Cura preferences files")
+    subparsers = parser.add_subparsers(dest = "command")
+    subparsers.required = True
+
+    export_parser = subparsers.add_parser("export", help = "Export weights and prices to a CSV file")
+    export_parser.add_argument("--preferences", required = True, help = "Cura preferences file (cura.cfg)")
+    export_parser.add_argument("--materials-dir", action = "append", required = True, help = "Directory with .xml.fdm_material files; can be specified more than once")
+    export_parser.add_argument("--scope", choices = ["all", "favorites", "configured"], default = "all")
+    export_parser.add_argument("--output", required = True, help = "CSV file to write, or price snapshot if the name ends with .mctsnap")
+    export_parser.add_argument("--unit-costs", action = "store_true", help = "Add the cost per gram, per kilogram and per meter of filament to the CSV file")
+    export_parser.set_defaults(function = exportCommand)
+
+    import_parser = subparsers.add_parser("import", help = "Import weights and prices from a CSV file")
+    import_parser.add_argument("--preferences", required = True, help = "Cura preferences file (cura.cfg)")
+    import_parser.add_argument("--materials-dir", action = "append", help = "Directory with .xml.fdm_material files, used to report materials that are not installed and to find materials by name for rows without a GUID")
+    import_parser.add_argument("--input", action = "append", required = True, help = "CSV file or price snapshot to read; can be specified more than once")
+    import_parser.add_argument("--conflict-policy", choices = CONFLICT_POLICIES, default = LAST_FILE_WINS, help = "Which file wins when a material is listed in more than one file")
+    import_parser.add_argument("--processes", action = "store_true", help = "Parse multiple files in separate processes instead of threads")
+    import_parser.add_argument("--dry-run", action = "store_true", help = "Report the changes without writing the preferences file")
+    import_parser.add_argument("--currency-rates", help = "JSON file with exchange rates, used to convert prices in another currency than the configured currency")
+    import_parser.add_argument("--max-rate-age", type = float, default = 30, help = "Warn if the exchange rates are older than this number of days")
+    import_parser.add_argument("--accept-currency", action = "store_true", help = "Import prices that are specified in a different currency as is")
+    import_parser.add_argument("--verbose", action = "store_true", help = "Report rows that can not be imported")
+    import_parser.add_argument("--errors-report", help = "Write the rows that can not be imported (in full) to this CSV file")
+    import_parser.add_argument("--history", help = "Price history file to record the imported changes in")
+    import_parser.set_defaults(function = importCommand)
+
+    watch_parser = subparsers.add_parser("watch", help = "Import the rows that changed in the price lists in a folder since the last run")
+    watch_parser.add_argument("--preferences", required = True, help = "Cura preferences file (cura.cfg)")
+    watch_parser.add_argument("--folder", required = True, help = "Folder with CSV files and price snapshots")
+    watch_parser.add_argument("--index", required = True, help = "File to keep the state of the imported files in")
+    watch_parser.add_argument("--materials-dir", action = "append", help = "Directory with .xml.fdm_material files, used to report materials that are not installed")
+    watch_parser.add_argument("--currency-rates", help = "JSON file with exchange rates, used to convert prices in another currency than the configured currency")
+    watch_parser.add_argument("--history", help = "Price history file to record the imported changes in")
+    watch_parser.add_argument("--interval", type = float, help = "Keep watching the folder, checking it every this many seconds")
+    watch_parser.set_defaults(function = watchCommand)
+
+    sync_parser = subparsers.add_parser("sync", help = "Download price lists from URLs and import the ones that changed since the last sync")
+    sync_parser.add_argument("--preferences", required = True, help = "Cura preferences file (cura.cfg)")
+    sync_parser.add_argument("--feed", action = "append", required = True, help = "URL of a CSV file or price snapshot to download; can be specified more than once")
+    sync_parser.add_argument("--state", required = True, help = "File to keep the ETag and Last-Modified headers of the downloaded price lists in")
+    sync_parser.add_argument("--cache-dir", required = True, help = "Folder to download the price lists to")
+    sync_parser.add_argument("--workers", type = int, help = "Number of price lists to download concurrently")
+    sync_parser.add_argument("--materials-dir", action = "append", help = "Directory with .xml.fdm_material files, used to report materials that are not installed and to find materials by name for rows without a GUID")
+    sync_parser.add_argument("--conflict-policy", choices = CONFLICT_POLICIES, default = LAST_FILE_WINS, help = "Which price list wins when a material is listed in more than one")
+    sync_parser.add_argument("--processes", action = "store_true", help = "Parse multiple files in separate processes instead of threads")
+    sync_parser.add_argument("--dry-run", action = "store_true", help = "Report the changes without writing the preferences file or the state file")
+    sync_parser.add_argument("--currency-rates", help = "JSON file with exchange rates, used to convert prices in another currency than the configured currency")
+    sync_parser.add_argument("--max-rate-age", type = float, default = 30, help = "Warn if the exchange rates are older than this number of days")
+    sync_parser.add_argument("--accept-currency", action = "store_true", help = "Import prices that are specified in a different currency as is")
+    sync_parser.add_argument("--verbose", action = "store_true", help = "Report rows that can not be imported")
+    sync_parser.add_argument("--errors-report", help = "Write the rows that can not be imported (in full) to this CSV file")
+    sync_parser.add_argument("--history", help = "Price history file to record the imported changes in")
+    sync_parser.set_defaults(function = syncCommand)
+
+    history_parser = subparsers.add_parser("history", help = "Export the price history, or the prices as they were at a date")
+    history_parser.add_argument("--history", required = True, help = "Price history file")
+    history_parser.add_argument("--materials-dir", action = "append", help = "Directory with .xml.fdm_material files, used to add material names")
+    history_parser.add_argument("--guid", action = "append", help = "Only export the history of this material; can be specified more than once")
+    history_parser.add_argument("--as-of", help = "Export the weights and prices as they were at the end of this date (YYYY-MM-DD)")
+    history_parser.add_argument("--currency", default = DEFAULT_CURRENCY, help = "Currency to put in the header when using --as-of")
+    history_parser.add_argument("--output", help = "CSV file to write, instead of the standard output")
+    history_parser.set_defaults(function = historyCommand)
+
+    cost_parser = subparsers.add_parser("cost-gcode", help = "Estimate the material cost of sliced g-code and ufp files")
+    cost_parser.add_argument("--preferences", required = True, help = "Cura preferences file (cura.cfg)")
+    cost_parser.add_argument("--materials-dir", action = "append", required = True, help = "Directory with .xml.fdm_material files; can be specified more than once")
+    cost_parser.add_argument("--default-material", help = "GUID of the material to use for files that do not specify a material")
+    cost_parser.add_argument("--workers", type = int, help = "Number of files to read concurrently")
+    cost_parser.add_argument("--output", help = "CSV file to write the report to, instead of the standard output")
+    cost_parser.add_argument("files", nargs = "+", help = "G-code or ufp files")
+    cost_parser.set_defaults(function = costGcodeCommand)
+
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = createParser().parse_args(argv)
+    return args.function(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
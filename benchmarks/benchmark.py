@@ -0,0 +1,176 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+# Times the plugin against synthetic material registries, without Cura:
+#   python benchmarks/benchmark.py --sizes 1000 10000 100000
+# For every stage the best time of a number of runs is reported, along with the throughput and
+# the peak memory allocated by Python during a separate run of that stage.
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stubs
+
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class Benchmark:
+    def __init__(self, material_count: int, repeat: int, work_dir: str) -> None:
+        self._material_count = material_count
+        self._repeat = repeat
+        self._work_dir = work_dir
+        self._stage_timers = {}  # type: Dict[str, Any]
+        self._prepared_exports = {}  # type: Dict[str, Any]
+
+        self._plugin = stubs.loadPlugin()
+        self._material_settings = stubs.populate(material_count)
+
+        self._preferences = stubs.Application.getInstance().getPreferences()
+        self._preferences.setValue("cura/material_settings", json.dumps(self._material_settings))
+
+        from MaterialCostTools.MaterialCostTools import MaterialCostTools
+        self._tools = MaterialCostTools()
+
+    def run(self) -> List[Tuple[str, int, float, int]]:
+        results = []
+        results.append(self._measure("catalog build", self._material_count, self._buildCatalog))
+        for scope in ["exportAllMaterialData", "exportFavoriteMaterialData", "exportPrinterMaterialData", "exportConfiguredData"]:
+            results.append(self._measure(scope, self._material_count, lambda: self._export(scope)))
+        results.append(self._measure("exportCompatibilityMatrix", self._material_count, self._exportCompatibilityMatrix))
+        results.append(self._measure("exportAllMaterialData (cached)", self._material_count, lambda: self._export("exportAllMaterialData", cached = True)))
+        results.append(self._measure("exportAllMaterialData (unit costs)", self._material_count, lambda: self._export("exportAllMaterialData", cached = True, unit_costs = True)))
+        results.append(self._measure("match names", self._material_count, self._matchNames))
+        results.append(self._measure("sort export rows", self._material_count, self._sortRows))
+        results.append(self._measure("settings json round-trip", len(self._material_settings), self._jsonRoundTrip))
+
+        import_file = self._writeImportFile()
+        results.append(self._measure("import csv", self._material_count, lambda: self._import(import_file)))
+        return results
+
+    # Returns the stage breakdown of the last run of every export scope and of the import
+    def getStageTimers(self) -> Dict[str, Any]:
+        return self._stage_timers
+
+    def _measure(self, name: str, count: int, function: Callable[[], Any]) -> Tuple[str, int, float, int]:
+        best_time = float("inf")
+        for _ in range(self._repeat):
+            start_time = time.perf_counter()
+            function()
+            best_time = min(best_time, time.perf_counter() - start_time)
+
+        tracemalloc.start()
+        function()
+        (_, peak_memory) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return (name, count, best_time, peak_memory)
+
+    def _buildCatalog(self) -> None:
+        self._tools._catalog = None
+        self._tools._getCatalog()
+
+    # With cached, the materials and settings prepared by the last uncached export of the scope are exported again
+    def _export(self, function_name: str, cached: bool = False, unit_costs: bool = False) -> int:
+        selectors = []  # type: List[Any]
+        self._tools._exportData = lambda materials_selector, stage_timer, cache_key_parts, extruders = None: selectors.append((materials_selector, stage_timer, extruders))
+        getattr(self._tools, function_name)()
+
+        from MaterialCostTools.ExportJob import ExportJob
+        job = ExportJob(
+            os.path.join(self._work_dir, "export.csv"),
+            selectors[0][0],
+            self._preferences.getValue("cura/material_settings"),
+            self._preferences.getValue("cura/currency"),
+            selectors[0][1],
+            self._prepared_exports.get(function_name) if cached else None,
+            selectors[0][2],
+            unit_costs
+        )
+        job.run()
+        if unit_costs:
+            self._stage_timers[function_name + " (unit costs)"] = job.getStageTimer()
+        elif cached:
+            self._stage_timers[function_name + " (cached)"] = job.getStageTimer()
+        else:
+            self._stage_timers[function_name] = job.getStageTimer()
+            self._prepared_exports[function_name] = job.getPrepared()
+        return job.getExportedCount()
+
+    def _exportCompatibilityMatrix(self) -> int:
+        jobs = []  # type: List[Any]
+        self._tools._getSaveFileName = lambda caption, name_filter: os.path.join(self._work_dir, "matrix.csv")
+        self._tools._startJob = lambda job, text: jobs.append(job)
+        self._tools.exportCompatibilityMatrix()
+
+        job = jobs[0]
+        job.run()
+        self._stage_timers["exportCompatibilityMatrix"] = job.getStageTimer()
+        return job.getExportedCount()
+
+    def _sortRows(self) -> None:
+        from MaterialCostTools.ExportWriter import ExportWriter
+        ExportWriter.prepareRows(self._tools._getCatalog().getAll(), self._material_settings)
+
+    # Matches the name of every material, with the index built from scratch
+    def _matchNames(self) -> None:
+        catalog = self._tools._getCatalog()
+        catalog._name_index = None
+        for metadata in catalog.getAll():
+            catalog.matchName("%s %s" % (metadata.get("brand", ""), metadata.get("name", "")))
+
+    def _jsonRoundTrip(self) -> None:
+        json.dumps(json.loads(self._preferences.getValue("cura/material_settings")))
+
+    def _writeImportFile(self) -> str:
+        self._export("exportAllMaterialData")
+        import_file = os.path.join(self._work_dir, "import.csv")
+        with open(os.path.join(self._work_dir, "export.csv"), "r", newline = "") as export_file:
+            with open(import_file, "w", newline = "") as csv_file:
+                for (index, line) in enumerate(export_file):
+                    # change every other price, so the import has both changed and unchanged rows
+                    if index > 0 and index % 2 == 0:
+                        fields = line.rstrip("\r\n").split(",")
+                        fields[-1] = "99.5"
+                        line = ",".join(fields) + "\r\n"
+                    csv_file.write(line)
+        return import_file
+
+    def _import(self, file_name: str) -> None:
+        from MaterialCostTools.ImportJob import ImportJob
+        job = ImportJob([file_name], self._preferences.getValue("cura/material_settings"), self._tools._getCatalog().hasGuid)
+        job.run()
+        self._stage_timers["import csv"] = job.getStageTimer()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description = "Benchmark the Material Cost Tools plugin with synthetic material registries")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1000, 10000, 100000], help = "Numbers of base materials to generate")
+    parser.add_argument("--repeat", type = int, default = 3, help = "Number of timed runs per stage")
+    parser.add_argument("--stages", action = "store_true", help = "Also show the stage breakdown of the last export and import runs")
+    args = parser.parse_args()
+
+    stubs.install()
+
+    print("%-36s %9s %10s %14s %12s" % ("stage", "items", "time (ms)", "items/s", "peak (KiB)"))
+    with tempfile.TemporaryDirectory() as work_dir:
+        for material_count in args.sizes:
+            benchmark = Benchmark(material_count, args.repeat, work_dir)
+            for (name, count, best_time, peak_memory) in benchmark.run():
+                print("%-36s %9d %10.1f %14.0f %12.0f" % (name, count, best_time * 1000, count / best_time if best_time else 0, peak_memory / 1024))
+            print()
+            if args.stages:
+                for (name, stage_timer) in benchmark.getStageTimers().items():
+                    print(name)
+                    for line in stage_timer.formatLines():
+                        print("  " + line)
+                print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+# Measures what the plugin adds to the startup of Cura: the time to import the plugin and create
+# the extension, and the modules that are imported for it. Every run is done in a fresh interpreter,
+# with stand-ins for Uranium, Cura and PyQt, which Cura has already imported before plugins load.
+#   python benchmarks/startup.py --repeat 20
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from typing import Any, Dict, List
+
+MEASURE = """
+import json, os, sys, time
+sys.path.insert(0, %r)
+import stubs
+stubs.install()
+modules_before = set(sys.modules)
+start_time = time.perf_counter()
+plugin = stubs.loadPlugin()
+plugin.register(stubs.Application.getInstance())
+duration = time.perf_counter() - start_time
+print(json.dumps({"time": duration, "modules": sorted(set(sys.modules) - modules_before)}))
+"""
+
+def measure() -> Dict[str, Any]:
+    benchmarks_path = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.check_output([sys.executable, "-c", MEASURE % benchmarks_path])
+    return json.loads(output.decode("utf-8"))
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description = "Measure the time and imports the Material Cost Tools plugin adds to Cura startup")
+    parser.add_argument("--repeat", type = int, default = 10, help = "Number of interpreters to measure")
+    parser.add_argument("--modules", action = "store_true", help = "List the modules that are imported")
+    args = parser.parse_args()
+
+    times = []  # type: List[float]
+    modules = []  # type: List[str]
+    for _ in range(args.repeat):
+        result = measure()
+        times.append(result["time"])
+        modules = result["modules"]
+
+    print("register: median %.1f ms, min %.1f ms over %d runs" % (statistics.median(times) * 1000, min(times) * 1000, len(times)))
+    print("modules imported: %d (%d of the plugin)" % (len(modules), len([module for module in modules if module.startswith("MaterialCostTools")])))
+    if args.modules:
+        for module in modules:
+            print("  " + module)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+# Minimal stand-ins for the parts of Uranium, Cura and PyQt that the plugin uses, so the plugin can
+# be loaded and benchmarked outside of Cura against synthetic material registries.
+
+import importlib.util
+import os
+import sys
+import types
+import uuid
+
+from typing import Any, Dict, List, Optional
+
+
+class Signal:
+    def __init__(self) -> None:
+        self._slots = []  # type: List[Any]
+
+    def connect(self, slot: Any) -> None:
+        self._slots.append(slot)
+
+    def disconnect(self, slot: Any) -> None:
+        self._slots.remove(slot)
+
+    def emit(self, *args: Any) -> None:
+        for slot in self._slots:
+            slot(*args)
+
+
+class Job:
+    def __init__(self) -> None:
+        self._error = None  # type: Optional[Exception]
+        self.progress = Signal()
+        self.finished = Signal()
+
+    def run(self) -> None:
+        raise NotImplementedError()
+
+    def start(self) -> None:
+        self.run()
+        self.finished.emit(self)
+
+    def cancel(self) -> None:
+        pass
+
+    def setError(self, error: Exception) -> None:
+        self._error = error
+
+    def hasError(self) -> bool:
+        return self._error is not None
+
+    def getError(self) -> Optional[Exception]:
+        return self._error
+
+    @staticmethod
+    def yieldThread() -> None:
+        pass
+
+
+class Logger:
+    @classmethod
+    def log(cls, log_type: str, message: str, *args: Any) -> None:
+        pass
+
+    @classmethod
+    def logException(cls, log_type: str, message: str, *args: Any) -> None:
+        pass
+
+
+class Preferences:
+    def __init__(self) -> None:
+        self._values = {
+            "cura/material_settings": "{}",
+            "cura/favorite_materials": "",
+            "cura/currency": "€"
+        }  # type: Dict[str, Any]
+
+    def addPreference(self, key: str, default_value: Any) -> None:
+        self._values.setdefault(key, default_value)
+
+    def getValue(self, key: str) -> Any:
+        return self._values.get(key)
+
+    def setValue(self, key: str, value: Any) -> None:
+        self._values[key] = value
+
+    def resetPreference(self, key: str) -> None:
+        self._values[key] = "{}"
+
+
+class InstanceContainer:
+    def __init__(self, metadata: Dict[str, Any]) -> None:
+        self._metadata = metadata
+
+    def getId(self) -> str:
+        return self._metadata["id"]
+
+    def getName(self) -> str:
+        return self._metadata.get("name", self._metadata["id"])
+
+    def getMetadata(self) -> Dict[str, Any]:
+        return self._metadata
+
+    getMetaData = getMetadata
+
+    def getMetaDataEntry(self, key: str, default: Any = None) -> Any:
+        return self._metadata.get(key, default)
+
+
+class ContainerRegistry:
+    _instance = None  # type: Optional[ContainerRegistry]
+
+    def __init__(self) -> None:
+        self.metadata = {}  # type: Dict[str, Dict[str, Any]]
+        self.stacks = []  # type: List[Any]
+        self.containerAdded = Signal()
+        self.containerRemoved = Signal()
+        self.containerMetaDataChanged = Signal()
+
+    @classmethod
+    def getInstance(cls) -> "ContainerRegistry":
+        if cls._instance is None:
+            cls._instance = ContainerRegistry()
+        return cls._instance
+
+    def findContainerStacks(self, **kwargs: Any) -> List[Any]:
+        return self.stacks
+
+    def findInstanceContainersMetadata(self, **kwargs: Any) -> List[Dict[str, Any]]:
+        return [
+            metadata for metadata in self.metadata.values()
+            if all(metadata.get(key) == value for (key, value) in kwargs.items())
+        ]
+
+
+class MaterialNode(InstanceContainer):
+    pass
+
+
+class VariantNode:
+    def __init__(self) -> None:
+        self.materials = {}  # type: Dict[str, MaterialNode]
+
+
+class MachineNode:
+    def __init__(self) -> None:
+        self.variants = {}  # type: Dict[str, VariantNode]
+
+
+class ContainerTree:
+    _instance = None  # type: Optional[ContainerTree]
+
+    def __init__(self) -> None:
+        self.machines = {}  # type: Dict[str, MachineNode]
+
+    @classmethod
+    def getInstance(cls) -> "ContainerTree":
+        if cls._instance is None:
+            cls._instance = ContainerTree()
+        return cls._instance
+
+
+class ExtruderStack:
+    def __init__(self, variant_name: str, diameter: float) -> None:
+        self.variant = InstanceContainer({"id": variant_name, "name": variant_name})
+        self._diameter = diameter
+
+    def getApproximateMaterialDiameter(self) -> float:
+        return self._diameter
+
+
+class GlobalStack:
+    def __init__(self, definition_id: str, extruders: Dict[str, ExtruderStack]) -> None:
+        self.definition = InstanceContainer({"id": definition_id})
+        self.extruders = extruders
+
+    def getMetaDataEntry(self, key: str, default: Any = None) -> Any:
+        return True if key == "has_materials" else default
+
+
+class Application:
+    _instance = None  # type: Optional[Application]
+
+    def __init__(self) -> None:
+        self._preferences = Preferences()
+        self._global_stack = None  # type: Optional[GlobalStack]
+
+    @classmethod
+    def getInstance(cls) -> "Application":
+        if cls._instance is None:
+            cls._instance = Application()
+        return cls._instance
+
+    def getPreferences(self) -> Preferences:
+        return self._preferences
+
+    def getGlobalContainerStack(self) -> Optional[GlobalStack]:
+        return self._global_stack
+
+    def setGlobalContainerStack(self, stack: GlobalStack) -> None:
+        self._global_stack = stack
+
+    def callLater(self, function: Any, *args: Any) -> None:
+        function(*args)
+
+
+class Resources:
+    @staticmethod
+    def getDataStoragePath() -> str:
+        return os.path.join(os.path.expanduser("~"), ".local", "share", "cura")
+
+
+class Extension:
+    def __init__(self) -> None:
+        self._menu_items = []  # type: List[Any]
+
+    def setMenuName(self, name: str) -> None:
+        pass
+
+    def addMenuItem(self, name: str, function: Any) -> None:
+        self._menu_items.append((name, function))
+
+
+class Message:
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.actionTriggered = Signal()
+
+    def show(self) -> None:
+        pass
+
+    def hide(self) -> None:
+        pass
+
+    def setProgress(self, progress: float) -> None:
+        pass
+
+    def addAction(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+class i18nCatalog:
+    def __init__(self, name: str) -> None:
+        pass
+
+    def i18nc(self, context: str, text: str, *args: Any) -> str:
+        return text
+
+    def i18ncp(self, context: str, single: str, multiple: str, counter: int, *args: Any) -> str:
+        return single if counter == 1 else multiple
+
+
+class QObject:
+    def __init__(self, parent: Any = None) -> None:
+        pass
+
+
+class QMessageBox:
+    class StandardButton:
+        Yes = 1
+        No = 0
+
+    @staticmethod
+    def question(*args: Any) -> int:
+        return QMessageBox.StandardButton.Yes
+
+    def setWindowTitle(self, title: str) -> None:
+        pass
+
+    def setText(self, text: str) -> None:
+        self.text = text
+
+    def setStandardButtons(self, buttons: int) -> None:
+        pass
+
+    def setDetailedText(self, text: str) -> None:
+        self.detailed_text = text
+
+    def exec(self) -> int:
+        return 0
+
+    # the dialogs are always answered with Yes
+    def clickedButton(self) -> int:
+        return QMessageBox.StandardButton.Yes
+
+    def standardButton(self, button: int) -> int:
+        return button
+
+
+class QFileDialog:
+    pass
+
+
+class QInputDialog:
+    pass
+
+
+class QTimer:
+    def __init__(self) -> None:
+        self.timeout = Signal()
+
+    def setInterval(self, interval: int) -> None:
+        pass
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+def _module(name: str, **attributes: Any) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+def install() -> None:
+    for package in ["UM", "UM.Settings", "cura", "cura.Machines", "PyQt6"]:
+        _module(package, __path__ = [])
+
+    _module("UM.Job", Job = Job)
+    _module("UM.Logger", Logger = Logger)
+    _module("UM.Extension", Extension = Extension)
+    _module("UM.Application", Application = Application)
+    _module("UM.Message", Message = Message)
+    _module("UM.Resources", Resources = Resources)
+    _module("UM.i18n", i18nCatalog = i18nCatalog)
+    _module("UM.Settings.ContainerRegistry", ContainerRegistry = ContainerRegistry)
+    _module("cura.Machines.ContainerTree", ContainerTree = ContainerTree)
+    _module("PyQt6.QtCore", QObject = QObject, QTimer = QTimer)
+    _module("PyQt6.QtWidgets", QFileDialog = QFileDialog, QInputDialog = QInputDialog, QMessageBox = QMessageBox)
+
+def loadPlugin(name: str = "MaterialCostTools") -> types.ModuleType:
+    # the plugin is loaded as a package regardless of the name of the folder it is checked out in
+    plugin_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    spec = importlib.util.spec_from_file_location(name, os.path.join(plugin_path, "__init__.py"), submodule_search_locations = [plugin_path])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[name] = package
+    spec.loader.exec_module(package)  # type: ignore
+    return package
+
+
+def populate(material_count: int, variants_per_material: int = 4, configured_fraction: float = 0.5) -> Dict[str, Any]:
+    registry = ContainerRegistry.getInstance()
+    registry.metadata = {}
+    tree = ContainerTree.getInstance()
+    tree.machines = {}
+
+    brands = ["Brand %d" % index for index in range(max(material_count // 50, 1))]
+    material_types = ["PLA", "PETG", "ABS", "TPU", "Nylon", "PC"]
+    material_settings = {}  # type: Dict[str, Dict[str, Any]]
+    favorites = []
+
+    # a dual extrusion printer, with some materials that can be used in both extruders
+    variant_node = VariantNode()
+    second_variant_node = VariantNode()
+    machine_node = MachineNode()
+    machine_node.variants["AA 0.4"] = variant_node
+    machine_node.variants["BB 0.4"] = second_variant_node
+    tree.machines["synthetic_printer"] = machine_node
+
+    for index in range(material_count):
+        guid = str(uuid.UUID(int = index + 1))
+        base_file = "material_%d" % index
+        metadata = {
+            "id": base_file,
+            "base_file": base_file,
+            "type": "material",
+            "GUID": guid,
+            "brand": brands[index % len(brands)],
+            "material": material_types[index % len(material_types)],
+            "name": "Color %d %s" % (index, material_types[index % len(material_types)]),
+            "approximate_diameter": "3" if index % 2 else "2",
+            "properties": {"density": "1.24", "diameter": "2.85" if index % 2 else "1.75"}
+        }
+        registry.metadata[base_file] = metadata
+        for variant_index in range(variants_per_material):
+            variant_id = "%s_variant_%d" % (base_file, variant_index)
+            registry.metadata[variant_id] = dict(metadata, id = variant_id)
+
+        if index % 2:
+            variant_node.materials[base_file] = MaterialNode(metadata)
+            if index % 3 == 0:
+                second_variant_node.materials[base_file] = MaterialNode(metadata)
+        if index % 10 == 0:
+            favorites.append(base_file)
+        if index < material_count * configured_fraction:
+            material_settings[guid] = {"spool_cost": 20.0 + index % 30, "spool_weight": 750 + index % 3 * 250}
+
+    global_stack = GlobalStack("synthetic_printer", {"0": ExtruderStack("AA 0.4", 3.0), "1": ExtruderStack("BB 0.4", 3.0)})
+    registry.stacks = [global_stack]
+    application = Application.getInstance()
+    application.setGlobalContainerStack(global_stack)
+    preferences = application.getPreferences()
+    preferences.setValue("cura/favorite_materials", ";".join(favorites))
+
+    return material_settings
@@ -0,0 +1,44 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+# The plugin is loaded as the MaterialCostTools package with the stand-ins for Uranium, Cura and PyQt
+# that the benchmarks use, so the tests run without Cura:
+#   python -m pytest tests
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import stubs
+
+stubs.install()
+stubs.loadPlugin()
+
+import pytest
+
+
+class RecordedMessage(stubs.Message):
+    shown = []  # type: list
+
+    def __init__(self, text: str = "", *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.text = text
+
+    def show(self) -> None:
+        RecordedMessage.shown.append(self.text)
+
+
+# An instance of the extension with its own preferences and data folder; the texts of the messages
+# it shows are collected in tools.shown_messages
+@pytest.fixture
+def tools(tmp_path, monkeypatch):
+    from MaterialCostTools import MaterialCostTools as module
+
+    monkeypatch.setattr(stubs.Application, "_instance", None)
+    monkeypatch.setattr(stubs.Resources, "getDataStoragePath", staticmethod(lambda: str(tmp_path)))
+    monkeypatch.setattr(module, "Message", RecordedMessage)
+    monkeypatch.setattr(RecordedMessage, "shown", [])
+
+    instance = module.MaterialCostTools()
+    instance.shown_messages = RecordedMessage.shown
+    return instance
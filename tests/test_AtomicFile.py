@@ -0,0 +1,75 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import os
+
+import pytest
+
+from MaterialCostTools.AtomicFile import AtomicFile
+
+
+def _read(path):
+    with open(str(path), "r", encoding = "utf-8") as text_file:
+        return text_file.read()
+
+
+def test_replace(tmp_path):
+    path = tmp_path / "prices.csv"
+    path.write_text("old", encoding = "utf-8")
+    with AtomicFile(str(path), "w", encoding = "utf-8") as output_file:
+        output_file.write("new")
+        # the original file is untouched until the new file is complete
+        assert _read(path) == "old"
+    assert _read(path) == "new"
+    assert os.listdir(str(tmp_path)) == ["prices.csv"]
+
+def test_create(tmp_path):
+    path = tmp_path / "prices.csv"
+    with AtomicFile(str(path), "wb") as output_file:
+        output_file.write(b"new")
+    assert path.read_bytes() == b"new"
+
+def test_discard(tmp_path):
+    path = tmp_path / "prices.csv"
+    path.write_text("old", encoding = "utf-8")
+    atomic_file = AtomicFile(str(path), "w", encoding = "utf-8")
+    with atomic_file as output_file:
+        output_file.write("new")
+        atomic_file.discard()
+    assert _read(path) == "old"
+    assert os.listdir(str(tmp_path)) == ["prices.csv"]
+
+def test_exception(tmp_path):
+    path = tmp_path / "prices.csv"
+    path.write_text("old", encoding = "utf-8")
+    with pytest.raises(RuntimeError):
+        with AtomicFile(str(path), "w", encoding = "utf-8") as output_file:
+            output_file.write("new")
+            raise RuntimeError("export failed")
+    assert _read(path) == "old"
+    assert os.listdir(str(tmp_path)) == ["prices.csv"]
+
+@pytest.mark.skipif(os.name != "posix", reason = "file modes are only meaningful on POSIX")
+def test_keepsMode(tmp_path):
+    path = tmp_path / "prices.csv"
+    path.write_text("old", encoding = "utf-8")
+    os.chmod(str(path), 0o640)
+    with AtomicFile(str(path), "w", encoding = "utf-8") as output_file:
+        output_file.write("new")
+    assert os.stat(str(path)).st_mode & 0o777 == 0o640
+
+@pytest.mark.skipif(os.name != "posix", reason = "file modes are only meaningful on POSIX")
+def test_newFileMode(tmp_path, monkeypatch):
+    # the umask is applied when the file is created, and is not changed
+    def setUmask(mask):
+        raise AssertionError("The umask should not be changed")
+    umask = os.umask(0o027)
+    try:
+        monkeypatch.setattr(os, "umask", setUmask)
+        path = tmp_path / "prices.csv"
+        with AtomicFile(str(path), "w", encoding = "utf-8") as output_file:
+            output_file.write("new")
+    finally:
+        monkeypatch.undo()
+        os.umask(umask)
+    assert os.stat(str(path)).st_mode & 0o777 == 0o640
@@ -0,0 +1,39 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import codecs
+
+from MaterialCostTools.CsvSniffer import CsvSniffer
+
+
+def _open(tmp_path, data):
+    path = tmp_path / "prices.csv"
+    path.write_bytes(data)
+    (csv_file, dialect) = CsvSniffer.open(str(path))
+    with csv_file:
+        return (csv_file.encoding, dialect.delimiter, csv_file.read())
+
+def test_delimiter(tmp_path):
+    assert _open(tmp_path, b"guid,name,weight,cost\na,PLA,750,20\n")[1] == ","
+    assert _open(tmp_path, b"guid;name;weight;cost\na;PLA;750;20,5\n")[1] == ";"
+    assert _open(tmp_path, b"guid\tname\tweight\tcost\na\tPLA\t750\t20\n")[1] == "\t"
+    # rows with a different number of columns, which the csv sniffer gives up on
+    assert _open(tmp_path, b"guid;name;weight;cost\na;PLA\nb;PETG;1000;25;extra\n")[1] == ";"
+    assert _open(tmp_path, b"")[1] == ","
+
+def test_encoding(tmp_path):
+    assert _open(tmp_path, "guid;name\na;Fürst\n".encode("utf-8"))[0] == "utf-8"
+    assert _open(tmp_path, codecs.BOM_UTF8 + "guid;name\na;Fürst\n".encode("utf-8")) == ("utf-8-sig", ";", "guid;name\na;Fürst\n")
+    # Excel saves files in the Windows code page; the name must not be mangled
+    assert _open(tmp_path, "guid;name\na;Fürst\n".encode("cp1252")) == ("cp1252", ";", "guid;name\na;Fürst\n")
+
+def test_encodingAfterSample(tmp_path):
+    # the sample only contains ASCII, so the file is read as UTF-8; a cp1252 character further on is still read
+    padding = b"guid,name,weight,cost\n" + b"a,PLA,750,20\n" * (CsvSniffer.SAMPLE_SIZE // 13 + 1)
+    (encoding, delimiter, text) = _open(tmp_path, padding + "b,Fürst,750,20\nc,Ångström,1000,25\n".encode("cp1252"))
+    assert (encoding, delimiter) == ("utf-8", ",")
+    assert text.endswith("b,Fürst,750,20\nc,Ångström,1000,25\n")
+
+    # and so is a UTF-8 character that is split by the end of the sample
+    data = b"x" * (CsvSniffer.SAMPLE_SIZE - 1) + "ü\n".encode("utf-8")
+    assert _open(tmp_path, data) == ("utf-8", ",", data.decode("utf-8"))
@@ -0,0 +1,51 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import os
+
+import pytest
+
+from MaterialCostTools.CurrencyRates import CurrencyRates
+
+
+def test_normalizeCurrency():
+    assert CurrencyRates.normalizeCurrency(" eur ") == "EUR"
+    assert CurrencyRates.normalizeCurrency("€") == "EUR"
+    assert CurrencyRates.normalizeCurrency("£") == "GBP"
+    # symbols that are used by more than one currency are not guessed
+    for symbol in ("$", "kr", "¥"):
+        assert CurrencyRates.normalizeCurrency(symbol) == symbol.upper()
+
+def test_getRate():
+    rates = CurrencyRates("EUR", {"USD": 1.25, "GBP": 0.8, "SEK": 0}, 0)
+    assert rates.getBase() == "EUR"
+    assert rates.getCurrencies() == ["EUR", "GBP", "USD"]
+    assert rates.getRate("USD", "EUR") == pytest.approx(0.8)
+    assert rates.getRate("£", "usd") == pytest.approx(1.5625)
+    assert rates.getRate("€", "EUR") == 1.0
+    # the currency of an ambiguous symbol is not known, and neither is a currency with a zero rate
+    assert rates.getRate("$", "EUR") is None
+    assert rates.getRate("kr", "EUR") is None
+    assert rates.getRate("SEK", "EUR") is None
+    assert rates.getRate("CHF", "EUR") is None
+
+def test_load(tmp_path):
+    path = tmp_path / "rates.json"
+    path.write_text('{"base": "EUR", "date": "2026-01-05", "rates": {"USD": 1.25}}', encoding = "utf-8")
+    rates = CurrencyRates.load(str(path))
+    assert rates.getRate("EUR", "USD") == 1.25
+    assert rates.isStale(1)
+    # the table is only read again when the file changes
+    assert CurrencyRates.load(str(path)) is rates
+
+    path.write_text('{"base": "USD", "rates": {"EUR": 0.8}}', encoding = "utf-8")
+    os.utime(str(path), (1, 1))
+    rates = CurrencyRates.load(str(path))
+    assert rates.getBase() == "USD"
+    # without a date, the rates are as old as the file
+    assert rates.getDate() == 1
+
+    path.write_text('{"rates": {"EUR": 0.8}}', encoding = "utf-8")
+    os.utime(str(path), (2, 2))
+    with pytest.raises(ValueError):
+        CurrencyRates.load(str(path))
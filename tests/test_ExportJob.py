@@ -0,0 +1,35 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import json
+
+from MaterialCostTools.ExportJob import ExportJob
+from MaterialCostTools.PriceSnapshot import PriceSnapshot
+
+GUID = "506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9"
+MATERIALS = [{"GUID": GUID, "material": "PLA", "brand": "Generic", "name": "PLA"}]
+MATERIAL_SETTINGS = json.dumps({GUID: {"spool_cost": 20.0, "spool_weight": 750}})
+
+
+def test_snapshot(tmp_path):
+    path = str(tmp_path / "prices.mctsnap")
+    job = ExportJob(path, lambda material_settings: MATERIALS, MATERIAL_SETTINGS, "€")
+    job.run()
+    assert job.getExportedCount() == 1
+    assert PriceSnapshot.load(path).getSettings() == {GUID: {"spool_cost": 20.0, "spool_weight": 750}}
+
+def test_cancelledSnapshot(tmp_path):
+    path = tmp_path / "prices.mctsnap"
+    path.write_bytes(b"old")
+    job = ExportJob(str(path), lambda material_settings: MATERIALS, MATERIAL_SETTINGS, "€")
+    job.cancel()
+    job.run()
+    # the file is kept as it was
+    assert path.read_bytes() == b"old"
+    assert job.getExportedCount() == 0
+
+def test_snapshotSkippedRows(tmp_path):
+    job = ExportJob(str(tmp_path / "prices.mctsnap"), lambda material_settings: MATERIALS, json.dumps({GUID: {"spool_weight": 2 ** 40}}), "€")
+    job.run()
+    assert job.getExportedCount() == 0
+    assert job.getSkippedRows() == [(GUID, "Weight 1099511627776 is out of range")]
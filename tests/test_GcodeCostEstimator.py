@@ -0,0 +1,107 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import io
+import math
+import zipfile
+
+import pytest
+
+from MaterialCostTools.GcodeCostEstimator import GcodeCostEstimator
+
+PLA = "506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9"
+PETG = "e509f649-9fe6-4b14-ac45-d441438cb4ef"
+METADATA = {
+    PLA: {"brand": "Generic", "name": "PLA", "properties": {"density": "1.24", "diameter": "2.85"}},
+    PETG: {"brand": "Generic", "name": "PETG", "properties": {"density": "1.27", "diameter": "1.75"}}
+}
+SETTINGS = {PLA: {"spool_weight": 750, "spool_cost": 20.0}}
+
+GRIFFIN_HEADER = """;START_OF_HEADER
+;HEADER_VERSION:0.1
+;FLAVOR:Griffin
+;EXTRUDER_TRAIN.0.MATERIAL.VOLUME_USED:10000
+;EXTRUDER_TRAIN.0.MATERIAL.GUID:%s
+;EXTRUDER_TRAIN.0.NOZZLE.DIAMETER:0.4
+;EXTRUDER_TRAIN.1.MATERIAL.VOLUME_USED:2000
+;EXTRUDER_TRAIN.1.MATERIAL.GUID:%s
+;END_OF_HEADER
+;EXTRUDER_TRAIN.2.MATERIAL.VOLUME_USED:5000
+G28
+""" % (PLA, PETG)
+
+
+def _estimator():
+    return GcodeCostEstimator(SETTINGS, METADATA.get)
+
+def test_parseGriffinHeader():
+    usage = GcodeCostEstimator.parseHeader(GRIFFIN_HEADER.split(";END_OF_HEADER")[0])
+    assert usage == {0: {"volume": 10000.0, "guid": PLA, "nozzle": 0.4}, 1: {"volume": 2000.0, "guid": PETG}}
+
+def test_parseMarlinHeader():
+    header = ";FLAVOR:Marlin\n;Filament used: 1.5m, 0m\n;MATERIAL:%s\n;MATERIAL2:%s\n" % (PLA, PETG)
+    # an extruder that was not used is left out
+    assert GcodeCostEstimator.parseHeader(header) == {0: {"length": 1.5, "guid": PLA}}
+
+def test_readHeader(tmp_path):
+    gcode_path = tmp_path / "print.gcode"
+    gcode_path.write_text(GRIFFIN_HEADER, encoding = "utf-8")
+    header = GcodeCostEstimator.readHeader(str(gcode_path))
+    # only the header is read
+    assert header.endswith("NOZZLE.DIAMETER:0.4\n;EXTRUDER_TRAIN.1.MATERIAL.VOLUME_USED:2000\n;EXTRUDER_TRAIN.1.MATERIAL.GUID:%s\n" % PETG)
+
+    ufp_path = tmp_path / "print.ufp"
+    with zipfile.ZipFile(str(ufp_path), "w") as archive:
+        archive.writestr("3D/model.gcode", GRIFFIN_HEADER)
+    assert GcodeCostEstimator.readHeader(str(ufp_path)) == header
+
+    empty_path = tmp_path / "empty.gcode"
+    empty_path.write_bytes(b"")
+    assert GcodeCostEstimator.readHeader(str(empty_path)) == ""
+
+def test_estimateFile(tmp_path):
+    gcode_path = tmp_path / "print.gcode"
+    gcode_path.write_text(GRIFFIN_HEADER, encoding = "utf-8")
+    result = _estimator().estimateFile(str(gcode_path))
+    assert result["error"] is None
+    (pla, petg) = result["extruders"]
+    # 10 cm3 of PLA at 1.24 g/cm3, from a spool of 750 g that costs 20
+    assert pla["weight"] == pytest.approx(12.4)
+    assert pla["cost"] == pytest.approx(12.4 / 750 * 20)
+    assert pla["name"] == "Generic PLA"
+    # PETG has no price, so the file is not fully costed
+    assert petg["weight"] == pytest.approx(2.54)
+    assert petg["cost"] is None
+    assert result["weight"] == pytest.approx(14.94)
+    assert result["cost"] is None
+
+def test_estimateFromLength(tmp_path):
+    gcode_path = tmp_path / "print.gcode"
+    gcode_path.write_text(";Filament used: 2m\n", encoding = "utf-8")
+    estimator = _estimator()
+    # without a material in the header, the default material is used
+    assert estimator.estimateFile(str(gcode_path))["extruders"][0]["weight"] is None
+    estimator.default_material_guid = PLA
+    result = estimator.estimateFile(str(gcode_path))
+    weight = 2000 * math.pi * (2.85 / 2) ** 2 / 1000 * 1.24
+    assert result["weight"] == pytest.approx(weight)
+    assert result["cost"] == pytest.approx(weight / 750 * 20)
+
+def test_errors(tmp_path):
+    (tmp_path / "empty.gcode").write_text(";FLAVOR:Marlin\nG28\n", encoding = "utf-8")
+    results = _estimator().estimateFiles([str(tmp_path / "empty.gcode"), str(tmp_path / "missing.gcode")])
+    assert results[0]["error"] == "No filament usage found in header"
+    assert results[1]["error"]
+
+def test_writeReport(tmp_path):
+    gcode_path = tmp_path / "print.gcode"
+    gcode_path.write_text(GRIFFIN_HEADER, encoding = "utf-8")
+    results = _estimator().estimateFiles([str(gcode_path), str(tmp_path / "missing.gcode")])
+    csv_file = io.StringIO()
+    GcodeCostEstimator.writeReport(csv_file, results, "EUR")
+    lines = csv_file.getvalue().splitlines()
+    assert lines[0] == "file,extruder,guid,name,weight (g),cost (EUR),error"
+    assert lines[1] == "%s,0,%s,Generic PLA,12.40,0.33," % (gcode_path, PLA)
+    assert lines[2] == "%s,1,%s,Generic PETG,2.54,," % (gcode_path, PETG)
+    assert lines[3].startswith("%s,,,,,," % (tmp_path / "missing.gcode"))
+    assert lines[4] == "total,,,,14.94,0.33,"
@@ -0,0 +1,66 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+from MaterialCostTools.ImportChangeSet import ImportChangeSet
+
+
+def _makeChangeSet():
+    return ImportChangeSet({
+        "a": {"spool_cost": 10.0, "spool_weight": 750, "other": "kept"},
+        "b": {"spool_cost": 20.0},
+    })
+
+
+def test_counts():
+    change_set = _makeChangeSet()
+    change_set.addRow("a", {"spool_cost": 12.0, "spool_weight": 750})
+    change_set.addRow("b", {"spool_cost": 20.0})
+    change_set.addRow("c", {"spool_weight": 1000})
+    change_set.addRow("d", {})
+    change_set.addInvalidRow()
+
+    assert change_set.getAdded() == {"c": {"spool_weight": 1000}}
+    assert change_set.getChanged() == {"a": {"spool_cost": 12.0}}
+    assert (change_set.getAddedCount(), change_set.getChangedCount(), change_set.getUnchangedCount()) == (1, 1, 1)
+    assert (change_set.getInvalidCount(), change_set.getEmptyCount()) == (1, 1)
+
+def test_applyTo():
+    change_set = _makeChangeSet()
+    change_set.addRow("a", {"spool_cost": 12.0})
+    change_set.addRow("c", {"spool_weight": 1000})
+    material_settings = {"a": {"spool_cost": 10.0, "spool_weight": 750, "other": "kept"}, "b": {"spool_cost": 20.0}}
+
+    assert change_set.getPreviousSettings(material_settings) == {"a": {"spool_cost": 10.0, "spool_weight": 750, "other": "kept"}, "c": None}
+    change_set.applyTo(material_settings)
+    assert material_settings["a"] == {"spool_cost": 12.0, "spool_weight": 750, "other": "kept"}
+    assert change_set.getAppliedSettings(material_settings) == {"a": material_settings["a"], "c": {"spool_weight": 1000}}
+
+def test_duplicateUnchanged():
+    change_set = _makeChangeSet()
+    for _ in range(3):
+        change_set.addRow("b", {"spool_cost": 20.0})
+    assert change_set.getUnchangedCount() == 1
+    assert change_set.isEmpty()
+
+def test_duplicateLastRowWins():
+    change_set = _makeChangeSet()
+    change_set.addRow("a", {"spool_cost": 10.0})
+    change_set.addRow("a", {"spool_cost": 12.0})
+    assert (change_set.getChangedCount(), change_set.getUnchangedCount()) == (1, 0)
+
+    # a later row that restores the current price undoes the change
+    change_set.addRow("a", {"spool_cost": 10.0})
+    assert change_set.getChanged() == {}
+    assert (change_set.getChangedCount(), change_set.getUnchangedCount()) == (0, 1)
+
+    # the fields of the rows are merged
+    change_set.addRow("a", {"spool_weight": 1000})
+    change_set.addRow("a", {"spool_cost": 11.0})
+    assert change_set.getChanged() == {"a": {"spool_weight": 1000, "spool_cost": 11.0}}
+
+def test_duplicateAdded():
+    change_set = _makeChangeSet()
+    change_set.addRow("c", {"spool_cost": 5.0})
+    change_set.addRow("c", {"spool_cost": 6.0, "spool_weight": 500})
+    assert change_set.getAdded() == {"c": {"spool_cost": 6.0, "spool_weight": 500}}
+    assert (change_set.getAddedCount(), change_set.getUnchangedCount()) == (1, 0)
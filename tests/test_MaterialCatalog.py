@@ -0,0 +1,90 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import stubs
+
+from MaterialCostTools.MaterialCatalog import MaterialCatalog
+
+
+def _material(base_file, guid, brand = "Generic", diameter = "2.85", **metadata):
+    return dict({
+        "id": base_file, "base_file": base_file, "type": "material", "GUID": guid, "brand": brand,
+        "material": "PLA", "name": base_file, "approximate_diameter": diameter
+    }, **metadata)
+
+def _makeRegistry(materials):
+    registry = stubs.ContainerRegistry()
+    registry.metadata = {metadata["id"]: metadata for metadata in materials}
+    return registry
+
+
+def test_index():
+    catalog = MaterialCatalog()
+    catalog.rebuild([
+        _material("generic_pla", "a"),
+        _material("brand_pla", "b", brand = "Brand", diameter = "1.75"),
+        # variants of a material and containers without a GUID are not indexed
+        dict(_material("generic_pla", "a"), id = "generic_pla_aa04"),
+        {"id": "broken", "base_file": "broken"},
+    ])
+    assert len(catalog) == 2
+    assert catalog.hasGuid("a") and not catalog.hasGuid("c")
+    assert catalog.getByGuid("b")["id"] == "brand_pla"
+    assert catalog.getByGuid("c") is None
+    assert [metadata["id"] for metadata in catalog.getByBrand("Brand")] == ["brand_pla"]
+    assert [metadata["id"] for metadata in catalog.getByDiameter(1.75)] == ["brand_pla"]
+    assert [metadata["id"] for metadata in catalog.getByBaseFiles(["brand_pla", "missing"])] == ["brand_pla"]
+
+def test_getByGuids():
+    catalog = MaterialCatalog()
+    # materials can share a GUID, eg a material that was duplicated in Cura
+    catalog.rebuild([_material("generic_pla", "a"), _material("generic_pla_copy", "a"), _material("brand_pla", "b")])
+    assert sorted(metadata["id"] for metadata in catalog.getByGuids(["a", "c"])) == ["generic_pla", "generic_pla_copy"]
+    assert [metadata["id"] for metadata in catalog.getByGuids(["b", "b"])] == ["brand_pla", "brand_pla"]
+    assert catalog.getByGuids([]) == []
+
+def test_registrySignals():
+    registry = _makeRegistry([_material("generic_pla", "a")])
+    catalog = MaterialCatalog()
+    catalog.attachToRegistry(registry)
+    assert len(catalog) == 1
+    revision = catalog.getRevision()
+
+    added = stubs.InstanceContainer(_material("brand_pla", "b", brand = "Brand"))
+    registry.containerAdded.emit(added)
+    assert catalog.getByGuid("b")["id"] == "brand_pla"
+    assert catalog.getRevision() > revision
+
+    # other containers are ignored
+    registry.containerAdded.emit(stubs.InstanceContainer({"id": "quality", "type": "quality", "base_file": "quality", "GUID": "q"}))
+    assert not catalog.hasGuid("q")
+
+    # the material is reindexed as a whole when its metadata changes
+    changed = stubs.InstanceContainer(_material("brand_pla", "c", brand = "Other", diameter = "1.75"))
+    registry.containerMetaDataChanged.emit(changed)
+    assert not catalog.hasGuid("b")
+    assert catalog.getByGuid("c")["brand"] == "Other"
+    assert catalog.getByBrand("Brand") == []
+    assert [metadata["id"] for metadata in catalog.getByDiameter(1.75)] == ["brand_pla"]
+
+    registry.containerRemoved.emit(changed)
+    assert not catalog.hasGuid("c")
+    assert catalog.getByDiameter(1.75) == []
+    assert len(catalog) == 1
+
+def test_attachOnce():
+    registry = _makeRegistry([_material("generic_pla", "a")])
+    catalog = MaterialCatalog()
+    catalog.attachToRegistry(registry)
+    catalog.attachToRegistry(registry)
+    # the signals are only connected once
+    assert len(registry.containerAdded._slots) == 1
+    assert len(registry.containerMetaDataChanged._slots) == 1
+
+def test_nameIndexFollowsCatalog():
+    catalog = MaterialCatalog()
+    catalog.rebuild([_material("generic_pla", "a", name = "PLA")])
+    assert catalog.matchName("Generic PLA")[0] == "a"
+    catalog.removeMaterial("generic_pla")
+    catalog.addMaterial(_material("generic_pla", "b", name = "PLA"))
+    assert catalog.matchName("Generic PLA")[0] == "b"
@@ -0,0 +1,297 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import json
+
+import stubs
+
+from MaterialCostTools.SharedCostStore import SharedCostStore
+
+
+def test_jobRunning(tools):
+    running_job = stubs.Job()
+    tools._job = running_job
+    tools.importData()
+    # the action is not started, and the user is told why
+    assert tools._job is running_job
+    assert tools.shown_messages == ["Another import or export is still in progress. Try again when it has finished."]
+
+def test_clearWhileJobRunning(tools):
+    tools._preferences.setValue("cura/material_settings", json.dumps({"a": {"spool_cost": 10.0}}))
+    tools._job = stubs.Job()
+    # the running job would write its settings over the cleared ones
+    tools.clearData()
+    assert json.loads(tools._preferences.getValue("cura/material_settings")) == {"a": {"spool_cost": 10.0}}
+    assert tools.shown_messages == ["Another import or export is still in progress. Try again when it has finished."]
+
+
+def _getMaterialSettings(tools):
+    return json.loads(tools._preferences.getValue("cura/material_settings"))
+
+def _setMaterialSettings(tools, material_settings):
+    tools._preferences.setValue("cura/material_settings", json.dumps(material_settings))
+
+def _restart(tools):
+    tools._closeSharedStore()
+    return type(tools)()
+
+
+def test_sharedStoreRevisionIsKept(tools, tmp_path):
+    path = str(tmp_path / "costs.sqlite")
+    store = SharedCostStore(path)
+    store.upsertMany({"a": {"spool_cost": 10.0}, "b": {"spool_cost": 20.0}})
+
+    tools._preferences.setValue("material_cost_tools/shared_store_path", path)
+    tools._openSharedStore()
+    assert _getMaterialSettings(tools) == {"a": {"spool_cost": 10.0}, "b": {"spool_cost": 20.0}}
+    assert tools._preferences.getValue("material_cost_tools/shared_store_revision") == 1
+
+    # a price that was removed by hand is not synchronized again after a restart
+    _setMaterialSettings(tools, {"a": {"spool_cost": 10.0}})
+    tools = _restart(tools)
+    assert tools._shared_store_revision == 1
+    assert _getMaterialSettings(tools) == {"a": {"spool_cost": 10.0}}
+
+    # rows that changed while Cura was not running are
+    tools._closeSharedStore()
+    store.upsert("c", {"spool_weight": 750})
+    tools = _restart(tools)
+    assert _getMaterialSettings(tools) == {"a": {"spool_cost": 10.0}, "c": {"spool_weight": 750}}
+    assert tools._preferences.getValue("material_cost_tools/shared_store_revision") == 2
+    tools._closeSharedStore()
+    store.close()
+
+def test_sharedStoreReplaced(tools, tmp_path):
+    path = str(tmp_path / "costs.sqlite")
+    store = SharedCostStore(path)
+    store.upsertMany({"a": {"spool_cost": 10.0}})
+    store.close()
+
+    # the revision is of another database that had more changes
+    tools._preferences.setValue("material_cost_tools/shared_store_path", path)
+    tools._preferences.setValue("material_cost_tools/shared_store_revision", "5")
+    tools._openSharedStore()
+    assert _getMaterialSettings(tools) == {"a": {"spool_cost": 10.0}}
+    assert tools._preferences.getValue("material_cost_tools/shared_store_revision") == 1
+    tools._closeSharedStore()
+
+def test_sharedStoreConnect(tools, tmp_path, monkeypatch):
+    path = str(tmp_path / "costs.sqlite")
+    store = SharedCostStore(path)
+    store.upsertMany({"a": {"spool_cost": 10.0}})
+    store.close()
+    tools._preferences.setValue("material_cost_tools/shared_store_revision", 5)
+
+    # connecting to a database starts from the first revision
+    monkeypatch.setattr(tools, "_getSaveFileName", lambda *args, **kwargs: path)
+    tools.connectSharedStore()
+    assert _getMaterialSettings(tools) == {"a": {"spool_cost": 10.0}}
+
+    tools.disconnectSharedStore()
+    assert tools._preferences.getValue("material_cost_tools/shared_store_revision") == 0
+
+def test_sharedStoreClearAndUndo(tools, tmp_path):
+    path = str(tmp_path / "costs.sqlite")
+    # another Cura instance that shares the database
+    other_store = SharedCostStore(path)
+    other_store.upsertMany({"a": {"spool_cost": 10.0, "spool_weight": 750}, "b": {"spool_cost": 20.0}})
+    other_settings = {"a": {"spool_cost": 10.0, "spool_weight": 750}, "b": {"spool_cost": 20.0}}
+
+    tools._preferences.setValue("material_cost_tools/shared_store_path", path)
+    tools._openSharedStore()
+    assert _getMaterialSettings(tools) == other_settings
+    (revision, _) = other_store.getChangesSince(0)
+
+    tools.clearData()
+    (revision, changes) = other_store.getChangesSince(revision)
+    assert changes == {"a": {"spool_cost": None, "spool_weight": None}, "b": {"spool_cost": None, "spool_weight": None}}
+    # the clear is not undone by the next synchronization, nor after a restart
+    tools._syncSharedStore()
+    tools = _restart(tools)
+    assert _getMaterialSettings(tools) == {}
+
+    tools.undoLastChange()
+    assert _getMaterialSettings(tools) == other_settings
+    (revision, changes) = other_store.getChangesSince(revision)
+    assert changes == {"a": {"spool_cost": 10.0, "spool_weight": 750}, "b": {"spool_cost": 20.0, "spool_weight": None}}
+    tools._closeSharedStore()
+    other_store.close()
+
+def test_sharedStoreRemovedElsewhere(tools, tmp_path):
+    path = str(tmp_path / "costs.sqlite")
+    other_store = SharedCostStore(path)
+    other_store.upsertMany({"a": {"spool_cost": 10.0, "spool_weight": 750}, "b": {"spool_cost": 20.0}})
+
+    tools._preferences.setValue("material_cost_tools/shared_store_path", path)
+    tools._openSharedStore()
+    # a price that is only known here is kept
+    settings = _getMaterialSettings(tools)
+    settings["c"] = {"spool_cost": 5.0}
+    _setMaterialSettings(tools, settings)
+
+    other_store.replaceMany({"a": {"spool_weight": 750}, "b": None})
+    tools._syncSharedStore()
+    assert _getMaterialSettings(tools) == {"a": {"spool_weight": 750}, "c": {"spool_cost": 5.0}}
+    tools._closeSharedStore()
+    other_store.close()
+
+def test_watchFolderRetriesWithNewRates(tools, tmp_path):
+    folder = tmp_path / "prices"
+    folder.mkdir()
+    (folder / "prices.csv").write_text("guid,name,weight (g),cost (USD)\n506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9,PLA,1000,25\n", encoding = "utf-8")
+    tools._preferences.setValue("material_cost_tools/watch_folder_path", str(folder))
+    tools._openWatchFolder()
+    assert _getMaterialSettings(tools) == {}
+    assert tools.shown_messages[-1].endswith("Could not import: prices.csv")
+
+    rates_path = tmp_path / "rates.json"
+    rates_path.write_text('{"base": "EUR", "date": "2026-01-05", "rates": {"USD": 1.25}}', encoding = "utf-8")
+    tools._preferences.setValue("material_cost_tools/currency_rates_path", str(rates_path))
+    tools._pollWatchFolder()
+    assert _getMaterialSettings(tools) == {"506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9": {"spool_weight": 1000, "spool_cost": 20.0}}
+    tools._closeWatchFolder()
+
+def test_priceFeedErrors(tools, tmp_path, monkeypatch):
+    (tmp_path / "prices.csv").write_text("guid,name,weight (g),cost (EUR)\n506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9,PLA,750,20\n", encoding = "utf-8")
+    feed_url = (tmp_path / "prices.csv").as_uri()
+    missing_url = (tmp_path / "missing.csv").as_uri()
+
+    tools._preferences.setValue("material_cost_tools/price_feeds", missing_url)
+    tools.syncPriceFeeds()
+    assert tools.shown_messages[-1] == "Could not download: %s" % missing_url
+
+    # the feeds that could not be downloaded are also listed when other feeds are imported
+    notices = []
+    monkeypatch.setattr(tools, "_applyImportJob", lambda job, notice = "": notices.append(notice) or False)
+    tools._preferences.setValue("material_cost_tools/price_feeds", "%s;%s" % (feed_url, missing_url))
+    tools.syncPriceFeeds()
+    assert notices == ["Could not download: %s" % missing_url]
+
+def test_importKeepsChangesMadeDuringDialog(tools, tmp_path, monkeypatch):
+    (tmp_path / "prices.csv").write_text("guid,name,weight (g),cost (EUR)\n506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9,PLA,750,20\n", encoding = "utf-8")
+    _setMaterialSettings(tools, {"a": {"spool_cost": 10.0}})
+    monkeypatch.setattr(tools, "_getOpenFileNames", lambda *args, **kwargs: [str(tmp_path / "prices.csv")])
+
+    # the settings change while the import is waiting for the user, eg by a watch folder or by hand
+    polled_jobs = []
+    def exec(message_box):
+        polled_jobs.append(tools._job)
+        tools._pollWatchFolder()
+        _setMaterialSettings(tools, {"a": {"spool_cost": 12.0}, "b": {"spool_weight": 1000}})
+        return 0
+    monkeypatch.setattr(stubs.QMessageBox, "exec", exec)
+
+    tools.importData()
+    # the job counts as running until it is applied, so nothing else is started in the meantime
+    assert polled_jobs[0] is not None
+    assert tools._job is None
+    assert _getMaterialSettings(tools) == {
+        "a": {"spool_cost": 12.0}, "b": {"spool_weight": 1000}, "506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9": {"spool_weight": 750, "spool_cost": 20.0}
+    }
+    # undoing the import only removes the imported material
+    tools.undoLastChange()
+    assert _getMaterialSettings(tools) == {"a": {"spool_cost": 12.0}, "b": {"spool_weight": 1000}}
+
+def test_sharedStoreSyncDuringImport(tools, tmp_path, monkeypatch):
+    path = str(tmp_path / "costs.sqlite")
+    other_store = SharedCostStore(path)
+    other_store.upsertMany({"a": {"spool_cost": 10.0}})
+    tools._preferences.setValue("material_cost_tools/shared_store_path", path)
+    tools._openSharedStore()
+
+    (tmp_path / "prices.csv").write_text("guid,name,weight (g),cost (EUR)\n506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9,PLA,750,20\n", encoding = "utf-8")
+    monkeypatch.setattr(tools, "_getOpenFileNames", lambda *args, **kwargs: [str(tmp_path / "prices.csv")])
+
+    # another Cura instance changes the database after the import job finished, but before it is applied
+    def exec(message_box):
+        other_store.upsertMany({"a": {"spool_cost": 12.0}, "b": {"spool_weight": 1000}})
+        tools._syncSharedStore()
+        return 0
+    monkeypatch.setattr(stubs.QMessageBox, "exec", exec)
+
+    tools.importData()
+    imported = {"506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9": {"spool_weight": 750, "spool_cost": 20.0}}
+    assert _getMaterialSettings(tools) == dict(imported, a = {"spool_cost": 10.0})
+
+    # the changes are synchronized once the import is applied, and neither side loses anything
+    tools._syncSharedStore()
+    assert _getMaterialSettings(tools) == dict(imported, a = {"spool_cost": 12.0}, b = {"spool_weight": 1000})
+    (_, stored_settings) = other_store.getChangesSince(0)
+    assert stored_settings["506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9"] == {"spool_weight": 750, "spool_cost": 20.0}
+    tools._closeSharedStore()
+    other_store.close()
+
+def test_importErrors(tools, tmp_path, monkeypatch):
+    (tmp_path / "prices.csv").write_text("guid,name,weight (g),cost (EUR)\n506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9,PLA,750,20\n", encoding = "utf-8")
+    file_names = [str(tmp_path / "prices.csv"), str(tmp_path / "missing.csv")]
+    monkeypatch.setattr(tools, "_getOpenFileNames", lambda *args, **kwargs: file_names)
+    monkeypatch.setattr(stubs.QInputDialog, "getItem", staticmethod(lambda parent, title, label, items, current, editable: (items[current], True)), raising = False)
+
+    # the files that could not be imported are listed in the result, not just in the log
+    tools.importData()
+    assert _getMaterialSettings(tools) == {"506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9": {"spool_weight": 750, "spool_cost": 20.0}}
+    assert tools.shown_messages[-1] == "Imported weight & price for 1 material.\nCould not import: missing.csv"
+
+    file_names.remove(str(tmp_path / "prices.csv"))
+    file_names.append(str(tmp_path / "other.csv"))
+    tools.importData()
+    assert tools.shown_messages[-1] == "Could not import settings from the selected file\nCould not import: missing.csv, other.csv"
+
+def test_priceFeedConflictsWithUnchangedFeeds(tools, tmp_path):
+    guid = "506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9"
+    other_guid = "e509f649-9fe6-4b14-ac45-d441438cb4ef"
+    (tmp_path / "a.csv").write_text("guid,name,weight (g),cost (EUR)\n%s,PLA,750,20\n" % guid, encoding = "utf-8")
+    (tmp_path / "b.csv").write_text("guid,name,weight (g),cost (EUR)\n%s,PLA,750,18\n%s,PETG,1000,30\n" % (guid, other_guid), encoding = "utf-8")
+    tools._preferences.setValue("material_cost_tools/price_feeds", "%s;%s" % ((tmp_path / "a.csv").as_uri(), (tmp_path / "b.csv").as_uri()))
+    tools._preferences.setValue("material_cost_tools/import_conflict_policy", "lowest_price")
+    tools.syncPriceFeeds()
+    assert _getMaterialSettings(tools) == {guid: {"spool_weight": 750, "spool_cost": 18.0}, other_guid: {"spool_weight": 1000, "spool_cost": 30.0}}
+
+    # the lowest price is still in the feed that did not change, and a price edited by hand is left alone
+    settings = _getMaterialSettings(tools)
+    settings[other_guid]["spool_cost"] = 28.0
+    _setMaterialSettings(tools, settings)
+    (tmp_path / "a.csv").write_text("guid,name,weight (g),cost (EUR)\n%s,PLA,750,19\n" % guid, encoding = "utf-8")
+    tools.syncPriceFeeds()
+    assert _getMaterialSettings(tools) == {guid: {"spool_weight": 750, "spool_cost": 18.0}, other_guid: {"spool_weight": 1000, "spool_cost": 28.0}}
+
+    (tmp_path / "a.csv").write_text("guid,name,weight (g),cost (EUR)\n%s,PLA,750,17\n" % guid, encoding = "utf-8")
+    tools.syncPriceFeeds()
+    assert _getMaterialSettings(tools)[guid] == {"spool_weight": 750, "spool_cost": 17.0}
+
+def test_gcodeCostReport(tools, tmp_path, monkeypatch):
+    (tmp_path / "a.gcode").write_text(";Filament used: 1m\n;MATERIAL:506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9\n", encoding = "utf-8")
+    (tmp_path / "b.gcode").write_text("G28\n", encoding = "utf-8")
+    report_path = tmp_path / "costs.csv"
+    monkeypatch.setattr(tools, "_getOpenFileNames", lambda *args, **kwargs: [str(tmp_path / "a.gcode"), str(tmp_path / "b.gcode")])
+    monkeypatch.setattr(tools, "_getSaveFileName", lambda *args, **kwargs: str(report_path))
+    monkeypatch.setattr(tools._getCatalog(), "getByGuid", lambda guid: {"properties": {"density": "1.24", "diameter": "1.75"}})
+    _setMaterialSettings(tools, {"506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9": {"spool_weight": 1000, "spool_cost": 25.0}})
+
+    tools.costGcodeFiles()
+    assert tools.shown_messages[-1] == "Estimated a total cost of 0.07 € for 2 files. 1 file could not be fully costed."
+    assert report_path.read_text(encoding = "utf-8").splitlines()[-1] == "total,,,,2.98,0.07,"
+
+def test_partialUndoIsShared(tools, tmp_path):
+    guid = "506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9"
+    path = str(tmp_path / "costs.sqlite")
+    other_store = SharedCostStore(path)
+    tools._preferences.setValue("material_cost_tools/shared_store_path", path)
+    tools._openSharedStore()
+
+    tools._recordJournal("import", "first", {guid: None}, {guid: {"spool_cost": 12.0}})
+    # edited by hand between the imports
+    _setMaterialSettings(tools, {guid: {"spool_cost": 11.0}})
+    tools._recordJournal("import", "second", {guid: {"spool_cost": 11.0}}, {guid: {"spool_cost": 13.0}})
+    _setMaterialSettings(tools, {guid: {"spool_cost": 13.0}})
+    (revision, _) = other_store.getChangesSince(0)
+
+    tools._revertJournal(1)
+    assert _getMaterialSettings(tools) == {guid: {"spool_cost": 11.0}}
+    assert tools.shown_messages[-1] == "Restored the weight & price of 1 material."
+    # the change is also made in the shared database and the price history
+    (_, changes) = other_store.getChangesSince(revision)
+    assert changes == {guid: {"spool_cost": 11.0, "spool_weight": None}}
+    assert tools._getPriceHistory().getHistory(guid)[-1][1:] == (11.0, None)
+    tools._closeSharedStore()
+    other_store.close()
@@ -0,0 +1,67 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import pytest
+
+from MaterialCostTools.MaterialNameIndex import MaterialNameIndex
+
+
+def _material(guid, brand, name, material = "PLA", diameter = "1.75"):
+    return {"GUID": guid, "brand": brand, "name": name, "material": material, "properties": {"diameter": diameter}}
+
+@pytest.fixture
+def index():
+    return MaterialNameIndex([
+        _material("generic_pla", "Generic", "PLA", diameter = "2.85"),
+        _material("generic_petg", "Generic", "PETG", material = "PETG", diameter = "2.85"),
+        _material("galaxy_black", "Prusament", "PLA Galaxy Black"),
+        _material("yellow_175", "Fillamentum", "PLA Extrafill Traffic Yellow"),
+        _material("yellow_285", "Fillamentum", "PLA Extrafill Traffic Yellow", diameter = "2.85"),
+        _material("economie", "Filament Öko", "Économie PLA"),
+        # a duplicate GUID is only indexed once
+        _material("generic_pla", "Other", "Material")
+    ])
+
+def _matched(index, text):
+    return index.match(text)[0]
+
+
+def test_tokenize():
+    assert MaterialNameIndex.tokenize("Économie PLA 1,75mm Ø") == ["economie", "pla", "175", "mm"]
+
+def test_exactMatch(index):
+    assert len(index) == 6
+    assert index.getName("generic_pla") == "Generic PLA"
+    assert index.match("Generic PLA") == ("generic_pla", [("generic_pla", "Generic PLA", 1.0)])
+    # regardless of case, spacing and the order of the words
+    assert _matched(index, "generic   pla") == "generic_pla"
+    assert _matched(index, "PLA Generic") == "generic_pla"
+
+def test_normalizedMatch(index):
+    # accents and other marks are removed, in the text as well as in the index
+    assert _matched(index, "filament oko economie pla") == "economie"
+    assert _matched(index, "Filament Öko Économie PLA") == "economie"
+    assert _matched(index, "Prusament Galaxy Black PLA 1.75") == "galaxy_black"
+    # a typo in a rare word is corrected
+    assert _matched(index, "Prusment PLA Galaxy Black") == "galaxy_black"
+
+def test_ambiguousMatch(index):
+    # the same name for two diameters
+    (guid, matches) = index.match("Fillamentum PLA Extrafill Traffic Yellow")
+    assert guid is None
+    assert sorted(match[0] for match in matches) == ["yellow_175", "yellow_285"]
+    # which the diameter decides, in either notation
+    assert _matched(index, "Fillamentum PLA Extrafill Traffic Yellow 1,75") == "yellow_175"
+    assert _matched(index, "Fillamentum Extrafill Traffic Yellow 2.85mm") == "yellow_285"
+
+    # a brand alone matches its materials, but not well enough to pick one
+    (guid, matches) = index.match("Generic")
+    assert guid is None
+    assert matches and all(match[2] < MaterialNameIndex.ACCEPT_SCORE for match in matches)
+
+def test_noMatch(index):
+    for text in ("", "---", "PLA", "ColorFabb nGen", "Generic ABS"):
+        assert index.match(text) == (None, [])
+    # another material of the same product line, or a name with too many typos, is not taken for the indexed one
+    assert _matched(index, "Prusament PETG Galaxy Black") is None
+    assert _matched(index, "Prusament PLA Galaxy Blak") is None
@@ -0,0 +1,82 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import os
+
+import pytest
+
+from MaterialCostTools.MultiFileImport import MultiFileImport, LAST_FILE_WINS, LOWEST_PRICE, NEWEST_FILE
+
+GUID = "506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9"
+OTHER_GUID = "e509f649-9fe6-4b14-ac45-d441438cb4ef"
+
+
+# Writes price lists with the weight and cost of GUID and OTHER_GUID, oldest first
+@pytest.fixture
+def file_names(tmp_path):
+    lists = [
+        ("a.csv", "750,20", "1000,30"),
+        ("b.csv", "750,18", "1000,30"),
+        ("c.csv", "1000,25", "")
+    ]
+    file_names = []
+    for (index, (name, values, other_values)) in enumerate(lists):
+        path = tmp_path / name
+        text = "guid,name,weight (g),cost (EUR)\n%s,PLA,%s\n" % (GUID, values)
+        if other_values:
+            text += "%s,PETG,%s\n" % (OTHER_GUID, other_values)
+        path.write_text(text, encoding = "utf-8")
+        os.utime(str(path), (1000 + index, 1000 + index))
+        file_names.append(str(path))
+    return file_names
+
+def _merge(file_names, policy):
+    multi_file_import = MultiFileImport(file_names, policy)
+    assert multi_file_import.parse()
+    return (multi_file_import.merge(), multi_file_import.getConflicts())
+
+def test_lastFile(file_names):
+    (merged, conflicts) = _merge(file_names, LAST_FILE_WINS)
+    assert merged == {GUID: {"spool_weight": 1000, "spool_cost": 25.0}, OTHER_GUID: {"spool_weight": 1000, "spool_cost": 30.0}}
+    # a material with the same values in every file is not a conflict
+    assert [(conflict["guid"], conflict["chosen"]) for conflict in conflicts] == [(GUID, file_names[2])]
+    assert [source[0] for source in conflicts[0]["sources"]] == file_names
+
+def test_lowestPrice(file_names):
+    (merged, conflicts) = _merge(file_names, LOWEST_PRICE)
+    assert merged[GUID] == {"spool_weight": 750, "spool_cost": 18.0}
+    assert [(conflict["guid"], conflict["chosen"]) for conflict in conflicts] == [(GUID, file_names[1])]
+
+def test_newestFile(file_names):
+    # the order in which the files were selected does not matter, only when they were modified
+    (merged, conflicts) = _merge(list(reversed(file_names)), NEWEST_FILE)
+    assert merged[GUID] == {"spool_weight": 1000, "spool_cost": 25.0}
+    assert [(conflict["guid"], conflict["chosen"]) for conflict in conflicts] == [(GUID, file_names[2])]
+
+    os.utime(file_names[0], (2000, 2000))
+    (merged, conflicts) = _merge(file_names, NEWEST_FILE)
+    assert merged[GUID] == {"spool_weight": 750, "spool_cost": 20.0}
+    assert [(conflict["guid"], conflict["chosen"]) for conflict in conflicts] == [(GUID, file_names[0])]
+
+def test_errors(file_names, tmp_path):
+    missing_file_name = str(tmp_path / "missing.csv")
+    multi_file_import = MultiFileImport([missing_file_name] + file_names[:1])
+    assert multi_file_import.parse()
+    assert list(multi_file_import.getErrors()) == [missing_file_name]
+    assert [result["file"] for result in multi_file_import.getResults()] == file_names[:1]
+
+    with pytest.raises(ValueError):
+        MultiFileImport(file_names, "first_file")
+
+def test_referenceFiles(file_names):
+    multi_file_import = MultiFileImport(file_names[:1], LOWEST_PRICE)
+    multi_file_import.reference_file_names = file_names[1:]
+    assert multi_file_import.parse()
+    # the reference files take part in the conflicts of the materials in the other files, but do not add materials
+    assert multi_file_import.merge() == {GUID: {"spool_weight": 750, "spool_cost": 18.0}, OTHER_GUID: {"spool_weight": 1000, "spool_cost": 30.0}}
+    assert [result["file"] for result in multi_file_import.getResults()] == file_names[:1]
+
+    multi_file_import = MultiFileImport(file_names[2:], LOWEST_PRICE)
+    multi_file_import.reference_file_names = file_names[:2]
+    assert multi_file_import.parse()
+    assert multi_file_import.merge() == {GUID: {"spool_weight": 750, "spool_cost": 18.0}}
@@ -0,0 +1,186 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import email.utils
+import gzip
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from MaterialCostTools.PriceFeeds import PriceFeeds
+
+PRICE_LIST = b"guid,name,weight (g),cost (EUR)\n506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9,Generic PLA,750,20\n"
+
+
+# Serves price lists from memory: etag.csv with an ETag and gzip encoding, modified.csv with a
+# Last-Modified header, plain.csv without either, and slow.csv which takes very long to send
+class PriceListServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), PriceListHandler)
+        self.files = {"etag.csv": PRICE_LIST, "modified.csv": PRICE_LIST, "plain.csv": PRICE_LIST}
+        self.modified = time.time() - 3600
+        self.requests = []  # type: list
+
+    def getUrl(self, name: str) -> str:
+        return "http://127.0.0.1:%d/%s" % (self.server_address[1], name)
+
+    def getStatuses(self) -> dict:
+        return {path.lstrip("/"): status for (path, headers, status) in self.requests}
+
+class PriceListHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        name = self.path.lstrip("/")
+        if name == "slow.csv":
+            self._sendSlowly()
+            return
+        data = self.server.files.get(name)
+        if data is None:
+            self._respond(404)
+            return
+
+        etag = '"%s"' % hashlib.sha1(data).hexdigest()
+        last_modified = email.utils.formatdate(self.server.modified, usegmt = True)
+        if name == "etag.csv" and self.headers.get("If-None-Match") == etag or name == "modified.csv" and self.headers.get("If-Modified-Since") == last_modified:
+            self._respond(304)
+            return
+
+        headers = {}
+        if name == "etag.csv":
+            headers["ETag"] = etag
+            if "gzip" in (self.headers.get("Accept-Encoding") or ""):
+                data = gzip.compress(data)
+                headers["Content-Encoding"] = "gzip"
+        elif name == "modified.csv":
+            headers["Last-Modified"] = last_modified
+        self._respond(200, headers, data)
+
+    def _respond(self, status: int, headers: dict = {}, data: bytes = b"") -> None:
+        self.server.requests.append((self.path, dict(self.headers), status))
+        self.send_response(status)
+        for (key, value) in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _sendSlowly(self) -> None:
+        self.server.requests.append((self.path, dict(self.headers), 200))
+        chunk = b"x" * PriceFeeds.CHUNK_SIZE
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(chunk) * 1000))
+        self.end_headers()
+        try:
+            for _ in range(1000):
+                self.wfile.write(chunk)
+                time.sleep(0.05)
+        except EnvironmentError:
+            # the client stopped reading
+            pass
+
+
+@pytest.fixture
+def server():
+    price_list_server = PriceListServer()
+    thread = threading.Thread(target = price_list_server.serve_forever, kwargs = {"poll_interval": 0.05}, daemon = True)
+    thread.start()
+    yield price_list_server
+    price_list_server.shutdown()
+    price_list_server.server_close()
+
+def _makePriceFeeds(server, tmp_path, names):
+    return PriceFeeds([server.getUrl(name) for name in names], str(tmp_path / "feeds"), str(tmp_path / "feeds.json"))
+
+
+def test_conditionalRequests(server, tmp_path):
+    names = ["etag.csv", "modified.csv", "plain.csv", "missing.csv"]
+    price_feeds = _makePriceFeeds(server, tmp_path, names)
+    file_names = price_feeds.fetch()
+    assert [os.path.basename(file_name).split("-")[0] for file_name in file_names] == ["etag", "modified", "plain"]
+    for file_name in file_names:
+        with open(file_name, "rb") as feed_file:
+            assert feed_file.read() == PRICE_LIST
+    assert list(price_feeds.getErrors()) == [server.getUrl("missing.csv")]
+    # the modification time of the file is that of the feed
+    assert int(os.path.getmtime(file_names[1])) == int(server.modified)
+    price_feeds.commit()
+
+    # the second time, the server is asked whether the feeds changed
+    server.requests = []
+    price_feeds = _makePriceFeeds(server, tmp_path, names)
+    assert price_feeds.fetch() == []
+    assert server.getStatuses() == {"etag.csv": 304, "modified.csv": 304, "plain.csv": 200, "missing.csv": 404}
+    requests = {path.lstrip("/"): headers for (path, headers, _) in server.requests}
+    assert requests["etag.csv"]["If-None-Match"] == '"%s"' % hashlib.sha1(PRICE_LIST).hexdigest()
+    assert requests["modified.csv"]["If-Modified-Since"] == email.utils.formatdate(server.modified, usegmt = True)
+    # the feed without validators is downloaded again, but did not change
+    assert [result["status"] for result in price_feeds.getResults()] == [PriceFeeds.UNCHANGED] * 3
+    price_feeds.commit()
+
+    # a feed that changed is downloaded again
+    server.files["modified.csv"] = PRICE_LIST.replace(b",20\n", b",22\n")
+    server.modified += 60
+    price_feeds = _makePriceFeeds(server, tmp_path, names)
+    file_names = price_feeds.fetch()
+    assert [os.path.basename(file_name).split("-")[0] for file_name in file_names] == ["modified"]
+    with open(file_names[0], "rb") as feed_file:
+        assert feed_file.read() == server.files["modified.csv"]
+
+def test_uncommittedState(server, tmp_path):
+    price_feeds = _makePriceFeeds(server, tmp_path, ["etag.csv"])
+    assert len(price_feeds.fetch()) == 1
+    # the feed was not imported, so it is offered again
+    server.requests = []
+    assert len(_makePriceFeeds(server, tmp_path, ["etag.csv"]).fetch()) == 1
+    assert "If-None-Match" not in server.requests[0][1]
+
+def test_missingDownload(server, tmp_path):
+    price_feeds = _makePriceFeeds(server, tmp_path, ["etag.csv"])
+    (file_name, ) = price_feeds.fetch()
+    price_feeds.commit()
+    os.remove(file_name)
+
+    # the server is not asked whether the feed changed if the last download is gone
+    server.requests = []
+    assert _makePriceFeeds(server, tmp_path, ["etag.csv"]).fetch() == [file_name]
+    assert server.getStatuses() == {"etag.csv": 200}
+    assert "If-None-Match" not in server.requests[0][1]
+
+def test_unsupportedUrl(tmp_path):
+    price_feeds = PriceFeeds(["ftp://example.com/prices.csv"], str(tmp_path / "feeds"), str(tmp_path / "feeds.json"))
+    assert price_feeds.fetch() == []
+    assert price_feeds.getErrors() == {"ftp://example.com/prices.csv": "Unsupported URL: ftp://example.com/prices.csv"}
+
+def test_stopBeforeDownloading(server, tmp_path):
+    price_feeds = _makePriceFeeds(server, tmp_path, ["etag.csv", "plain.csv"])
+    price_feeds.continue_callback = lambda: False
+    assert price_feeds.fetch() == []
+    assert server.requests == []
+
+def test_stopWhileDownloading(server, tmp_path):
+    price_feeds = _makePriceFeeds(server, tmp_path, ["slow.csv", "etag.csv"])
+    # stop once the slow feed has been downloading for a while
+    started = time.monotonic()
+    price_feeds.continue_callback = lambda: time.monotonic() - started < 0.5
+
+    assert price_feeds.fetch() == []
+    # without the checks, this would take until the whole feed was sent
+    assert time.monotonic() - started < 5
+
+    # the partial download is removed once the download thread notices the stop
+    for _ in range(50):
+        if not any(name.startswith(".") for name in os.listdir(str(tmp_path / "feeds"))):
+            break
+        time.sleep(0.1)
+    assert [name for name in os.listdir(str(tmp_path / "feeds")) if "slow" in name] == []
+    # nothing can be committed
+    price_feeds.commit()
+    assert _makePriceFeeds(server, tmp_path, ["etag.csv"]).fetch() != []
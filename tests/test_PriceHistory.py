@@ -0,0 +1,72 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import io
+
+from MaterialCostTools.PriceHistory import PriceHistory
+
+PLA = "506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9"
+PETG = "e509f649-9fe6-4b14-ac45-d441438cb4ef"
+ABS = "2f9d2279-9b0e-4765-bf9b-d1e1e13f3c49"
+
+
+def test_history(tmp_path):
+    history = PriceHistory(str(tmp_path / "history.bin"))
+    assert history.append({PLA: {"spool_cost": 20.0, "spool_weight": 750}, "not a guid": {"spool_cost": 1.0}}, 1000) == 1
+    assert history.append({PLA.upper(): {"spool_cost": 22.5}, PETG: {"spool_weight": 1000}}, 2000) == 2
+    assert history.append({}, 3000) == 0
+
+    history = PriceHistory(history.getPath())
+    assert len(history) == 3
+    assert history.getGuids() == [PLA, PETG]
+    assert history.getHistory(PLA) == [(1000, 20.0, 750), (2000, 22.5, None)]
+    assert history.getCostAt(PLA, 1500) == 20.0
+    assert history.getValuesAt(PLA, 999) is None
+    assert history.getSettingsAt(2000) == {PLA: {"spool_cost": 22.5}, PETG: {"spool_weight": 1000}}
+
+    csv_file = io.StringIO()
+    assert history.writeCsv(csv_file, guids = [PETG], names = {PETG: "Generic PETG"}) == 1
+    assert csv_file.getvalue().splitlines()[1].startswith(PETG + ",Generic PETG,")
+
+def test_otherInstance(tmp_path):
+    path = str(tmp_path / "history.bin")
+    history = PriceHistory(path)
+    other_history = PriceHistory(path)
+    history.append({PLA: {"spool_cost": 20.0}}, 1000)
+    assert len(other_history) == 1
+
+    # the other instance adds a material, after which this instance adds another one; both are kept with their own GUID
+    other_history.append({PETG: {"spool_cost": 25.0}}, 2000)
+    history.append({ABS: {"spool_cost": 30.0}, PLA: {"spool_cost": 21.0}}, 3000)
+    other_history.append({ABS: {"spool_cost": 31.0}}, 4000)
+    assert history.getHistory(PETG) == [(2000, 25.0, None)]
+    assert other_history.getHistory(ABS) == [(3000, 30.0, None), (4000, 31.0, None)]
+
+    history = PriceHistory(path)
+    assert history.getGuids() == [PLA, PETG, ABS]
+    assert history.getHistory(PLA) == [(1000, 20.0, None), (3000, 21.0, None)]
+    assert history.getHistory(PETG) == [(2000, 25.0, None)]
+    assert history.getHistory(ABS) == [(3000, 30.0, None), (4000, 31.0, None)]
+
+def test_interruptedWrite(tmp_path):
+    path = tmp_path / "history.bin"
+    history = PriceHistory(str(path))
+    history.append({PLA: {"spool_cost": 20.0}}, 1000)
+    # half a chunk, as left by a write that was interrupted
+    valid_data = path.read_bytes()
+    path.write_bytes(valid_data + valid_data[:20])
+
+    history = PriceHistory(str(path))
+    assert len(history) == 1
+    history.append({PETG: {"spool_cost": 25.0}}, 2000)
+    assert PriceHistory(str(path)).getHistory(PETG) == [(2000, 25.0, None)]
+    assert path.stat().st_size == 2 * len(valid_data)
+
+def test_largeValues(tmp_path):
+    history = PriceHistory(str(tmp_path / "history.bin"))
+    # weights that do not fit in the file are recorded as missing, instead of failing to record the others
+    history.append({PLA: {"spool_weight": 2 ** 31, "spool_cost": 1e300}, PETG: {"spool_weight": 2 ** 31 - 1}, ABS: {"spool_weight": float("inf")}}, 1000)
+    history = PriceHistory(history.getPath())
+    assert history.getHistory(PLA) == [(1000, float("inf"), None)]
+    assert history.getHistory(PETG) == [(1000, None, 2 ** 31 - 1)]
+    assert history.getHistory(ABS) == [(1000, None, None)]
@@ -0,0 +1,117 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import io
+import struct
+import uuid
+import zlib
+
+import pytest
+
+from MaterialCostTools.PriceSnapshot import PriceSnapshot
+
+SETTINGS = {
+    "506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9": {"spool_cost": 20.5, "spool_weight": 750},
+    "0e01be8c-e425-4fb1-b4a3-b79f255f1db9": {"spool_cost": 33.25},
+    "86a89ceb-4159-47f6-ab97-e9953803d70f": {"spool_weight": 1000},
+}
+
+
+def _write(material_settings, currency = "€"):
+    snapshot_file = io.BytesIO()
+    count = PriceSnapshot.write(snapshot_file, material_settings, currency)
+    return (count, snapshot_file.getvalue())
+
+
+def test_roundTrip():
+    material_settings = dict(SETTINGS)
+    # materials without a weight or a price, and materials that are not stored by GUID, are skipped
+    material_settings["44a029e6-e31b-4c9e-a12f-9282e29a92ff"] = {}
+    material_settings["not a guid"] = {"spool_cost": 10}
+    (count, data) = _write(material_settings)
+    assert count == 3
+
+    snapshot = PriceSnapshot(data)
+    assert len(snapshot) == 3
+    assert snapshot.getCurrency() == "€"
+    assert snapshot.getSettings() == SETTINGS
+
+def test_costFactor():
+    (_, data) = _write(SETTINGS)
+    settings = dict(PriceSnapshot(data).iterRows(cost_factor = 2.0))
+    assert settings["506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9"] == {"spool_cost": 41.0, "spool_weight": 750}
+
+def test_load(tmp_path):
+    path = str(tmp_path / "prices.mctsnap")
+    with open(path, "wb") as snapshot_file:
+        PriceSnapshot.write(snapshot_file, SETTINGS, "$")
+    assert PriceSnapshot.isSnapshot(path)
+    assert PriceSnapshot.load(path).getSettings() == SETTINGS
+
+def test_checksum():
+    (_, data) = _write(SETTINGS)
+    damaged = bytearray(data)
+    damaged[-1] ^= 0xff
+    with pytest.raises(ValueError, match = "checksum"):
+        PriceSnapshot(damaged)
+    # the checksum is only verified on request
+    assert len(PriceSnapshot(damaged, verify = False)) == 3
+
+def test_truncated():
+    (_, data) = _write(SETTINGS)
+    with pytest.raises(ValueError, match = "truncated"):
+        PriceSnapshot(data[:-4])
+    with pytest.raises(ValueError, match = "too short"):
+        PriceSnapshot(data[:PriceSnapshot.HEADER.size - 1])
+
+def test_notSnapshot():
+    with pytest.raises(ValueError, match = "not a price snapshot"):
+        PriceSnapshot(b"guid,name,weight,cost\n" * 2)
+
+def test_newerVersion():
+    (_, data) = _write(SETTINGS)
+    newer = bytearray(data)
+    newer[4:6] = (PriceSnapshot.VERSION + 1).to_bytes(2, "little")
+    with pytest.raises(ValueError, match = "not supported"):
+        PriceSnapshot(newer)
+
+def test_longCurrency():
+    with pytest.raises(ValueError, match = "too long"):
+        _write(SETTINGS, "dollars and cents")
+
+def test_outOfRange():
+    material_settings = dict(SETTINGS)
+    material_settings["44a029e6-e31b-4c9e-a12f-9282e29a92ff"] = {"spool_cost": 10.0, "spool_weight": 2 ** 31}
+    material_settings["d9549dba-5b8e-4ec2-9b27-9b0d7a0d3b93"] = {"spool_weight": -5}
+    material_settings["f3e5d1b3-2a2c-4f44-8b6a-55b3bdb2f4c1"] = {"spool_cost": float("inf")}
+    material_settings["not a guid"] = {"spool_cost": 10.0}
+    skipped_rows = []
+    count = PriceSnapshot.write(io.BytesIO(), material_settings, "€", skipped_rows = skipped_rows)
+    assert count == 3
+    assert [guid for (guid, _) in skipped_rows] == [
+        "44a029e6-e31b-4c9e-a12f-9282e29a92ff", "d9549dba-5b8e-4ec2-9b27-9b0d7a0d3b93", "f3e5d1b3-2a2c-4f44-8b6a-55b3bdb2f4c1", "not a guid"
+    ]
+    assert skipped_rows[0][1] == "Weight 2147483648 is out of range"
+
+def test_unusableValues():
+    # a snapshot that was not written by PriceSnapshot.write
+    (_, data) = _write({"506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9": {"spool_cost": 20.5, "spool_weight": 750}})
+    body = bytearray(data[PriceSnapshot.HEADER.size:])
+    body[16:20] = struct.pack("<f", float("inf"))
+    body[20:24] = struct.pack("<i", -5)
+    header = bytearray(data[:PriceSnapshot.HEADER.size])
+    header[-4:] = struct.pack("<I", zlib.crc32(body))
+    assert PriceSnapshot(bytes(header + body)).getSettings() == {"506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9": {}}
+
+def test_chunkCallback():
+    material_settings = {str(uuid.UUID(int = index + 1)): {"spool_cost": float(index)} for index in range(PriceSnapshot.CHUNK_SIZE * 2 + 1)}
+    calls = []
+    def onChunk(index, total_count):
+        calls.append((index, total_count))
+        return True
+    assert PriceSnapshot.write(io.BytesIO(), material_settings, "€", onChunk) == len(material_settings)
+    assert calls == [(0, 1001), (500, 1001), (1000, 1001)]
+
+    snapshot_file = io.BytesIO()
+    assert PriceSnapshot.write(snapshot_file, material_settings, "€", lambda index, total_count: index == 0) is None
+    assert snapshot_file.getvalue() == b""
@@ -0,0 +1,143 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import io
+
+from MaterialCostTools.RowValidator import RowValidator, ValidationReport, AMBIGUOUS_DECIMAL_COMMA, DECIMAL_COMMA, INVALID_COST, INVALID_WEIGHT, MALFORMED_GUID, MAX_WEIGHT, MISSING_COLUMNS, NEGATIVE_COST, NEGATIVE_WEIGHT, UNKNOWN_GUID
+
+GUID = "506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9"
+OTHER_GUID = "0e01be8c-e425-4fb1-b4a3-b79f255f1db9"
+
+
+def test_validRows():
+    validator = RowValidator()
+    (rows, invalid_count) = validator.validateChunk([[GUID, "Generic PLA", "750", "20.5"], [OTHER_GUID, "", "", "3"]], 2)
+    assert rows == [(GUID, {"spool_weight": 750, "spool_cost": 20.5}), (OTHER_GUID, {"spool_cost": 3.0})]
+    assert invalid_count == 0
+    assert validator.getReport().isEmpty()
+
+def test_invalidRows():
+    validator = RowValidator()
+    (rows, invalid_count) = validator.validateChunk([
+        ["not a guid", "", "750", "20"],
+        [GUID, "Generic PLA"],
+        [GUID, "", "750", "-20"],
+        [GUID, "", "abc", "def"],
+    ], 2)
+    # the row with a negative cost still has a valid weight
+    assert rows == [(GUID, {"spool_weight": 750})]
+    assert invalid_count == 3
+
+    report = validator.getReport()
+    assert report.getCount(MALFORMED_GUID) == 1
+    assert report.getCount(MISSING_COLUMNS) == 1
+    assert report.getCount(NEGATIVE_COST) == 1
+    assert report.getCount(INVALID_COST) == 1
+    assert report.getCount(INVALID_WEIGHT) == 1
+    assert report.getErrorCount() == 5
+
+def test_fractionalWeight():
+    validator = RowValidator()
+    (rows, invalid_count) = validator.validateChunk([[GUID, "", "750.5", ""]], 2)
+    assert rows == []
+    assert invalid_count == 1
+    assert validator.getReport().getCount(INVALID_WEIGHT) == 1
+
+def test_infiniteCost():
+    validator = RowValidator()
+    (rows, invalid_count) = validator.validateChunk([[GUID, "", "750", "1e400"], [GUID, "", "", "1e400"]], 2)
+    # the weight of the first row is still imported
+    assert rows == [(GUID, {"spool_weight": 750})]
+    assert invalid_count == 1
+    assert validator.getReport().getCount(INVALID_COST) == 2
+
+def test_convertedCostOverflows():
+    validator = RowValidator()
+    validator.cost_factor = 1e308
+    (rows, invalid_count) = validator.validateChunk([[GUID, "", "", "1000"]], 2)
+    assert rows == []
+    assert invalid_count == 1
+    assert validator.getReport().getCount(INVALID_COST) == 1
+
+def test_infiniteWeight():
+    validator = RowValidator()
+    # this used to raise an OverflowError, which aborted the import
+    (rows, invalid_count) = validator.validateChunk([[GUID, "", "1e400", "20"], [GUID, "", "1e400", ""]], 2)
+    assert rows == [(GUID, {"spool_cost": 20.0})]
+    assert invalid_count == 1
+    assert validator.getReport().getCount(INVALID_WEIGHT) == 2
+
+def test_largeWeight():
+    validator = RowValidator()
+    (rows, invalid_count) = validator.validateChunk([[GUID, "", str(MAX_WEIGHT), ""], [GUID, "", str(MAX_WEIGHT + 1), ""], [GUID, "", "3e9", ""]], 2)
+    assert rows == [(GUID, {"spool_weight": MAX_WEIGHT})]
+    assert invalid_count == 2
+    assert validator.getReport().getCount(INVALID_WEIGHT) == 2
+
+def test_decimalComma():
+    validator = RowValidator()
+    (rows, _) = validator.validateChunk([[GUID, "", "750", "20,5"]], 2)
+    assert rows == [(GUID, {"spool_weight": 750, "spool_cost": 20.5})]
+    assert validator.getReport().getCount(DECIMAL_COMMA) == 1
+    assert validator.getReport().getErrorCount() == 0
+
+def test_ambiguousDecimalComma():
+    validator = RowValidator()
+    # "1,000" could be 1 or 1000, so it is not guessed; a lone zero can not have a thousands separator
+    (rows, invalid_count) = validator.validateChunk([[GUID, "", "1,000", "20,50"], [GUID, "", "", "1,250"], [GUID, "", "", "0,750"]], 2)
+    assert rows == [(GUID, {"spool_cost": 20.5}), (GUID, {"spool_cost": 0.75})]
+    assert invalid_count == 1
+    assert validator.getReport().getCount(AMBIGUOUS_DECIMAL_COMMA) == 2
+    assert validator.getReport().getCount(DECIMAL_COMMA) == 2
+    assert validator.getReport().getErrorCount() == 2
+
+def test_unknownGuid():
+    validator = RowValidator(is_known_guid = lambda guid: guid == GUID)
+    (rows, _) = validator.validateChunk([[GUID, "", "750", "20"], [OTHER_GUID, "", "750", "20"]], 2)
+    assert len(rows) == 2
+    assert validator.getReport().getCount(UNKNOWN_GUID) == 1
+    assert validator.getReport().getErrorCount() == 0
+
+def test_costFactor():
+    validator = RowValidator()
+    validator.cost_factor = 1.1
+    (rows, _) = validator.validateChunk([[GUID, "", "", "20"]], 2)
+    assert rows == [(GUID, {"spool_cost": 22.0})]
+
+def test_nameResolver():
+    validator = RowValidator()
+    validator.name_resolver = lambda text: (GUID, [(GUID, "Generic PLA", 1.0)]) if text == "Generic PLA" else (None, [])
+    (rows, invalid_count) = validator.validateChunk([["", "Generic PLA", "750", "20"], ["", "Unknown", "750", "20"]], 2)
+    assert rows == [(GUID, {"spool_weight": 750, "spool_cost": 20.0})]
+    assert invalid_count == 1
+
+def test_reportCsv():
+    report = ValidationReport("prices.csv")
+    validator = RowValidator(report = report)
+    validator.validateChunk([["not a guid", "Generic PLA", "750", "20"]], 5)
+
+    csv_file = io.StringIO()
+    assert report.writeCsv(csv_file) == 1
+    lines = csv_file.getvalue().splitlines()
+    assert lines[0].startswith("file,line,severity,issue")
+    assert lines[1] == "prices.csv,5,error,malformed_guid,UUID is malformed,not a guid,Generic PLA,750,20,"
+
+def test_reportSamples():
+    report = ValidationReport("a.csv")
+    validator = RowValidator(report = report)
+    rows = [["not a guid", "", "750", "20"]] * 150 + [[GUID, "", "-1", "20"]] * 3
+    validator.validateChunk(rows, 2)
+    # every issue is counted, but only the first rows of every kind are kept
+    assert report.getCounts() == {MALFORMED_GUID: 150, NEGATIVE_WEIGHT: 3}
+    assert report.writeCsv(io.StringIO()) == ValidationReport.MAX_SAMPLES + 3
+
+    merged = ValidationReport()
+    other_report = ValidationReport("b.csv")
+    other_report.addIssue(2, MALFORMED_GUID, ["also not a guid", "", "", ""])
+    other_report.addIssue(3, INVALID_COST, [GUID, "", "", "x"])
+    merged.extend(report)
+    merged.extend(other_report)
+    assert merged.getCounts() == {MALFORMED_GUID: 151, NEGATIVE_WEIGHT: 3, INVALID_COST: 1}
+    csv_file = io.StringIO()
+    assert merged.writeCsv(csv_file) == ValidationReport.MAX_SAMPLES + 4
+    assert csv_file.getvalue().splitlines()[-1].startswith("b.csv,3,error,invalid_cost")
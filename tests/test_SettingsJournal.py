@@ -0,0 +1,84 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+from MaterialCostTools.SettingsJournal import SettingsJournal
+
+
+def test_makeChanges():
+    before = {"a": {"spool_cost": 10}, "b": {"spool_cost": 20}, "c": {}}
+    after = {"a": {"spool_cost": 10}, "b": {"spool_cost": 25}, "d": {"spool_weight": 750}}
+    assert SettingsJournal.makeChanges(before, after) == {
+        "b": ({"spool_cost": 20}, {"spool_cost": 25}),
+        "d": (None, {"spool_weight": 750})
+    }
+
+def test_recordAndRevert(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = SettingsJournal(path)
+    assert journal.record("import", "nothing", {}) is None
+
+    first_id = journal.record("import", "first", {"a": (None, {"spool_cost": 10})}, timestamp = 1.0)
+    second_id = journal.record("import", "second", {"a": ({"spool_cost": 10}, {"spool_cost": 12}), "b": ({"spool_cost": 5}, None)}, timestamp = 2.0)
+    assert (first_id, second_id) == (1, 2)
+
+    # the journal is read back from the file
+    journal = SettingsJournal(path)
+    assert len(journal) == 2
+    assert journal.getLastEntry() == {"id": 2, "time": 2.0, "action": "import", "description": "second", "material_count": 2}
+
+    material_settings = {"a": {"spool_cost": 12}, "c": {"spool_weight": 500}}
+    assert journal.revert(material_settings, first_id) == (["a", "b"], [])
+    assert material_settings == {"b": {"spool_cost": 5}, "c": {"spool_weight": 500}}
+    assert len(SettingsJournal(path)) == 0
+
+def test_revertKeepsLaterEdits(tmp_path):
+    journal = SettingsJournal(str(tmp_path / "journal.jsonl"))
+    entry_id = journal.record("import", "import", {"a": (None, {"spool_cost": 10}), "b": (None, {"spool_cost": 20})})
+
+    # b was edited by hand after the import
+    material_settings = {"a": {"spool_cost": 10}, "b": {"spool_cost": 21}}
+    assert journal.revert(material_settings, entry_id) == (["a"], ["b"])
+    assert material_settings == {"b": {"spool_cost": 21}}
+
+def test_revertPartially(tmp_path):
+    journal = SettingsJournal(str(tmp_path / "journal.jsonl"))
+    first_id = journal.record("import", "first", {"a": ({"spool_cost": 10}, {"spool_cost": 12}), "b": (None, {"spool_cost": 20})})
+    # a was edited by hand between the imports, b was edited by hand after them
+    journal.record("import", "second", {"a": ({"spool_cost": 11}, {"spool_cost": 13}), "b": ({"spool_cost": 20}, {"spool_cost": 22})})
+
+    # a is reverted to the edit by the second entry and kept by the first, so it did change
+    material_settings = {"a": {"spool_cost": 13}, "b": {"spool_cost": 23}}
+    assert journal.revert(material_settings, first_id) == (["a"], ["b"])
+    assert material_settings == {"a": {"spool_cost": 11}, "b": {"spool_cost": 23}}
+
+def test_unknownEntry(tmp_path):
+    journal = SettingsJournal(str(tmp_path / "journal.jsonl"))
+    try:
+        journal.revert({}, 1)
+    except KeyError:
+        pass
+    else:
+        assert False, "Reverting an unknown entry should raise a KeyError"
+
+def test_damagedEntry(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = SettingsJournal(str(path))
+    journal.record("import", "first", {"a": (None, {"spool_cost": 10})})
+    # an entry that was being written when Cura crashed
+    with open(str(path), "a", encoding = "utf-8") as journal_file:
+        journal_file.write('{"id":2,"changes":{"b"')
+
+    journal = SettingsJournal(str(path))
+    assert len(journal) == 1
+    assert journal.record("import", "second", {"b": (None, {"spool_cost": 20})}) == 2
+    assert [entry["id"] for entry in SettingsJournal(str(path)).getEntries()] == [1, 2]
+
+def test_compaction(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = SettingsJournal(path)
+    for index in range(SettingsJournal.MAX_ENTRIES + SettingsJournal.COMPACT_MARGIN + 1):
+        journal.record("import", "import %d" % index, {"a": ({"spool_cost": index}, {"spool_cost": index + 1})})
+
+    entries = SettingsJournal(path).getEntries()
+    assert len(entries) == SettingsJournal.MAX_ENTRIES
+    assert entries[-1]["id"] == SettingsJournal.MAX_ENTRIES + SettingsJournal.COMPACT_MARGIN + 1
@@ -0,0 +1,86 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import sqlite3
+
+import pytest
+
+from MaterialCostTools.SharedCostStore import SharedCostStore
+
+
+@pytest.fixture
+def stores(tmp_path):
+    # two Cura instances that share the same database
+    path = str(tmp_path / "costs.sqlite")
+    (first, second) = (SharedCostStore(path), SharedCostStore(path))
+    yield (first, second)
+    first.close()
+    second.close()
+
+
+def test_sync(stores):
+    (first, second) = stores
+    assert second.getChangesSince(0) == (0, {})
+    second.hasChanged()
+
+    first.upsertMany({"a": {"spool_cost": 10.0, "spool_weight": 750}, "b": {"spool_cost": 20.0}})
+    assert second.hasChanged()
+    assert not second.hasChanged()
+    (revision, material_settings) = second.getChangesSince(0)
+    assert revision == 1
+    assert material_settings == {"a": {"spool_cost": 10.0, "spool_weight": 750}, "b": {"spool_cost": 20.0}}
+
+    # only the rows that changed after the revision are returned
+    first.upsert("b", {"spool_weight": 1000})
+    assert second.hasChanged()
+    assert second.getChangesSince(revision) == (2, {"b": {"spool_cost": 20.0, "spool_weight": 1000}})
+    assert second.getChangesSince(2) == (2, {})
+
+def test_upsertKeepsOtherFields(stores):
+    (first, _) = stores
+    first.upsert("a", {"spool_cost": 10.0, "spool_weight": 750})
+    first.upsert("a", {"spool_cost": 12.5})
+    assert first.getChangesSince(0) == (2, {"a": {"spool_cost": 12.5, "spool_weight": 750}})
+
+def test_emptyUpsert(stores):
+    (first, _) = stores
+    first.upsertMany({})
+    assert first.getChangesSince(0) == (0, {})
+
+def test_getRevision(stores):
+    (first, _) = stores
+    assert first.getRevision() == 0
+    first.upsertMany({"a": {"spool_cost": 10.0}, "b": {"spool_cost": 20.0}})
+    first.upsert("a", {"spool_weight": 750})
+    assert first.getRevision() == 2
+
+def test_replaceMany(stores):
+    (first, second) = stores
+    first.upsertMany({"a": {"spool_cost": 10.0, "spool_weight": 750}, "b": {"spool_cost": 20.0}, "c": {"spool_weight": 500}})
+    (revision, _) = second.getChangesSince(0)
+
+    # removed fields are returned as None
+    first.replaceMany({"a": {"spool_cost": 12.0}, "b": None})
+    assert second.getChangesSince(revision) == (2, {"a": {"spool_cost": 12.0, "spool_weight": None}, "b": {"spool_cost": None, "spool_weight": None}})
+
+    # a weight that is set again after it was removed
+    first.upsert("a", {"spool_weight": 1000})
+    assert second.getChangesSince(2) == (3, {"a": {"spool_cost": 12.0, "spool_weight": 1000}})
+    assert second.getChangesSince(0)[1]["c"] == {"spool_weight": 500}
+
+def test_addsColumns(tmp_path):
+    # a database that was created before rows could be marked as complete
+    path = str(tmp_path / "costs.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE material_costs (guid TEXT PRIMARY KEY NOT NULL, spool_cost REAL, spool_weight INTEGER, revision INTEGER NOT NULL)")
+    connection.execute("INSERT INTO material_costs VALUES ('a', 10.0, NULL, 1)")
+    connection.commit()
+    connection.close()
+
+    store = SharedCostStore(path)
+    assert store.getChangesSince(0) == (1, {"a": {"spool_cost": 10.0}})
+    store.replaceMany({"a": None})
+    assert store.getChangesSince(1) == (2, {"a": {"spool_cost": None, "spool_weight": None}})
+    store.close()
+    # the columns are only added once
+    SharedCostStore(path).open()
@@ -0,0 +1,80 @@
+# Copyright (c) 2022 Aldo Hoeben / fieldOfView
+# MaterialCostTools is released under the terms of the AGPLv3 or higher.
+
+import os
+
+import pytest
+
+from MaterialCostTools.CurrencyRates import CurrencyRates
+from MaterialCostTools.ImportChangeSet import ImportChangeSet
+from MaterialCostTools.WatchFolder import WatchFolder
+
+GUID = "506c9f0d-e3aa-4bd4-b2d2-23e2425b1aa9"
+OTHER_GUID = "0e01be8c-e425-4fb1-b4a3-b79f255f1db9"
+
+
+@pytest.fixture
+def folder(tmp_path):
+    directory = tmp_path / "prices"
+    directory.mkdir()
+    return directory
+
+def _makeWatchFolder(folder):
+    watch_folder = WatchFolder(str(folder), str(folder.parent / "index.json"))
+    watch_folder.target_currency = "€"
+    return watch_folder
+
+def _collect(watch_folder, material_settings = None):
+    change_set = ImportChangeSet(material_settings or {})
+    assert watch_folder.collectChanges(change_set)
+    watch_folder.commit()
+    return change_set
+
+
+def test_onlyChangedRows(folder):
+    price_list = folder / "prices.csv"
+    price_list.write_text("guid,name,weight (g),cost (EUR)\n%s,PLA,750,20\n%s,PETG,1000,30\n" % (GUID, OTHER_GUID), encoding = "utf-8")
+    watch_folder = _makeWatchFolder(folder)
+    assert watch_folder.getChangedFiles() == ["prices.csv"]
+    assert _collect(watch_folder).getAddedCount() == 2
+    assert watch_folder.getChangedFiles() == []
+
+    price_list.write_text("guid,name,weight (g),cost (EUR)\n%s,PLA,750,22\n%s,PETG,1000,30\n" % (GUID, OTHER_GUID), encoding = "utf-8")
+    os.utime(str(price_list), (1, 1))
+    # the index is read back from the file
+    watch_folder = _makeWatchFolder(folder)
+    assert watch_folder.getChangedFiles() == ["prices.csv"]
+    assert _collect(watch_folder).getAdded() == {GUID: {"spool_weight": 750, "spool_cost": 22.0}}
+
+def test_rejectedFileIsRetried(folder, tmp_path):
+    (folder / "prices.csv").write_text("guid,name,weight (g),cost (USD)\n%s,PLA,1000,25\n" % GUID, encoding = "utf-8")
+    watch_folder = _makeWatchFolder(folder)
+    change_set = _collect(watch_folder)
+    assert change_set.isEmpty()
+    assert list(watch_folder.getErrors()) == ["prices.csv"]
+    assert watch_folder.hasRejectedFiles()
+
+    # the file is not read again while nothing changed
+    assert watch_folder.getChangedFiles() == []
+    _collect(watch_folder)
+    assert watch_folder.getErrors() == {}
+
+    # once the prices can be converted, the file is imported
+    rates_path = tmp_path / "rates.json"
+    rates_path.write_text('{"base": "EUR", "date": "2026-01-05", "rates": {"USD": 1.25}}', encoding = "utf-8")
+    watch_folder = _makeWatchFolder(folder)
+    watch_folder.currency_rates = CurrencyRates.load(str(rates_path))
+    assert watch_folder.getChangedFiles() == ["prices.csv"]
+    assert _collect(watch_folder).getAdded() == {GUID: {"spool_weight": 1000, "spool_cost": 20.0}}
+    assert not watch_folder.hasRejectedFiles()
+    assert watch_folder.getChangedFiles() == []
+
+def test_removedFile(folder):
+    price_list = folder / "prices.csv"
+    price_list.write_text("guid,name,weight (g),cost (EUR)\n%s,PLA,750,20\n" % GUID, encoding = "utf-8")
+    watch_folder = _makeWatchFolder(folder)
+    _collect(watch_folder)
+    price_list.unlink()
+    assert watch_folder.getChangedFiles() == ["prices.csv"]
+    _collect(watch_folder)
+    assert watch_folder.getChangedFiles() == []